@@ -1,6 +1,6 @@
 # # Version
 
-__version__ = "1.0.0"
+__version__ = "1.1.0"
 
 # # arg commands
 COMMAND_RUN          = "run"
@@ -9,6 +9,8 @@ COMMAND_SAVE_GIF     = "save_gif"
 COMMAND_SAVE_PNG     = "save_png"
 COMMAND_SHOW_POINT   = "show_point"
 COMMAND_SHOW_SECTION = "show_section"
+COMMAND_RUN_SHOTS    = "run_shots"
+COMMAND_CONVERT      = "convert"
 
 # # medium type constants
 I_MEDIUM   = "I"
@@ -20,13 +22,88 @@ MEDIUM_TYPES = [I_MEDIUM, VTI_MEDIUM, HTI_MEDIUM]
 # # boundary type constants
 BOUNDARY_SOLID = "solid"
 BOUNDARY_ATTEN = "atten"
+BOUNDARY_CPML  = "cpml"
 
-BOUNDARY_TYPES = [BOUNDARY_SOLID, BOUNDARY_ATTEN]
+BOUNDARY_TYPES = [BOUNDARY_SOLID, BOUNDARY_ATTEN, BOUNDARY_CPML]
+
+# # space domain methods
+SPACE_PSM = "PSM"
+SPACE_FD  = "FD"
+
+SPACE_DOMAIN_METHODS = [SPACE_PSM, SPACE_FD]
+
+# # time integrators
+TIME_FD2    = "fd2"
+TIME_KSPACE = "kspace"
+
+TIME_INTEGRATORS = [TIME_FD2, TIME_KSPACE]
+
+# # finite difference orders
+FD_ORDERS = [2, 4, 6, 8]
+FD_DEFAULT_ORDER = 8
+
+# # psm derivative methods
+PSM_SHARED = "shared"
+PSM_RFFT   = "rfft"
+
+PSM_METHODS = [PSM_SHARED, PSM_RFFT]
+
+# # fft backends
+FFT_NUMPY = "numpy"
+FFT_SCIPY = "scipy"
+
+FFT_BACKENDS = [FFT_NUMPY, FFT_SCIPY]
+
+# # float precision
+PRECISION_FLOAT32 = "float32"
+PRECISION_FLOAT64 = "float64"
+
+PRECISIONS = [PRECISION_FLOAT32, PRECISION_FLOAT64]
+
+# # batch simulation, bytes of the wave fields stepped together, chosen to stay in cache
+BATCH_CHUNK_BYTES = 2 ** 18
+
+# # active window of local stencil methods, bounds are rounded to blocks of cells so work arrays are reused
+ACTIVE_WINDOW_BLOCK = 32
 
 # # save format
 FORMAT_TXT = "txt"
 FORMAT_BIN = "bin"
-SAVE_FORMATS = [FORMAT_TXT, FORMAT_BIN]
+FORMAT_V2  = "v2"
+SAVE_FORMATS = [FORMAT_TXT, FORMAT_BIN, FORMAT_V2]
+
+# # compression of the chunks of the v2 format
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_LZMA = "lzma"
+
+COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZMA]
+
+ZLIB_LEVEL = 6
+SFD_V2_CHUNKS = (8, 64, 64)    # frames and cells of one chunk, (t, z, x)
+SFD_V2_CACHE_CHUNKS = 64       # decoded chunks kept by a lazy v2 reader
+
+# # colorbar limit of sfd files, vmax = SFD_VMAX_SCALE * the SFD_AMPLITUDE_PERCENTILE percentile of the frames
+SFD_AMPLITUDE_PERCENTILE = 99
+SFD_VMAX_SCALE = 7.5
+# frames read to compute the percentile of a lazy sfd without the percentile in its header
+SFD_VMAX_SAMPLE_FRAMES = 16
+# log spaced bins of the streaming histogram of the values, bins per octave and octaves of the magnitudes
+AMPLITUDE_BINS_PER_OCTAVE = 16
+AMPLITUDE_OCTAVES = (-160, 130)
+
+# # receivers, interpolation of the fields at the receiver positions
+RECEIVER_BILINEAR = "bilinear"
+RECEIVER_SINC     = "sinc"
+
+RECEIVER_INTERPOLATIONS = [RECEIVER_BILINEAR, RECEIVER_SINC]
+
+RECEIVER_SINC_RADIUS = 4    # cells on each side of the sinc interpolation
+RECEIVER_SINC_BETA   = 6.31 # kaiser window of the sinc interpolation
+RECEIVER_FIR_ZEROS   = 8    # zero crossings on each side of the decimation filter
+RECEIVER_FIR_BETA    = 8.0  # kaiser window of the decimation filter
+
+TRACE_FILE_EXT = ".trc"
 
 # # source types
 SOURCE_NONE = "none"
@@ -39,4 +116,9 @@ ONE_FIG_SHAPE = (4, 3)
 TWO_FIG_SHAPE = (9, 4)
 FIG_DPI = 120
 GIF_FPS = 10
+RENDER_CHUNK_FRAMES = 8    # max frames rendered by one task of the render pool
+FAST_RENDER_CMAP   = "seismic"
+FAST_RENDER_COLORS = 255   # colors of the colormap lookup table, one more palette entry is the background
+FAST_RENDER_GAP    = 4     # background pixels between the x and z panels
+LIVE_VIEW_SAMPLE_CELLS = 4096  # cells sampled for the colour limits of the live display
 SHOW_SEG = 0.1
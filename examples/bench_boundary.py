@@ -0,0 +1,77 @@
+"""
+Benchmark of the boundary cost of one step.
+
+The index-array boundary of earlier versions gathers and scatters four strips of every 2D field,
+the slice boundary damps the strips of the stacked state arrays in place.
+
+    python -m examples.bench_boundary --n 512 --absorb_length 40 --anti_extension
+"""
+import argparse
+import time
+
+import numpy as np
+
+import constants
+from utils.boundary import Boundary
+
+
+def index_array_apply(boundary, u):
+    """
+    Boundary of earlier versions, one 2D field per call with index arrays.
+    """
+    n, m, a, b = boundary.n, boundary.m, boundary.a, boundary.b
+    u[:, np.arange(n - a, n)] *= boundary.GXHigh
+    u[:, np.arange(0, a)] *= boundary.GXLow
+    u[np.arange(m - b, m)] *= boundary.GZHigh
+    u[np.arange(0, b)] *= boundary.GZLow
+
+
+def bench(func, repeat):
+    func()
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def bench_boundary(n=512, absorb_length=40, anti_extension=False, repeat=100):
+    """
+    Returns:
+        (seconds per step of the index array boundary, seconds per step of the slice boundary)
+    """
+    boundary = Boundary.get_boundary(constants.BOUNDARY_ATTEN)
+    boundary.set_parameter(n, n, absorb_length, absorb_length, 0.015)
+
+    n_states = 2 if anti_extension else 1
+    # both time levels of every state, (ux, uz) stacked
+    states = [np.random.default_rng(i).normal(size=(2, n, n)) for i in range(2 * n_states)]
+
+    def index_array_step():
+        # the old step damped the current time level only
+        for state in states[::2]:
+            for field in state:
+                index_array_apply(boundary, field)
+
+    def slice_step():
+        boundary.apply(*states)
+
+    return bench(index_array_step, repeat), bench(slice_step, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of the boundary cost of one step")
+    parser.add_argument("--n", type=int, default=512)
+    parser.add_argument("--absorb_length", type=int, default=40)
+    parser.add_argument("--anti_extension", action="store_true")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    old, new = bench_boundary(args.n, args.absorb_length, args.anti_extension, args.repeat)
+    print("grid {0}x{0}, absorb length {1}, anti extension {2}".format(args.n, args.absorb_length,
+                                                                   args.anti_extension))
+    print("index arrays, current time level:  {:.3f} ms/step".format(old * 1e3))
+    print("slices, both time levels:          {:.3f} ms/step".format(new * 1e3))
+
+
+if __name__ == '__main__':
+    main()
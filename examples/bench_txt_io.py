@@ -0,0 +1,95 @@
+"""
+Benchmark of writing and reading the txt sfd format.
+
+Earlier versions formatted every value with `str` and parsed every line with a list comprehension,
+the current version formats and parses one frame at a time with numpy.
+
+    python -m examples.bench_txt_io --n 256 --nt 20 --precision float32
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.sfd import SFD
+
+
+def old_save_txt(sfd, fname):
+    """
+    txt writer of earlier versions.
+    """
+    with open(fname, "w+") as fp:
+        fp.write(f"{sfd.nx} {sfd.nz} {sfd.nt}\n")
+        fp.write(f"{sfd.xmin} {sfd.xmax}\n")
+        fp.write(f"{sfd.zmin} {sfd.zmax}\n")
+        for i in range(sfd.nt - 1):
+            fp.write(str(sfd.ts[i]) + " ")
+        fp.write(str(sfd.ts[sfd.nt - 1]) + "\n")
+        for i in range(sfd.nt):
+            for j in range(sfd.nz):
+                fp.write(" ".join([str(v) for v in sfd.data[i, j, :]]) + "\n")
+
+
+def old_read_txt(fname):
+    """
+    txt reader of earlier versions.
+    """
+    with open(fname, "r") as fp:
+        nx, nz, nt = [int(i) for i in fp.readline().split()]
+        fp.readline()
+        fp.readline()
+        data = np.zeros((nt, nz, nx))
+        [float(i) for i in fp.readline().split()]
+        for _ in range(nt):
+            tmp = np.zeros((nz, nx))
+            for i in range(nz):
+                tmp[i] = [float(i) for i in fp.readline().split()]
+            data[_] = tmp.copy()
+    return data
+
+
+def bench(func):
+    start_time = time.perf_counter()
+    func()
+    return time.perf_counter() - start_time
+
+
+def bench_txt_io(n=256, nt=20, dtype=np.float64):
+    """
+    Returns:
+        dict of seconds of the old and new writer and reader.
+    """
+    frames = np.random.default_rng(0).normal(size=(nt, n, n)).astype(dtype)
+    sfd = SFD(xmin=0, xmax=n, zmin=0, zmax=n, ts=np.linspace(0, 1, nt), u=frames)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old_file = os.path.join(tmp_dir, "old.sfd")
+        new_file = os.path.join(tmp_dir, "new.sfd")
+        times = {
+            "old write": bench(lambda: old_save_txt(sfd, old_file)),
+            "new write": bench(lambda: sfd.save_txt(new_file)),
+            "old read": bench(lambda: old_read_txt(old_file)),
+            "new read": bench(lambda: SFD(new_file, "txt")),
+        }
+        # both readers give the same frames
+        np.testing.assert_array_equal(SFD(old_file, "txt").data.astype(dtype), frames)
+        np.testing.assert_array_equal(old_read_txt(new_file).astype(dtype), frames)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of the txt sfd format")
+    parser.add_argument("--n", type=int, default=256)
+    parser.add_argument("--nt", type=int, default=20)
+    parser.add_argument("--precision", type=str, default="float64", choices=["float32", "float64"])
+    args = parser.parse_args()
+
+    times = bench_txt_io(args.n, args.nt, args.precision)
+    print("grid {0}x{0}, {1} frames of {2}".format(args.n, args.nt, args.precision))
+    for name, seconds in times.items():
+        print("{:<10} {:.3f} s".format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import time
+from typing import Union, List
+
+import numpy as np
+
+from examples.wave_loop import parse_save_times
+from utils.seismic_simulator import SeismicSimulator
+
+
+def validate_precision(
+        s: SeismicSimulator,
+        s_ref: SeismicSimulator,
+        report_times: Union[List[float], int] = None,
+):
+    """
+    Run a simulator side by side with a reference simulator, usually the same simulation in
+    float64, and report the deviation of the wave field at the report times.
+
+    Args:
+        s: simulator to validate.
+        s_ref: reference simulator.
+        report_times: int or list, times to report the deviation, see `parse_save_times`.
+
+    Returns:
+        list of (t, relative error of ux, relative error of uz, max error of ux, max error of uz),
+        relative error is the l2 norm of the deviation divided by the l2 norm of the reference.
+    """
+    nt = int(s.endt / s.dt)
+    if report_times is None:
+        report_times = 10
+    report_time_index, report_times = parse_save_times(nt, s, report_times)
+
+    print(f"validate {s.medium.cfg.precision} with {s_ref.medium.cfg.precision} reference")
+    print("{:>10s} {:>14s} {:>14s} {:>14s} {:>14s}".format("t(s)", "rel_err_ux", "rel_err_uz", "max_err_ux", "max_err_uz"))
+
+    start_time = time.time()
+    report = []
+    i = 0
+    for index in report_time_index:
+        if index + 1 > i:
+            n = s.advance(index + 1 - i)
+            s_ref.advance(index + 1 - i)
+            i += n
+
+        errors = []
+        for u, u_ref in [(s.ux, s_ref.ux), (s.uz, s_ref.uz)]:
+            u = u.astype(np.float64)
+            norm = np.linalg.norm(u_ref)
+            errors.append(np.linalg.norm(u - u_ref) / norm if norm > 0 else 0.)
+        for u, u_ref in [(s.ux, s_ref.ux), (s.uz, s_ref.uz)]:
+            errors.append(np.max(np.abs(u.astype(np.float64) - u_ref)))
+
+        report.append((s.current_t, *errors))
+        print("{:>10.4f} {:>14.3e} {:>14.3e} {:>14.3e} {:>14.3e}".format(s.current_t, *errors))
+
+    print("Validation Done! runtime:{:.3f}s".format(time.time() - start_time))
+    return report
@@ -3,12 +3,13 @@ from copy import deepcopy, copy
 from typing import Union, List
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 import constants
-from utils.seismic_simulator import SeismicSimulator
-from tools.plot_frame import plot_frame_xz
-from utils.sfd import SFD
+from utils.seismic_simulator import SeismicSimulator, BatchSeismicSimulator
+from tools.live_viewer import LiveViewer
+from utils.sfd import SFD, AmplitudeStats, cal_save_window, cal_window_extent
+from utils.receivers import Receivers
+from utils.sfd_writer import SFDWriter
 
 
 def parse_save_times(nt, s, save_times):
@@ -25,6 +26,8 @@ def parse_save_times(nt, s, save_times):
         save_times = np.asarray(save_times)
     # cover save times into index
     save_time_index = (save_times / s.dt).astype(int)
+    # times after the end are dropped, so every time has a frame
+    save_times = save_times[save_time_index < nt]
     save_time_index = save_time_index[save_time_index < nt]
     return save_time_index, save_times
 
@@ -39,8 +42,39 @@ def wave_loop(
         seg: float = None,
         vmin: float = None,
         vmax: float = None,
+        receivers: Receivers = None,
+        x_outfile: str = None,
+        z_outfile: str = None,
+        save_format: str = None,
+        compression: str = None,
+        save_stride=None,
+        save_roi: List[float] = None,
+        save_exclude_absorb: bool = False,
         **kwargs,
 ):
+    """
+    Run the simulation, show and save frames of the wave field.
+
+    Args:
+        seg: min time between two shown frames, the simulation does not wait for the display and the
+        frames are skipped while it is behind, see `tools.live_viewer`.
+        receivers: optional, record traces at the receivers during the loop, see `utils.receivers`.
+        The traces are in `receivers` after the loop.
+        x_outfile: optional, with `z_outfile` the saved frames are written into the files while the
+        simulation runs instead of being kept in memory, see `utils.sfd_writer`.
+        z_outfile: file of the uz frames.
+        save_format: format of the files, see constants.SAVE_FORMATS.
+        compression: compression of the v2 format, see constants.COMPRESSIONS.
+        save_stride: int or (stride_z, stride_x), save one cell of every `save_stride` cells.
+        save_roi: [xmin, xmax, zmin, zmax], only save the cells in the region.
+        save_exclude_absorb: don't save the absorbing strips of the boundary.
+        The saved frames carry the extent of the saved cells, see `utils.sfd.cal_save_window`.
+
+    Returns:
+        (sfd_x, sfd_z) of the saved frames, (None, None) if `is_save` is False or the frames are written into files.
+    """
+    if receivers is not None:
+        s.add_receivers(receivers)
     if seg is None:
         seg = constants.SHOW_SEG
     if use_anti_extension:
@@ -59,91 +93,165 @@ def wave_loop(
 
     start_time = time.time()
 
+    writers = None
+    ux = None
+    uz = None
     if is_save:
-        ux = np.zeros((len(save_time_index), s.medium.cfg.nz, s.medium.cfg.nx))
-        uz = np.zeros((len(save_time_index), s.medium.cfg.nz, s.medium.cfg.nx))
-    else:
-        ux = None
-        uz = None
+        absorb = (s.boundary.a, s.boundary.b) if save_exclude_absorb else None
+        window = cal_save_window(s.medium.cfg, save_stride, save_roi, absorb)
+        save_shape, save_extent = cal_window_extent(s.medium.cfg, window)
+        print("saved cells: {} x {}, extent: {}".format(*save_shape, save_extent))
+    if is_save and x_outfile is not None and z_outfile is not None:
+        # memory of the saved frames is two buffers per file, whatever the number of frames
+        writers = [SFDWriter(f, s.medium.cfg, len(save_time_index), save_format, dtype=s.u.dtype,
+                             compression=compression, window=window)
+                   for f in [x_outfile, z_outfile]]
+    elif is_save:
+        ux = np.zeros((len(save_time_index), *save_shape), dtype=s.u.dtype)
+        uz = np.zeros((len(save_time_index), *save_shape), dtype=s.u.dtype)
+        # amplitudes of the saved frames, counted as they are saved
+        stats = [AmplitudeStats(), AmplitudeStats()]
     
+    viewer = None
     if is_show:
-        fig = plt.figure(figsize=constants.TWO_FIG_SHAPE, dpi=constants.FIG_DPI)
-    else:
-        fig = None
+        cfg = s.medium.cfg
+        viewer = LiveViewer(cfg.shape, [cfg.xmin, cfg.xmax, cfg.zmax, cfg.zmin], titles=["X", "Z"],
+                            figsize=constants.TWO_FIG_SHAPE, dpi=constants.FIG_DPI, vmin=vmin, vmax=vmax, seg=seg,
+                            **kwargs)
 
     save_j = 0
     show_j = 0
 
-    for i in range(nt):
-        s.forward()
-        print("\rSimulation Process: time:{:.3f}s, runtime:{:.3f}s".format(s.current_t, time.time() - start_time),
-              end="")
-
-        if is_save and (save_j < len(save_time_index) and i == save_time_index[save_j]):
-            ux[save_j] = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
-            uz[save_j] = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
-            save_j += 1
-
-        if is_show and (show_j < len(show_time_index) and i == show_time_index[show_j]):
-
-            plot_x = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
-            plot_z = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
-
-            plot_frame_xz(
-                plot_x,
-                plot_z,
-                fig,
-                show_times[show_j],
-                vmin=vmin if vmin else -np.percentile(plot_x, 99) * 7.5,
-                vmax=vmax if vmax else np.percentile(plot_x, 99) * 7.5,
-                extent=[s.medium.cfg.xmin, s.medium.cfg.xmax, s.medium.cfg.zmax, s.medium.cfg.zmin],
-                **kwargs
-            )
+    try:
+        i = 0  # number of steps run
+        while i < nt:
+            # run all steps until the next frame to save or show at once.
+            next_i = nt - 1
+            if is_save and save_j < len(save_time_index):
+                next_i = min(next_i, save_time_index[save_j])
+            if is_show and show_j < len(show_time_index):
+                next_i = min(next_i, show_time_index[show_j])
+            n = s.advance(max(next_i + 1 - i, 1))
+            if n == 0:
+                break
+            i += n
+            print("\rSimulation Process: time:{:.3f}s, runtime:{:.3f}s".format(
+                s.current_t, time.time() - start_time), end="")
+
+            while is_save and (save_j < len(save_time_index) and i - 1 == save_time_index[save_j]):
+                frame_x = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
+                frame_z = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
+                if writers is not None:
+                    writers[0].write(frame_x, save_times[save_j])
+                    writers[1].write(frame_z, save_times[save_j])
+                else:
+                    ux[save_j] = frame_x if window is None else frame_x[window]
+                    uz[save_j] = frame_z if window is None else frame_z[window]
+                    stats[0].add(ux[save_j])
+                    stats[1].add(uz[save_j])
+                save_j += 1
+
+            while is_show and (show_j < len(show_time_index) and i - 1 == show_time_index[show_j]):
+                # the simulation goes on without waiting, frames are skipped while the viewer is not due
+                if viewer.due():
+                    plot_x = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
+                    plot_z = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
+                    viewer.update([plot_x, plot_z], show_times[show_j])
 
-            plt.pause(seg)
-            plt.cla()
-            plt.clf()
+                show_j += 1
+    finally:
+        # the frames written before an error are kept in readable files
+        if writers is not None:
+            for writer in writers:
+                writer.close()
 
-            show_j += 1
-        
     if is_show:
         plot_x = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
         plot_z = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
-        plot_frame_xz(
-            plot_x,
-            plot_z,
-            fig,
-            s.current_t,
-            vmin=vmin if vmin else -np.percentile(plot_x, 99) * 7.5,
-            vmax=vmax if vmax else np.percentile(plot_x, 99) * 7.5,
-            extent=[s.medium.cfg.xmin, s.medium.cfg.xmax, s.medium.cfg.zmax, s.medium.cfg.zmin],
-            **kwargs
-        )
-        plt.show()
+        viewer.update([plot_x, plot_z], s.current_t)
+        viewer.show()
 
 
     print("\nSimulation Done!")
 
-    if is_save:
+    if is_save and writers is None:
         sfd_x = SFD(
-            xmin=s.medium.cfg.xmin,
-            xmax=s.medium.cfg.xmax,
-            zmin=s.medium.cfg.zmin,
-            zmax=s.medium.cfg.zmax,
+            xmin=save_extent[0],
+            xmax=save_extent[1],
+            zmin=save_extent[2],
+            zmax=save_extent[3],
             ts=save_times,
-            u=ux
+            u=ux,
+            amplitude=stats[0].percentile()
         )
 
         sfd_z = SFD(
-            xmin=s.medium.cfg.xmin,
-            xmax=s.medium.cfg.xmax,
-            zmin=s.medium.cfg.zmin,
-            zmax=s.medium.cfg.zmax,
+            xmin=save_extent[0],
+            xmax=save_extent[1],
+            zmin=save_extent[2],
+            zmax=save_extent[3],
             ts=save_times,
-            u=uz
+            u=uz,
+            amplitude=stats[1].percentile()
         )
 
         return sfd_x, sfd_z
     else:
         return None, None
 
+
+def batch_wave_loop(
+        s: BatchSeismicSimulator,
+        use_anti_extension: bool = False,
+        save_times: Union[List[float], int] = None,
+):
+    """
+    Run all shots of a batch simulator and save the wave field of every shot.
+
+    Args:
+        s: batch simulator.
+        use_anti_extension: use the anti extension method or not.
+        save_times: int or list, times of frames to save, see `parse_save_times`.
+
+    Returns:
+        list of (sfd_x, sfd_z), one for each shot.
+    """
+    nt = int(s.endt / s.dt)
+    if save_times is None:
+        save_times = int(np.sqrt((s.endt / s.dt)) * 10)
+    save_time_index, save_times = parse_save_times(nt, s, save_times)
+    print("target frame to save:", save_times)
+
+    start_time = time.time()
+
+    shape = (len(save_time_index), s.n_shots, s.medium.cfg.nz, s.medium.cfg.nx)
+    ux = np.zeros(shape, dtype=s.u.dtype)
+    uz = np.zeros(shape, dtype=s.u.dtype)
+
+    i = 0  # number of steps run
+    for save_j, index in enumerate(save_time_index):
+        if index + 1 > i:
+            i += s.advance(index + 1 - i)
+        print("\rSimulation Process: {} shots, time:{:.3f}s, runtime:{:.3f}s".format(
+            s.n_shots, s.current_t, time.time() - start_time), end="")
+
+        ux[save_j] = s.ux if not use_anti_extension else (s.ux + s.an_ux) / 2
+        uz[save_j] = s.uz if not use_anti_extension else (s.uz + s.an_uz) / 2
+
+    print("\nSimulation Done!")
+
+    sfds = []
+    for shot in range(s.n_shots):
+        sfd_x, sfd_z = [
+            SFD(
+                xmin=s.medium.cfg.xmin,
+                xmax=s.medium.cfg.xmax,
+                zmin=s.medium.cfg.zmin,
+                zmax=s.medium.cfg.zmax,
+                ts=save_times,
+                u=np.ascontiguousarray(u[:, shot])
+            )
+            for u in [ux, uz]
+        ]
+        sfds.append((sfd_x, sfd_z))
+    return sfds
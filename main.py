@@ -7,78 +7,109 @@ import numpy as np
 import constants
 from examples.draw_sfd import show_xz, save_gif_xz, save_png_xz, show_points
 from examples.wave_loop import wave_loop
+from examples.validate_precision import validate_precision
 from tools import cover_cmat_arg_to_matrix
 from utils.seismi_parser import get_parser
 from utils.medium import MediumConfig, Medium
 from utils.boundary import Boundary
 from utils.seismic_simulator import SeismicSimulator
-from utils.sfd import SFD
+from utils.shot_runner import run_shots
+from utils.sfd import SFD, convert_sfd
+from utils.receivers import Receivers
 from utils.source import Source, get_source_func
 
 
+def create_medium(args, parser_run):
+    """
+    Check the medium arguments and create the medium of the run and run_shots commands.
+
+    Returns:
+        (medium, medium_init_values), the values are the arguments of `medium.init_by_val`.
+    """
+    # ========================== Medium Config Check ========================= #
+    if any(i is None for i in [args.xmin, args.xmax, args.zmin, args.zmax]):
+        parser_run.error("All args in 'xmin', 'xmax', 'zmin', 'zmax' are required.")
+    if all(i is None for i in [args.nx, args.dx]):
+        parser_run.error("At lease one argument in 'nx', 'dx' are required.")
+    if all(i is None for i in [args.nz, args.dz]):
+        parser_run.error("At lease one argument in 'nz', 'dz' are required.")
+    if args.xmin >= args.xmax:
+        parser_run.error("arg 'xmax' must larger than arg 'xmin'.")
+    if args.zmin >= args.zmax:
+        parser_run.error("arg 'zmax' must larger than arg 'zmin'.")
+    if args.nx and not args.dx:
+        args.dx = (args.xmax - args.xmin) / args.nx
+    if args.nz and not args.dz:
+        args.dz = (args.zmax - args.zmin) / args.nz
+    if args.dx and not args.nx:
+        args.nx = int(np.ceil((args.xmax - args.xmin)) / args.dx)
+    if args.dz and not args.nz:
+        args.nz = int(np.ceil((args.zmax - args.zmin) / args.dz))
+
+    # Create Medium Config
+    print("medium basic config:")
+    medium_config = MediumConfig(
+        xmin=args.xmin,
+        xmax=args.xmax,
+        dx=args.dx,
+        zmin=args.zmin,
+        zmax=args.zmax,
+        dz=args.dz,
+        medium_type=args.medium_type,
+        precision=args.precision
+    )
+
+    # ================== Create medium ================== #
+    medium = Medium.get_medium(medium_config)
+
+    x = np.arange(args.xmin, args.xmax, args.dx)
+    z = np.arange(args.zmin, args.zmax, args.dz)
+
+    x, z = np.meshgrid(x, z)
+
+    # set c values
+    medium_init_values = []
+    # get all argument name by f.__code__.co_varnames, and the first argument is self, so pass this argument.
+    for cmat_attr in medium.init_by_val.__code__.co_varnames[1:]:
+        if not getattr(args, cmat_attr):
+            parser_run.error(f"the following arguments are required: --{cmat_attr}")
+        # cover the argument cmat_attr to matrix
+        cmat_value = cover_cmat_arg_to_matrix(getattr(args, cmat_attr), x, z)
+        medium_init_values.append(cmat_value)
+
+    medium.init_by_val(*medium_init_values)
+    return medium, medium_init_values
+
+
+def create_boundary(args):
+    # ================== Create Boundary ================ #
+    if args.boundary_type is None:
+        args.boundary_type = constants.BOUNDARY_SOLID
+    boundary = Boundary.get_boundary(args.boundary_type)
+    boundary.set_parameter(
+        args.nx,
+        args.nz,
+        args.x_absorb_length,
+        args.z_absorb_length,
+        args.absorb_alpha
+    )
+    print(boundary)
+    return boundary
+
+
 def main():
-    parser, parser_run, parser_show, parser_save_gif, parser_save_png = get_parser()
+    parser, parser_run, parser_show, parser_save_gif, parser_save_png, parser_run_shots = get_parser()
     args = parser.parse_args()
     d_args = vars(args)
     print("Input arguments:", json.dumps(d_args, indent=2))
     if args.subcommand == constants.COMMAND_RUN:
         # ******************************** Run Command ***********************************
-        # ========================== Medium Config Check ========================= #
-        if any(i is None for i in [args.xmin, args.xmax, args.zmin, args.zmax]):
-            parser_run.error("All args in 'xmin', 'xmax', 'zmin', 'zmax' are required.")
-        if all(i is None for i in [args.nx, args.dx]):
-            parser_run.error("At lease one argument in 'nx', 'dx' are required.")
-        if all(i is None for i in [args.nz, args.dz]):
-            parser_run.error("At lease one argument in 'nz', 'dz' are required.")
-        if args.xmin >= args.xmax:
-            parser_run.error("arg 'xmax' must larger than arg 'xmin'.")
-        if args.zmin >= args.zmax:
-            parser_run.error("arg 'zmax' must larger than arg 'zmin'.")
-        if args.nx and not args.dx:
-            args.dx = (args.xmax - args.xmin) / args.nx
-        if args.nz and not args.dz:
-            args.dz = (args.zmax - args.zmin) / args.nz
-        if args.dx and not args.nx:
-            args.nx = int(np.ceil((args.xmax - args.xmin)) / args.dx)
-        if args.dz and not args.nz:
-            args.nz = int(np.ceil((args.zmax - args.zmin) / args.dz))
-
         # ========================== Run Config Check ========================= #
         if not args.simulate_delta_t or not args.simulate_time:
             parser_run.error("the following arguments are required: simulate_delta_t and simulate_time")
         if not args.show_times:
             parser_run.error("the following arguments are required: --show_times")
-        # Create Medium Config
-        print("medium basic config:")
-        medium_config = MediumConfig(
-            xmin=args.xmin,
-            xmax=args.xmax,
-            dx=args.dx,
-            zmin=args.zmin,
-            zmax=args.zmax,
-            dz=args.dz,
-            medium_type=args.medium_type
-        )
-
-        # ================== Create medium ================== #
-        medium = Medium.get_medium(medium_config)
-
-        x = np.arange(args.xmin, args.xmax, args.dx)
-        z = np.arange(args.zmin, args.zmax, args.dz)
-
-        x, z = np.meshgrid(x, z)
-
-        # set c values
-        medium_init_values = []
-        # get all argument name by f.__code__.co_varnames, and the first argument is self, so pass this argument.
-        for cmat_attr in medium.init_by_val.__code__.co_varnames[1:]:
-            if not getattr(args, cmat_attr):
-                parser_run.error(f"the following arguments are required: --{cmat_attr}")
-            # cover the argument cmat_attr to matrix
-            cmat_value = cover_cmat_arg_to_matrix(getattr(args, cmat_attr), x, z)
-            medium_init_values.append(cmat_value)
-
-        medium.init_by_val(*medium_init_values)
+        medium, medium_init_values = create_medium(args, parser_run)
 
         # ================== Create Source ================ #
         if not args.source_x:
@@ -104,18 +135,7 @@ def main():
         )
         print(source)
 
-        # ================== Create Boundary ================ #
-        if args.boundary_type is None:
-            args.boundary_type = constants.BOUNDARY_SOLID
-        boundary = Boundary.get_boundary(args.boundary_type)
-        boundary.set_parameter(
-            args.nx,
-            args.nz,
-            args.x_absorb_length,
-            args.z_absorb_length,
-            args.absorb_alpha
-        )
-        print(boundary)
+        boundary = create_boundary(args)
 
         # ================= Create Simulator ================= #
         if type(args.use_anti_extension) == str:
@@ -124,6 +144,12 @@ def main():
             args.run_with_show = eval(args.run_with_show)
         if type(args.save) == str:
             args.save = eval(args.save)
+        if type(args.validate_precision) == str:
+            args.validate_precision = eval(args.validate_precision)
+        if type(args.save_exclude_absorb) == str:
+            args.save_exclude_absorb = eval(args.save_exclude_absorb)
+        if type(args.save_roi) == str:
+            args.save_roi = eval(args.save_roi)
 
         simulator = SeismicSimulator(
             medium=medium,
@@ -131,8 +157,46 @@ def main():
             boundary=boundary,
             use_anti_extension=args.use_anti_extension,
             endt=args.simulate_time,
-            dt=args.simulate_delta_t
+            dt=args.simulate_delta_t,
+            fft_backend=args.fft_backend,
+            threads=args.threads,
+            space_domain_method=args.space_domain_method,
+            fd_order=args.fd_order,
+            time_integrator=args.time_integrator,
+            reference_velocity=args.reference_velocity
         )
+        print(simulator.fft_backend)
+
+        if args.validate_precision:
+            # ================= Validate Precision ================= #
+            ref_medium_config = MediumConfig(
+                xmin=args.xmin,
+                xmax=args.xmax,
+                dx=args.dx,
+                zmin=args.zmin,
+                zmax=args.zmax,
+                dz=args.dz,
+                medium_type=args.medium_type,
+                precision=constants.PRECISION_FLOAT64
+            )
+            ref_medium = Medium.get_medium(ref_medium_config)
+            ref_medium.init_by_val(*medium_init_values)
+            ref_simulator = SeismicSimulator(
+                medium=ref_medium,
+                source=source,
+                boundary=create_boundary(args),
+                use_anti_extension=args.use_anti_extension,
+                endt=args.simulate_time,
+                dt=args.simulate_delta_t,
+                fft_backend=args.fft_backend,
+                threads=args.threads,
+                space_domain_method=args.space_domain_method,
+                fd_order=args.fd_order,
+                time_integrator=args.time_integrator,
+                reference_velocity=args.reference_velocity
+            )
+            validate_precision(simulator, ref_simulator, eval(args.show_times))
+            return
 
         if args.save:
             if any(i is None for i in [args.save_times, args.save_format, args.x_outfile, args.z_outfile]):
@@ -149,33 +213,103 @@ def main():
             if type(args.show_times) not in [int, list]:
                 parser_run.error(f"The argument \"show_times\" should be int or list, but {type(args.show_times)}")
 
+        receivers = None
+        if args.receivers:
+            if not args.receiver_outfile:
+                parser_run.error("The argument \"receivers\" is set, but \"receiver_outfile\" is not be set.")
+            receivers = Receivers(
+                eval(args.receivers),
+                interpolation=args.receiver_interpolation,
+                decimation=int(args.receiver_decimation) if args.receiver_decimation else None
+            )
+
+        if args.save:
+            if not os.path.exists(os.path.dirname(args.x_outfile)):
+                print("create dir: ", os.path.dirname(args.x_outfile))
+                os.makedirs(os.path.dirname(args.x_outfile))
+            if not os.path.exists(os.path.dirname(args.z_outfile)):
+                print("create dir: ", os.path.dirname(args.z_outfile))
+                os.makedirs(os.path.dirname(args.z_outfile))
+
         d_args = vars(args)
         print("Parsed Arguments:\n", json.dumps(d_args, indent=2))
 
-        sfd_x, sfd_z = wave_loop(
+        # saved frames are written into the out files while the simulation runs
+        wave_loop(
             s=simulator,
             use_anti_extension=args.use_anti_extension,
             show_times=args.show_times,
             save_times=args.save_times,
             is_save=args.save,
-            is_show=args.run_with_show
+            is_show=args.run_with_show,
+            receivers=receivers,
+            x_outfile=args.x_outfile,
+            z_outfile=args.z_outfile,
+            save_format=args.save_format,
+            compression=args.compression,
+            save_stride=args.save_stride,
+            save_roi=args.save_roi,
+            save_exclude_absorb=args.save_exclude_absorb
         )
 
-        if args.save:
-            if not os.path.exists(os.path.dirname(args.x_outfile)):
-                print("create dir: ", os.path.dirname(args.x_outfile))
-                os.makedirs(os.path.dirname(args.x_outfile))
-            if not os.path.exists(os.path.dirname(args.z_outfile)):
-                print("create dir: ", os.path.dirname(args.z_outfile))
-                os.makedirs(os.path.dirname(args.z_outfile))
+        if receivers is not None:
+            if os.path.dirname(args.receiver_outfile) and not os.path.exists(os.path.dirname(args.receiver_outfile)):
+                print("create dir: ", os.path.dirname(args.receiver_outfile))
+                os.makedirs(os.path.dirname(args.receiver_outfile))
+            receivers.save(args.receiver_outfile)
 
-            sfd_x.save(args.x_outfile, save_format=args.save_format)
-            sfd_z.save(args.z_outfile, save_format=args.save_format)
+    # ****************************** Command run shots ****************************** #
+    elif args.subcommand == constants.COMMAND_RUN_SHOTS:
+        if not args.simulate_delta_t or not args.simulate_time:
+            parser_run_shots.error("the following arguments are required: simulate_delta_t and simulate_time")
+        if not args.shots or not args.out_dir:
+            parser_run_shots.error("the following arguments are required: --shots, --out_dir")
+        if args.receivers:
+            parser_run_shots.error("receivers are not supported by run_shots, run the shot with the run command.")
+        medium, _ = create_medium(args, parser_run_shots)
+        boundary = create_boundary(args)
+
+        if type(args.use_anti_extension) == str:
+            args.use_anti_extension = eval(args.use_anti_extension)
+        if type(args.save_times) == str:
+            args.save_times = eval(args.save_times)
+        if type(args.save_exclude_absorb) == str:
+            args.save_exclude_absorb = eval(args.save_exclude_absorb)
+        if type(args.save_roi) == str:
+            args.save_roi = eval(args.save_roi)
+
+        # cover source positions to index
+        shots = [(int(x / args.dx), int(z / args.dz)) for x, z in eval(args.shots)]
+
+        run_shots(
+            medium=medium,
+            boundary=boundary,
+            shots=shots,
+            source_x=(args.source_x_type, *args.source_x_args),
+            source_z=(args.source_z_type, *args.source_z_args),
+            out_dir=args.out_dir,
+            dt=args.simulate_delta_t,
+            endt=args.simulate_time,
+            use_anti_extension=args.use_anti_extension,
+            fft_backend=args.fft_backend,
+            threads=args.threads,
+            space_domain_method=args.space_domain_method,
+            fd_order=args.fd_order,
+            time_integrator=args.time_integrator,
+            reference_velocity=args.reference_velocity,
+            save_times=args.save_times,
+            save_format=args.save_format,
+            compression=args.compression,
+            save_stride=args.save_stride,
+            save_roi=args.save_roi,
+            save_exclude_absorb=args.save_exclude_absorb,
+            workers=args.workers
+        )
 
     # ******************************** Command show ********************************* #
     elif args.subcommand == constants.COMMAND_SHOW:
         files = args.input_file
-        datas = [SFD(f, args.file_format) for f in files]
+        datas = [SFD(f, args.file_format, lazy=True) for f in files]
         if len(datas) == 1:
             datas[0].draw(
                 seg=args.seg,
@@ -191,46 +325,57 @@ def main():
     # ****************************** Command draw gif ******************************* #
     elif args.subcommand == constants.COMMAND_SAVE_GIF:
         files = args.input_file
-        datas = [SFD(f, args.file_format) for f in files]
+        datas = [SFD(f, args.file_format, lazy=True) for f in files]
 
         if len(datas) == 1:
             datas[0].save_gif(
                 args.gif_name,
                 fps=args.fps,
-                dpi=args.dpi
+                dpi=args.dpi,
+                workers=args.workers,
+                fast=args.fast,
+                max_size=args.max_size
             )
         elif len(datas) == 2:
             save_gif_xz(*datas, args.gif_name, fps=args.fps, figsize=constants.TWO_FIG_SHAPE,
-                        dpi=args.dpi, vmax=args.vmax, vmin=args.vmin)
+                        dpi=args.dpi, vmax=args.vmax, vmin=args.vmin, workers=args.workers,
+                        fast=args.fast, max_size=args.max_size)
         else:
             parser_save_gif.error("Input file should be one or two.")
 
     elif args.subcommand == constants.COMMAND_SAVE_PNG:
         files = args.input_file
-        datas = [SFD(f, args.file_format) for f in files]
+        datas = [SFD(f, args.file_format, lazy=True) for f in files]
 
         if len(datas) == 1:
             datas[0].save_png(
                 args.save_dir,
-                dpi=args.dpi
+                dpi=args.dpi,
+                workers=args.workers,
+                fast=args.fast,
+                max_size=args.max_size
             )
         elif len(datas) == 2:
             save_png_xz(*datas, args.save_dir, figsize=constants.TWO_FIG_SHAPE,
-                        dpi=args.dpi, vmax=args.vmax, vmin=args.vmin)
+                        dpi=args.dpi, vmax=args.vmax, vmin=args.vmin, workers=args.workers,
+                        fast=args.fast, max_size=args.max_size)
         else:
             parser_save_png.error("Input file should has one or two.")
     
     elif args.subcommand == constants.COMMAND_SHOW_POINT:
         files = args.input_file
-        datas = [SFD(f, args.file_format) for f in files]
+        datas = [SFD(f, args.file_format, lazy=True) for f in files]
         show_points(datas, args.x, args.z)
 
     elif args.subcommand == constants.COMMAND_SHOW_SECTION:
         # TODO: 增加arg检查
         file = args.input_file
-        data = SFD(file, args.file_format)
+        data = SFD(file, args.file_format, lazy=True)
         data.show_section(args.axis, args.value, cmap=args.cmap)
 
+    elif args.subcommand == constants.COMMAND_CONVERT:
+        convert_sfd(args.input_file, args.output_file, args.file_format, args.compression, args.chunks)
+
 
 if __name__ == '__main__':
     import sys
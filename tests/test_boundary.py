@@ -0,0 +1,90 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from utils.boundary import Boundary
+from utils.medium import Medium
+from utils.medium_config import MediumConfig
+from utils.seismic_simulator import SeismicSimulator
+from utils.source import Source, get_ricker
+
+
+def get_boundary(boundary_type, length, alpha, n=64):
+    b = Boundary.get_boundary(boundary_type)
+    b.set_parameter(n, n, length, length, alpha)
+    return b
+
+
+def get_simulator(b, n=64, precision=None, **kwargs):
+    cfg = MediumConfig(0, 4 * n, 4, 0, 4 * n, 4, "I", precision=precision)
+    m = Medium.get_medium(cfg)
+    ones = np.ones(cfg.shape)
+    m.init_by_val(2.7 * ones, 24.3e6 * ones, 6.0e6 * ones)
+    s = Source(n // 2, n // 2, get_ricker(40, 0.03), get_ricker(40, 0.03))
+    return SeismicSimulator(m, s, b, 5e-4, 1, **kwargs)
+
+
+def run_boundary(boundary_type, length, alpha, n=64, steps=600, **kwargs):
+    simulator = get_simulator(get_boundary(boundary_type, length, alpha, n), n, **kwargs)
+    simulator.advance(100)
+    peak = np.abs(simulator.u).max()
+    simulator.advance(steps - 100)
+    return np.abs(simulator.u).max() / peak
+
+
+def test_cpml_absorbs_better_than_atten():
+    # the waves left the medium, only the reflections are left
+    atten = run_boundary("atten", 10, 0.05)
+    for kwargs in [dict(), dict(space_domain_method="FD")]:
+        cpml = run_boundary("cpml", 10, None, **kwargs)
+        assert cpml < 0.5 * atten
+
+
+@pytest.mark.parametrize("boundary_type", ["atten", "cpml"])
+def test_simulators_share_a_boundary(boundary_type):
+    settings = [dict(), dict(precision="float32"), dict(space_domain_method="FD")]
+    b = get_boundary(boundary_type, 10, None, n=32)
+    shared = [get_simulator(b, 32, **kwargs) for kwargs in settings]
+    solos = [get_simulator(get_boundary(boundary_type, 10, None, n=32), 32, **kwargs) for kwargs in settings]
+    # the waves reach the layers
+    for _ in range(150):
+        for s in shared:
+            s.forward()
+    for solo, s in zip(solos, shared):
+        solo.advance(150)
+        np.testing.assert_array_equal(s.u, solo.u)
+
+
+def test_cpml_boundary_is_pickled_without_simulations():
+    b = get_boundary("cpml", 10, None, n=32)
+    s = get_simulator(b, 32)
+    s.advance(60)
+    b2 = pickle.loads(pickle.dumps(b))
+    assert len(b2.simulations) == 0
+    assert (b2.a, b2.b, b2.reflection) == (b.a, b.b, b.reflection)
+
+    # the copy runs a new simulation as a new boundary
+    copied, new = get_simulator(b2, 32), get_simulator(get_boundary("cpml", 10, None, n=32), 32)
+    copied.advance(60)
+    new.advance(60)
+    np.testing.assert_array_equal(copied.u, new.u)
+
+
+def test_atten_apply_to_stacked_fields():
+    nx, nz = 40, 24
+    b = Boundary.get_boundary("atten")
+    b.set_parameter(nx, nz, 6, 4, 0.1)
+    gx = np.ones(nx)
+    gx[:6] = np.exp(-(0.1 * (6 - np.arange(6))) ** 2)
+    gx[-6:] = gx[:6][::-1]
+    gz = np.ones(nz)
+    gz[:4] = np.exp(-(0.1 * (4 - np.arange(4))) ** 2)
+    gz[-4:] = gz[:4][::-1]
+
+    u = np.random.default_rng(0).normal(size=(3, 2, nz, nx))
+    u_last = u.copy()
+    expected = u * gz[:, np.newaxis] * gx[np.newaxis, :]
+    b.apply(u, u_last)
+    np.testing.assert_allclose(u, expected, rtol=1e-15)
+    np.testing.assert_array_equal(u, u_last)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from tools.fd_engine import FDEngine
+
+from test_simulator import get_simulator
+
+
+@pytest.mark.parametrize("order", [2, 4, 6, 8])
+def test_fd_derivatives_converge_with_order(order):
+    kx, kz = 0.3, 0.25
+    errors = []
+    for h in [1.0, 0.5]:
+        x = np.arange(int(40 / h)) * h
+        z = np.arange(int(30 / h)) * h
+        x, z = np.meshgrid(x, z)
+        u = np.sin(kx * x + 0.3) * np.cos(kz * z)
+        u_xz = -kx * kz * np.cos(kx * x + 0.3) * np.sin(kz * z)
+
+        d = FDEngine(h, h, order).derivatives(u, 2 * u)
+        # far from the zero padded edges
+        inner = (slice(int(5 / h), -int(5 / h)), slice(int(5 / h), -int(5 / h)))
+        errors.append([
+            np.abs(d.ux_xx - -kx ** 2 * u)[inner].max(),
+            np.abs(d.uz_zz - -2 * kz ** 2 * u)[inner].max(),
+            np.abs(d.ux_xz - u_xz)[inner].max(),
+        ])
+    # halving the grid spacing divides the error by 2 ** order
+    assert np.all(np.log2(np.divide(*errors)) > order - 0.5)
+
+
+def test_fd_simulation_close_to_psm():
+    s_psm = get_simulator(n=64)
+    s_fd = get_simulator(n=64, space_domain_method="FD", fd_order=8)
+    s_psm.advance(50)
+    s_fd.advance(50)
+    assert np.linalg.norm(s_fd.u - s_psm.u) / np.linalg.norm(s_psm.u) < 1e-2
+
+
+@pytest.mark.parametrize("boundary_type", ["atten", "cpml"])
+def test_active_window_matches_whole_grid(boundary_type):
+    a = get_simulator(n=128, boundary_type=boundary_type, space_domain_method="FD", fd_order=4)
+    b = get_simulator(n=128, boundary_type=boundary_type, space_domain_method="FD", fd_order=4)
+    b.use_active_window = False
+
+    a.advance(5)
+    assert a.use_active_window and a.active_box[1] - a.active_box[0] < 64
+    b.advance(5)
+    np.testing.assert_array_equal(a.u, b.u)
+
+    # until the window covers the grid
+    a.advance(40)
+    b.advance(40)
+    assert not a.use_active_window
+    np.testing.assert_array_equal(a.u, b.u)
+    np.testing.assert_array_equal(a.u_last, b.u_last)
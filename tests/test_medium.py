@@ -0,0 +1,34 @@
+import numpy as np
+
+from tools.compact_coefficient import compact_coefficient
+from utils.medium import Medium
+from utils.medium_config import MediumConfig
+
+
+def test_compact_coefficient():
+    nz, nx = 6, 8
+    layered = np.repeat(np.arange(nz, dtype=float)[:, np.newaxis], nx, axis=1)
+    full = np.arange(nz * nx, dtype=float).reshape(nz, nx)
+
+    assert compact_coefficient(np.full((nz, nx), 2.7)).shape == (1, 1)
+    assert compact_coefficient(layered).shape == (nz, 1)
+    assert compact_coefficient(layered.T.copy()).shape == (1, nz)
+    assert compact_coefficient(full).shape == (nz, nx)
+    np.testing.assert_array_equal(np.broadcast_to(compact_coefficient(layered), layered.shape), layered)
+
+
+def test_layered_medium_step_value():
+    cfg = MediumConfig(0, 128, 4, 0, 128, 4, "VTI")
+    ones = np.ones(cfg.shape)
+    c11 = 24.3e6 * ones
+    c11[cfg.nz // 2:] *= 1.5
+
+    m = Medium.get_medium(cfg)
+    m.init_by_val(2.7 * ones, c11, 6.0e6 * ones, 15.6e6 * ones, 4.36e6 * ones)
+    assert m.c11.shape == (cfg.nz, 1)
+    assert m.rho.shape == (1, 1)
+
+    u = np.random.default_rng(0).standard_normal((2, *cfg.shape))
+    d = m.get_engine().derivatives(u[0], u[1])
+    expected_x = c11 * d.ux_xx + 4.36e6 * d.ux_zz + (6.0e6 + 4.36e6) * d.uz_xz
+    np.testing.assert_allclose(m.calculate_step_value(u[0], u[1])[0], expected_x, rtol=1e-12)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from tools.psm import cal_psm_k, cal_dx, cal_dz, cal_ddx, cal_ddz
+from tools.psm_engine import SharedSpectrumEngine
+
+
+def random_field(nz, nx, seed=0):
+    return np.random.default_rng(seed).standard_normal((nz, nx))
+
+
+def test_shared_spectrum_engine():
+    nz, nx = 48, 64
+    kx = cal_psm_k(nx, 2 * np.pi / (4 * nx))
+    kz = cal_psm_k(nz, 2 * np.pi / (4 * nz))
+    ux = random_field(nz, nx, 0)
+    uz = random_field(nz, nx, 1)
+
+    d = SharedSpectrumEngine(kx, kz).derivatives(ux, uz)
+
+    for u, (u_xx, u_zz, u_xz) in [(ux, d[:3]), (uz, d[3:])]:
+        np.testing.assert_allclose(u_xx, cal_ddx(u, kx), atol=1e-12)
+        np.testing.assert_allclose(u_zz, cal_ddz(u, kz), atol=1e-12)
+        np.testing.assert_allclose(u_xz, cal_dz(cal_dx(u, kx), kz), atol=1e-12)
+
+
+def test_rfft_derivatives_match_psm():
+    from tools import psm_rfft
+
+    for nz, nx in [(48, 64), (33, 50), (31, 27)]:
+        kx = cal_psm_k(nx, 2 * np.pi / (4 * nx))
+        kz = cal_psm_k(nz, 2 * np.pi / (4 * nz))
+        u = random_field(nz, nx)
+
+        np.testing.assert_allclose(psm_rfft.cal_dx(u, kx), cal_dx(u, kx), atol=1e-12)
+        np.testing.assert_allclose(psm_rfft.cal_ddx(u, kx), cal_ddx(u, kx), atol=1e-12)
+        np.testing.assert_allclose(psm_rfft.cal_dz(u, kz), cal_dz(u, kz), atol=1e-12)
+        np.testing.assert_allclose(psm_rfft.cal_ddz(u, kz), cal_ddz(u, kz), atol=1e-12)
+
+
+def test_rfft_derivative_of_sine():
+    from tools import psm_rfft
+
+    nz, nx = 32, 64
+    dx = 1 / nx
+    x = np.arange(nx) * dx
+    kx = cal_psm_k(nx, 2 * np.pi / (dx * nx))
+    u = np.tile(np.sin(2 * np.pi * 3 * x), (nz, 1))
+
+    du = np.tile(2 * np.pi * 3 * np.cos(2 * np.pi * 3 * x), (nz, 1))
+
+    np.testing.assert_allclose(psm_rfft.cal_dx(u, kx), du, atol=1e-9)
+    np.testing.assert_allclose(psm_rfft.cal_ddx(u, kx), -(2 * np.pi * 3) ** 2 * u, atol=1e-9)
+    np.testing.assert_allclose(psm_rfft.cal_dz(u.T, kx), du.T, atol=1e-9)
+
+
+def test_rfft_engine():
+    from tools.psm_engine import RFFTEngine
+
+    nz, nx = 48, 64
+    kx = cal_psm_k(nx, 2 * np.pi / (4 * nx))
+    kz = cal_psm_k(nz, 2 * np.pi / (4 * nz))
+    ux = random_field(nz, nx, 0)
+    uz = random_field(nz, nx, 1)
+
+    expected = SharedSpectrumEngine(kx, kz).derivatives(ux, uz)
+    for a, b in zip(RFFTEngine(kx, kz).derivatives(ux, uz), expected):
+        np.testing.assert_allclose(a, b, atol=1e-12)
+
+
+def test_scipy_fft_backend():
+    import pytest
+    pytest.importorskip("scipy")
+    from tools.fft_backend import FFTBackend
+
+    nz, nx = 48, 64
+    kx = cal_psm_k(nx, 2 * np.pi / (4 * nx))
+    kz = cal_psm_k(nz, 2 * np.pi / (4 * nz))
+    ux = random_field(nz, nx, 0)
+    uz = random_field(nz, nx, 1)
+
+    expected = SharedSpectrumEngine(kx, kz).derivatives(ux, uz)
+    backend = FFTBackend.get_backend("scipy", workers=2)
+    for a, b in zip(SharedSpectrumEngine(kx, kz, backend).derivatives(ux, uz), expected):
+        np.testing.assert_allclose(a, b, atol=1e-12)
+
+    out = np.empty((nz, nx))
+    assert backend.irfft(backend.rfft(ux), n=nx, out=out) is out
+    np.testing.assert_allclose(out, ux, atol=1e-12)
+    spectrum = np.empty((2, nz, nx), dtype=complex)
+    assert backend.fft2(np.stack([ux, uz]), out=spectrum) is spectrum
+    np.testing.assert_allclose(spectrum, np.fft.fft2(np.stack([ux, uz])), atol=1e-9)
+    assert backend.ifft(spectrum, axis=-2, out=spectrum) is spectrum
+    np.testing.assert_allclose(spectrum, np.fft.fft(np.stack([ux, uz]), axis=-1), atol=1e-9)
+
+
+def test_anti_shift_derivatives_match_psm_anti():
+    from tools import psm_anti, psm_anti_shift
+    from tools.psm_engine import AntiExtensionEngine
+
+    for nz, nx in [(48, 64), (33, 50), (31, 27)]:
+        kx2 = cal_psm_k(nx * 2, np.pi / (4 * nx))
+        kz2 = cal_psm_k(nz * 2, np.pi / (4 * nz))
+        ux = random_field(nz, nx, 0)
+        uz = random_field(nz, nx, 1)
+
+        np.testing.assert_allclose(psm_anti_shift.cal_dx(ux, kx2), psm_anti.cal_dx(ux, kx2), atol=1e-12)
+        np.testing.assert_allclose(psm_anti_shift.cal_ddx(ux, kx2), psm_anti.cal_ddx(ux, kx2), atol=1e-12)
+        np.testing.assert_allclose(psm_anti_shift.cal_dz(ux, kz2), psm_anti.cal_dz(ux, kz2), atol=1e-12)
+        np.testing.assert_allclose(psm_anti_shift.cal_ddz(ux, kz2), psm_anti.cal_ddz(ux, kz2), atol=1e-12)
+
+        d = AntiExtensionEngine(kx2, kz2).derivatives(ux, uz)
+        for u, (u_xx, u_zz, u_xz) in [(ux, d[:3]), (uz, d[3:])]:
+            np.testing.assert_allclose(u_xx, psm_anti.cal_ddx(u, kx2), atol=1e-12)
+            np.testing.assert_allclose(u_zz, psm_anti.cal_ddz(u, kz2), atol=1e-12)
+            np.testing.assert_allclose(u_xz, psm_anti.cal_dz(psm_anti.cal_dx(u, kx2), kz2), atol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from examples.wave_loop import wave_loop
+from utils.receivers import Receivers
+
+from test_simulator import get_simulator
+
+
+@pytest.mark.parametrize("interpolation", ["bilinear", "sinc"])
+def test_receivers_on_cells_record_the_fields(interpolation):
+    # receivers on cells need no interpolation, (x, z) = 4 * (ix, iz)
+    cells = [(3, 5), (16, 16), (30, 2)]
+    receivers = Receivers([[4 * ix, 4 * iz] for ix, iz in cells], interpolation=interpolation)
+    s = get_simulator(endt=0.01, receivers=receivers)
+
+    expected = []
+    for _ in range(s.remaining_steps()):
+        s.forward()
+        expected.append([[s.u[c, iz, ix] for ix, iz in cells] for c in range(2)])
+
+    np.testing.assert_allclose(receivers.data, np.moveaxis(expected, 0, -1), atol=1e-12 * np.abs(expected).max())
+    np.testing.assert_allclose(receivers.ts, np.arange(20) * s.dt)
+
+
+def test_decimated_traces_match_full_traces(tmp_path):
+    positions = [[50.5, 30.2], [90.0, 70.7]]
+    full = Receivers(positions)
+    wave_loop(get_simulator(endt=0.04), is_show=False, receivers=full)
+    decimated = Receivers(positions, decimation=4)
+    wave_loop(get_simulator(endt=0.04), is_show=False, receivers=decimated)
+
+    assert decimated.data.shape == (2, 2, 20)
+    # the last samples are filtered with zeros after the end
+    np.testing.assert_allclose(decimated.data[..., :12], full.data[..., :48:4], atol=1e-2 * np.abs(full.data).max())
+
+    traces = Receivers.read(decimated.save(str(tmp_path / "line")))
+    np.testing.assert_array_equal(traces.data, decimated.data)
+    np.testing.assert_array_equal(traces.positions, decimated.positions)
+    assert traces.dt == decimated.dt
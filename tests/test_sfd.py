@@ -0,0 +1,192 @@
+import os
+import struct
+import warnings
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from matplotlib.colors import Normalize
+from PIL import Image
+
+from examples.draw_sfd import save_gif_xz
+from tools.fast_render import render_frame
+from tools.live_viewer import LiveViewer, sample_vmax
+from utils.medium_config import MediumConfig
+from utils.sfd import SFD, AmplitudeStats, convert_sfd
+from utils.sfd_writer import SFDWriter
+
+
+def test_lazy_sfd_matches_sfd(tmp_path):
+    frames = np.random.default_rng(0).normal(size=(40, 12, 10)).astype(np.float32)
+    ts = np.linspace(0, 0.4, 40)
+    SFD(xmin=0, xmax=40, zmin=0, zmax=48, ts=ts, u=frames).save(str(tmp_path / "wave.sfd"), "bin")
+
+    sfd = SFD(str(tmp_path / "wave.sfd"), "bin")
+    lazy = SFD(str(tmp_path / "wave.sfd"), "bin", lazy=True)
+
+    assert isinstance(lazy.data, np.memmap)
+    np.testing.assert_array_equal(lazy.data[7], sfd.data[7])
+    np.testing.assert_array_equal(lazy.show_point(8, 12), sfd.show_point(8, 12))
+    np.testing.assert_array_equal(lazy.ts, sfd.ts)
+    # the colorbar limit of a lazy sfd is computed from a sample of the frames
+    assert 0.5 * sfd.vmax < lazy.vmax < 2 * sfd.vmax
+    assert lazy.vmin == -lazy.vmax
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_v2_round_trip_and_windows(tmp_path, compression):
+    frames = np.random.default_rng(1).normal(size=(21, 30, 50))
+    frames[:8] = 0  # early frames are zero and compress well
+    ts = np.linspace(0, 0.2, 21)
+    SFD(xmin=0, xmax=200, zmin=0, zmax=120, ts=ts, u=frames).save(str(tmp_path / "wave.sfd"), "bin")
+    fname = convert_sfd(str(tmp_path / "wave.sfd"), str(tmp_path / "wave_v2"), "bin", compression, (4, 16, 16))
+
+    sfd = SFD(fname)
+    np.testing.assert_array_equal(sfd.data, frames)
+    np.testing.assert_array_equal(sfd.ts, ts)
+    assert (sfd.xmin, sfd.xmax, sfd.zmin, sfd.zmax) == (0, 200, 0, 120)
+
+    lazy = SFD(fname, "v2", lazy=True)
+    np.testing.assert_array_equal(lazy.data[13], frames[13])
+    np.testing.assert_array_equal(lazy.data[:, 17, 33], frames[:, 17, 33])
+    np.testing.assert_array_equal(lazy.data[5:19:3, 10:40, -7:], frames[5:19:3, 10:40, -7:])
+    np.testing.assert_array_equal(lazy.data[[0, 20, 9]], frames[[0, 20, 9]])
+    if compression != "none":
+        assert os.path.getsize(fname) < os.path.getsize(tmp_path / "wave.sfd")
+
+
+def test_txt_round_trip_is_exact(tmp_path):
+    frames = np.random.default_rng(2).normal(size=(3, 7, 9)) * 1e-7
+    ts = np.linspace(0, 0.3, 3)
+    SFD(xmin=0, xmax=36, zmin=0, zmax=28, ts=ts, u=frames).save(str(tmp_path / "wave.sfd"), "txt")
+
+    sfd = SFD(str(tmp_path / "wave.sfd"), "txt")
+    np.testing.assert_array_equal(sfd.data, frames)
+    np.testing.assert_array_equal(sfd.ts, ts)
+
+
+def test_parallel_rendering_matches_serial(tmp_path):
+    frames = np.random.default_rng(3).normal(size=(11, 12, 10))
+    sfd = SFD(xmin=0, xmax=40, zmin=0, zmax=48, ts=np.linspace(0, 0.1, 11), u=frames)
+
+    sfd.save_png(str(tmp_path / "serial"), dpi=20, workers=1)
+    sfd.save_png(str(tmp_path / "parallel"), dpi=20, workers=3)
+    for i in range(11):
+        assert (tmp_path / "serial" / f"{i}.png").read_bytes() == (tmp_path / "parallel" / f"{i}.png").read_bytes()
+
+    sfd.save_gif(str(tmp_path / "serial.gif"), dpi=20, workers=1)
+    sfd.save_gif(str(tmp_path / "parallel.gif"), dpi=20, workers=3)
+    assert (tmp_path / "serial.gif").read_bytes() == (tmp_path / "parallel.gif").read_bytes()
+    with Image.open(tmp_path / "parallel.gif") as gif:
+        assert gif.n_frames == 11
+
+
+def test_fast_rendering_matches_matplotlib_colors(tmp_path):
+    frames = np.random.default_rng(4).normal(size=(5, 30, 40))
+    sfd = SFD(xmin=0, xmax=160, zmin=0, zmax=120, ts=np.linspace(0, 0.1, 5), u=frames)
+
+    cmap = matplotlib.colormaps["seismic"].resampled(255)
+    expected = cmap(Normalize(sfd.vmin, sfd.vmax)(frames[2]), bytes=True)[..., :3]
+    np.testing.assert_array_equal(render_frame(frames[2], sfd.vmin, sfd.vmax), expected)
+    assert render_frame(frames[2], sfd.vmin, sfd.vmax, max_size=16).shape == (10, 13, 3)
+    # empty colour limits, as a frame of zeros
+    zeros = np.zeros((30, 40))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        np.testing.assert_array_equal(render_frame(zeros, 0, 0), cmap(Normalize(0, 0)(zeros), bytes=True)[..., :3])
+
+    sfd.save_png(str(tmp_path / "pngs"), fast=True, workers=1)
+    with Image.open(tmp_path / "pngs" / "2.png") as png:
+        np.testing.assert_array_equal(np.asarray(png.convert("RGB")), expected)
+    save_gif_xz(sfd, sfd, str(tmp_path / "xz.gif"), fast=True, workers=1)
+    with Image.open(tmp_path / "xz.gif") as gif:
+        assert gif.n_frames == 5
+        assert gif.size == (2 * 40 + 4, 30)
+
+
+def test_live_viewer_updates_images_in_place():
+    frames = np.random.default_rng(5).normal(size=(2, 30, 40))
+    viewer = LiveViewer((30, 40), [0, 160, 120, 0], titles=["X", "Z"], seg=10)
+    images = viewer.fig.axes[0].images + viewer.fig.axes[1].images
+
+    viewer.update(frames, 0.1)
+    assert viewer.fig.axes[0].images + viewer.fig.axes[1].images == images
+    np.testing.assert_array_equal(images[1].get_array(), frames[1])
+    assert images[0].get_clim() == (-sample_vmax(frames[0]), sample_vmax(frames[0]))
+    # the next frame is skipped before seg
+    assert not viewer.due()
+    plt.close(viewer.fig)
+
+
+@pytest.mark.parametrize("save_format", ["bin", "v2"])
+def test_amplitude_is_stored_in_the_header(tmp_path, save_format):
+    frames = np.random.default_rng(6).standard_t(3, size=(6, 40, 50)) * 1e-6
+    ts = np.linspace(0, 0.5, 6)
+    expected = np.percentile(frames, 99)
+
+    stats = AmplitudeStats()
+    for frame in frames:
+        stats.add(frame)
+    assert abs(stats.percentile() / expected - 1) < 0.03
+
+    cfg = MediumConfig(0, 200, 4, 0, 160, 4, "I")
+    with SFDWriter(str(tmp_path / "wave.sfd"), cfg, 6, save_format) as writer:
+        for t, frame in zip(ts, frames):
+            writer.write(frame, t)
+    sfd = SFD(str(tmp_path / "wave.sfd"), save_format, lazy=True)
+    # the amplitude is read from the header, no frame is read
+    assert sfd._amplitude == stats.percentile()
+    assert sfd.vmax == stats.percentile() * 7.5
+
+
+def test_txt_header_has_no_amplitude(tmp_path):
+    frames = np.random.default_rng(8).normal(size=(3, 40, 50))
+    cfg = MediumConfig(0, 200, 4, 0, 160, 4, "I")
+    with SFDWriter(str(tmp_path / "wave.sfd"), cfg, 3, "txt") as writer:
+        for t, frame in zip([0.0, 0.1, 0.2], frames):
+            writer.write(frame, t)
+    with open(tmp_path / "wave.sfd") as fp:
+        assert fp.readline().split() == ["50", "40", "3"]
+
+    sfd = SFD(str(tmp_path / "wave.sfd"), "txt")
+    assert sfd._amplitude is None
+    assert abs(sfd.amplitude / np.percentile(frames, 99) - 1) < 0.03
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_bin_files_are_read_by_earlier_versions(tmp_path, streamed):
+    frames = np.random.default_rng(9).normal(size=(3, 4, 5))
+    ts = np.array([0.0, 0.1, 0.2])
+    fname = str(tmp_path / "wave.sfd")
+    if streamed:
+        with SFDWriter(fname, MediumConfig(0, 20, 4, 0, 16, 4, "I"), 4, "bin") as writer:
+            for t, frame in zip(ts, frames):
+                writer.write(frame, t)
+    else:
+        SFD(xmin=0, xmax=20, zmin=0, zmax=16, ts=ts, u=frames).save(fname, "bin")
+
+    # the reader of version 1.0 reads the header, the times and the frames by their exact size
+    with open(fname, "rb") as fp:
+        _, _, _, float_size, nx, nz, nt = struct.unpack("7i", fp.read(28))
+        fp.read(16)
+        np.testing.assert_array_equal(np.frombuffer(fp.read(nt * float_size)), ts)
+        np.testing.assert_array_equal(np.frombuffer(fp.read(nt * nz * nx * float_size)).reshape(nt, nz, nx), frames)
+        amplitude, = struct.unpack("d", fp.read())
+    assert SFD(fname, "bin", lazy=True)._amplitude == amplitude
+
+
+def test_bin_files_without_amplitude_are_read(tmp_path):
+    frames = np.random.default_rng(7).normal(size=(3, 4, 5))
+    ts = np.array([0.0, 0.1, 0.2])
+    # header of version 1.0, without the amplitude
+    with open(tmp_path / "old.sfd", "wb") as fp:
+        fp.write(struct.pack("3i4i4f", 1, 0, 0, 8, 5, 4, 3, 0, 20, 0, 16))
+        fp.write(ts.tobytes())
+        fp.write(frames.tobytes())
+
+    sfd = SFD(str(tmp_path / "old.sfd"), "bin", lazy=True)
+    np.testing.assert_array_equal(sfd.data, frames)
+    np.testing.assert_array_equal(sfd.ts, ts)
+    assert sfd._amplitude is None
+    assert 0 < sfd.vmax
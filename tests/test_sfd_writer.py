@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from examples.wave_loop import wave_loop
+from utils.medium_config import MediumConfig
+from utils.sfd import SFD
+from utils.sfd_writer import SFDWriter
+
+from test_simulator import get_simulator
+
+
+@pytest.mark.parametrize("save_format", ["txt", "bin", "v2"])
+def test_writer_matches_sfd_save(tmp_path, save_format):
+    cfg = MediumConfig(0, 40, 4, 0, 24, 4, "I")
+    frames = np.random.default_rng(0).normal(size=(5, cfg.nz, cfg.nx))
+    ts = np.linspace(0, 0.1, 5)
+
+    SFD(xmin=0, xmax=40, zmin=0, zmax=24, ts=ts, u=frames).save(str(tmp_path / "ref.sfd"), save_format)
+    with SFDWriter(str(tmp_path / "stream.sfd"), cfg, 5, save_format) as writer:
+        for t, frame in zip(ts, frames):
+            writer.write(frame, t)
+    ref = SFD(str(tmp_path / "ref.sfd"), save_format)
+    sfd = SFD(str(tmp_path / "stream.sfd"), save_format)
+
+    np.testing.assert_array_equal(sfd.data, ref.data)
+    np.testing.assert_array_equal(sfd.ts, ref.ts)
+    if save_format == "bin":
+        assert (tmp_path / "stream.sfd").read_bytes() == (tmp_path / "ref.sfd").read_bytes()
+
+    # a writer closed before all the frames are written keeps a readable file
+    with SFDWriter(str(tmp_path / "short.sfd"), cfg, 5, save_format) as writer:
+        for t, frame in zip(ts[:3], frames[:3]):
+            writer.write(frame, t)
+    sfd = SFD(str(tmp_path / "short.sfd"), save_format)
+    assert sfd.nt == 3
+    np.testing.assert_array_equal(sfd.data, ref.data[:3])
+    np.testing.assert_array_equal(sfd.ts, ref.ts[:3])
+
+
+def test_save_window(tmp_path):
+    full_x, _ = wave_loop(get_simulator(endt=0.01), is_show=False, is_save=True, save_times=3)
+    kwargs = dict(is_show=False, is_save=True, save_times=3, save_stride=2, save_roi=[10, 100, 0, 60],
+                  save_exclude_absorb=True)
+    sfd_x, _ = wave_loop(get_simulator(endt=0.01), **kwargs)
+    wave_loop(get_simulator(endt=0.01), x_outfile=str(tmp_path / "x.sfd"), z_outfile=str(tmp_path / "z.sfd"),
+              save_format="bin", **kwargs)
+    saved_x = SFD(str(tmp_path / "x.sfd"), "bin")
+
+    # cells 4, 6, ..., 24 along x and 4, 6, ..., 14 along z, absorbing strips are 4 cells of 4 m
+    window = slice(4, 16, 2), slice(4, 26, 2)
+    for sfd in [sfd_x, saved_x]:
+        np.testing.assert_array_equal(sfd.data, full_x.data[:, window[0], window[1]])
+        assert (sfd.xmin, sfd.xmax, sfd.zmin, sfd.zmax) == (16, 104, 16, 64)
+        assert (sfd.dx, sfd.dz) == (8, 8)
+    np.testing.assert_array_equal(saved_x.show_point(64, 40), full_x.show_point(64, 40))
@@ -0,0 +1,75 @@
+import multiprocessing
+
+import numpy as np
+
+from examples.wave_loop import wave_loop
+from utils.sfd import SFD
+from utils import shot_runner
+from utils.shot_runner import run_shots, get_shot_files
+from utils.source import Source, get_ricker
+
+from test_simulator import get_simulator
+
+
+def get_run_shots_kwargs(s, shots, tmp_path, **kwargs):
+    return dict(
+        medium=s.medium,
+        boundary=s.boundary,
+        shots=shots,
+        source_x=("ricker", 40, 0.02),
+        source_z=("ricker", 35, 0.02),
+        out_dir=str(tmp_path),
+        dt=s.dt,
+        endt=s.endt,
+        save_times=4,
+        save_format="bin",
+        workers=2,
+        **kwargs
+    )
+
+
+def test_run_shots_matches_single_run_and_resumes(tmp_path):
+    s = get_simulator(endt=0.02)
+    shots = [(10, 12), (20, 16)]
+    kwargs = get_run_shots_kwargs(s, shots, tmp_path)
+    assert sorted(run_shots(**kwargs)) == [0, 1]
+
+    s.source = Source(*shots[1], get_ricker(40, 0.02), get_ricker(35, 0.02))
+    sfd_x, sfd_z = wave_loop(s, is_show=False, is_save=True, save_times=4)
+    x_file, z_file = get_shot_files(str(tmp_path), 1)
+    np.testing.assert_array_equal(SFD(x_file, "bin").data, sfd_x.data)
+    np.testing.assert_array_equal(SFD(z_file, "bin").data, sfd_z.data)
+
+    # finished shots are skipped
+    assert run_shots(**kwargs) == []
+
+
+def test_run_shots_with_threads_after_a_threaded_simulator(tmp_path):
+    # the forked workers inherit the shared thread pool of this simulator, without its threads
+    s = get_simulator(endt=0.02, threads=2)
+    s.advance(2)
+    assert sorted(run_shots(**get_run_shots_kwargs(s, [(10, 12), (20, 16)], tmp_path, threads=2))) == [0, 1]
+
+
+def test_run_shots_with_cpml_boundary(tmp_path, monkeypatch):
+    # the boundary is pickled to the workers by the spawn start method, the default of macOS and Windows
+    monkeypatch.setattr(shot_runner, "Pool", multiprocessing.get_context("spawn").Pool)
+    s = get_simulator(endt=0.02, boundary_type="cpml")
+    shots = [(10, 12), (20, 16)]
+    assert sorted(run_shots(**get_run_shots_kwargs(s, shots, tmp_path))) == [0, 1]
+
+    s.source = Source(*shots[0], get_ricker(40, 0.02), get_ricker(35, 0.02))
+    sfd_x, _ = wave_loop(s, is_show=False, is_save=True, save_times=4)
+    np.testing.assert_array_equal(SFD(get_shot_files(str(tmp_path), 0)[0], "bin").data, sfd_x.data)
+
+
+def test_run_shots_saves_a_window(tmp_path):
+    s = get_simulator(endt=0.02)
+    save_kwargs = dict(save_stride=2, save_exclude_absorb=True)
+    assert run_shots(**get_run_shots_kwargs(s, [(10, 12)], tmp_path, **save_kwargs)) == [0]
+
+    s.source = Source(10, 12, get_ricker(40, 0.02), get_ricker(35, 0.02))
+    sfd_x, _ = wave_loop(s, is_show=False, is_save=True, save_times=4, **save_kwargs)
+    saved = SFD(get_shot_files(str(tmp_path), 0)[0], "bin")
+    assert saved.data.shape[1:] == (12, 12)
+    np.testing.assert_array_equal(saved.data, sfd_x.data)
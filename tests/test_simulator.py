@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+from tools.slab_executor import SlabExecutor
+from utils.boundary import Boundary
+from utils.medium import Medium
+from utils.medium_config import MediumConfig
+from utils.seismic_simulator import SeismicSimulator, BatchSeismicSimulator, time_fd2, \
+    cal_kspace_stability
+from utils.source import Source, get_ricker, get_none
+
+
+def get_simulator(medium_type="I", n=32, boundary_type="atten", endt=0.05, precision=None, dt=5e-4, **kwargs):
+    cfg = MediumConfig(0, 4 * n, 4, 0, 4 * n, 4, medium_type, precision=precision)
+    m = Medium.get_medium(cfg)
+    ones = np.ones(cfg.shape)
+    if medium_type == "I":
+        m.init_by_val(2.7 * ones, 24.3e6 * ones, 6.0e6 * ones)
+    else:
+        m.init_by_val(2.7 * ones, 24.3e6 * ones, 6.0e6 * ones, 15.6e6 * ones, 4.36e6 * ones)
+
+    b = Boundary.get_boundary(boundary_type)
+    b.set_parameter(n, n, 4, 4, 0.05)
+
+    s = Source(n // 3, n // 2, get_ricker(40, 0.02), get_ricker(35, 0.02))
+    return SeismicSimulator(m, s, b, dt, endt, **kwargs)
+
+
+def test_advance_matches_forward():
+    a = get_simulator()
+    b = get_simulator()
+
+    for _ in range(30):
+        a.forward()
+    assert b.advance(30) == 30
+
+    np.testing.assert_array_equal(a.u, b.u)
+    np.testing.assert_array_equal(a.u_last, b.u_last)
+    assert a.current_nt == b.current_nt == 30
+
+
+def test_advance_stops_at_end():
+    s = get_simulator(endt=0.01)
+    assert s.advance(1000) == 20
+    assert s.advance(10) == 0
+
+
+def test_time_step_matches_time_fd2():
+    s = get_simulator()
+    s.advance(20)
+    u, u_last = s.u.copy(), s.u_last.copy()
+
+    expected, _ = time_fd2(u, u_last, s.dt, 1 / s.medium.rho * s.medium.calculate_step_value(u[0], u[1]))
+    state = s.u
+    s.time_step()
+
+    np.testing.assert_allclose(s.u, expected, atol=1e-12 * np.abs(expected).max())
+    # time levels are rotated, not copied.
+    assert s.u_last is state
+
+
+def test_float32_simulation_close_to_float64():
+    s = get_simulator(precision="float32")
+    s_ref = get_simulator()
+    s.advance(60)
+    s_ref.advance(60)
+
+    assert s.u.dtype == np.float32
+    assert s.medium.get_engine().derivatives(s.ux, s.uz).ux_xx.dtype == np.float32
+    np.testing.assert_allclose(s.u, s_ref.u, atol=1e-5 * np.abs(s_ref.u).max())
+
+
+def test_batch_simulator_matches_single_shots():
+    n = 32
+    singles = [get_simulator(n=n, use_anti_extension=True) for _ in range(3)]
+    for i, single in enumerate(singles):
+        single.source = Source(4 + 8 * i, n // 2 - i, get_ricker(40, 0.02), get_ricker(30 + i, 0.02))
+
+    batch = BatchSeismicSimulator(
+        singles[0].medium, [single.source for single in singles], singles[0].boundary, 5e-4, 0.05,
+        use_anti_extension=True, chunk_size=2
+    )
+    assert batch.u.shape == (3, 2, n, n)
+
+    batch.advance(40)
+    for i, single in enumerate(singles):
+        single.advance(40)
+        np.testing.assert_allclose(batch.u[i], single.u, atol=1e-12 * np.abs(single.u).max())
+        np.testing.assert_allclose(batch.an_u[i], single.an_u, atol=1e-12 * np.abs(single.an_u).max())
+        np.testing.assert_array_equal(batch.get_shot(i)[1], batch.uz[i])
+
+
+def test_threads_match_single_thread():
+    for kwargs in [dict(), dict(use_anti_extension=True), dict(space_domain_method="FD")]:
+        a = get_simulator(n=64, **kwargs)
+        b = get_simulator(n=64, threads=3, **kwargs)
+        assert len(b.executor.get_slabs(64)) == 3
+        a.advance(20)
+        b.advance(20)
+        np.testing.assert_array_equal(a.u, b.u)
+
+
+def test_simulators_share_the_thread_pool():
+    a = get_simulator(threads=3)
+    b = get_simulator(threads=3)
+    assert a.executor is b.executor
+    assert get_simulator().executor.pool is None
+
+    with SlabExecutor(2) as executor:
+        assert executor.call((abs, -1), (abs, -2)) == [1, 2]
+    assert executor.pool is None
+
+
+def test_simulators_with_different_settings_share_a_medium():
+    settings = [dict(space_domain_method="FD", fd_order=2), dict(space_domain_method="FD", fd_order=8),
+                dict(time_integrator="kspace"), dict(threads=2)]
+    solos = [get_simulator(**kwargs) for kwargs in settings]
+    shared = [get_simulator(**kwargs) for kwargs in settings]
+    for s in shared[1:]:
+        s.medium = shared[0].medium
+    for _ in range(20):
+        for s in shared:
+            s.forward()
+    for solo, s in zip(solos, shared):
+        solo.advance(20)
+        np.testing.assert_array_equal(s.u, solo.u)
+
+
+def test_kspace_plane_p_wave_exact_at_large_dt():
+    # vp * dt / dx = 1.5, far beyond the limit of the fd2 integrator
+    s = get_simulator(dt=2e-3, endt=1, time_integrator="kspace")
+    s.source = Source(0, 0, get_none(), get_none())
+    # no source and no absorption, the plane wave is periodic
+    s.boundary = Boundary.get_boundary("atten")
+    s.boundary.set_parameter(32, 32, 4, 4, 0)
+
+    x = np.arange(32) * s.medium.cfg.dx
+    k = 2 * np.pi * 4 / (32 * s.medium.cfg.dx)
+    w = s.medium.vpmax * k
+    s.u[0] = np.cos(k * x)
+    s.u_last[0] = np.cos(k * x) * np.cos(w * s.dt)
+
+    s.advance(17)
+    expected = np.broadcast_to(np.cos(k * x) * np.cos(w * 17 * s.dt), s.u[0].shape)
+    np.testing.assert_allclose(s.u[0], expected, atol=1e-12)
+    np.testing.assert_allclose(s.u[1], 0, atol=1e-12)
+
+
+def test_kspace_stability_limit():
+    with pytest.raises(AssertionError):
+        get_simulator(dt=2e-3)
+    with pytest.raises(AssertionError):
+        get_simulator(dt=2e-3, time_integrator="kspace", reference_velocity=1000)
+    assert cal_kspace_stability(3000, 1000) > np.sqrt(2) / np.pi
+    get_simulator(dt=2e-3, time_integrator="kspace")
+
+    for kwargs in [dict(use_anti_extension=True), dict(space_domain_method="FD")]:
+        with pytest.raises(ValueError):
+            get_simulator(time_integrator="kspace", **kwargs)
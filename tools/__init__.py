@@ -2,6 +2,8 @@ from . import psm
 from .get_file_ext import get_file_ext
 from .props import props
 from .plot_frame import plot_frame, plot_frame_xz
+from .fast_render import render_frame
+from .live_viewer import LiveViewer
 from .check_file_exists import check_file_exists
 from .cover_cmat_arg_to_matrix import cover_cmat_arg_to_matrix
 
@@ -11,6 +13,8 @@ __all__ = [
     psm,
     plot_frame,
     plot_frame_xz,
+    render_frame,
+    LiveViewer,
     check_file_exists,
     cover_cmat_arg_to_matrix
 ]
@@ -0,0 +1,72 @@
+import numpy as np
+
+COEFFICIENT_CONSTANT = "constant"
+COEFFICIENT_LAYERED_Z = "layered along z"
+COEFFICIENT_LAYERED_X = "layered along x"
+COEFFICIENT_FULL = "full"
+
+
+def coefficient_kind(c):
+    """
+    Get the kind of a 2D coefficient array with shape (nz, nx).
+
+    Returns:
+        COEFFICIENT_CONSTANT if all values are the same,
+        COEFFICIENT_LAYERED_Z if it only changes with depth,
+        COEFFICIENT_LAYERED_X if it only changes with x,
+        COEFFICIENT_FULL otherwise.
+    """
+    c = np.asarray(c)
+    if c.ndim < 2:
+        c = c.reshape((1,) * (2 - c.ndim) + c.shape)
+    constant_x = c.shape[1] == 1 or bool(np.all(c == c[:, :1]))
+    constant_z = c.shape[0] == 1 or bool(np.all(c == c[:1, :]))
+    if constant_x and constant_z:
+        return COEFFICIENT_CONSTANT
+    elif constant_x:
+        return COEFFICIENT_LAYERED_Z
+    elif constant_z:
+        return COEFFICIENT_LAYERED_X
+    return COEFFICIENT_FULL
+
+
+def compact_coefficient(c, dtype=None):
+    """
+    Store a coefficient array in the smallest shape which still broadcast to (nz, nx).
+
+    A constant medium is stored with shape (1, 1), a depth layered medium with shape (nz, 1),
+    a medium which only changes with x with shape (1, nx), other mediums are not changed.
+    The coefficient is converted to `dtype`, defaults to float64.
+    """
+    if dtype is None:
+        dtype = np.float64
+    c = np.asarray(c, dtype=dtype)
+    if c.ndim < 2:
+        c = c.reshape((1,) * (2 - c.ndim) + c.shape)
+    kind = coefficient_kind(c)
+    if kind == COEFFICIENT_CONSTANT:
+        return np.ascontiguousarray(c[:1, :1])
+    elif kind == COEFFICIENT_LAYERED_Z:
+        return np.ascontiguousarray(c[:, :1])
+    elif kind == COEFFICIENT_LAYERED_X:
+        return np.ascontiguousarray(c[:1, :])
+    return c
+
+
+def take_window(c, window):
+    """
+    Part of an array with shape (..., nz, nx) in `window`, axes stored with length 1 broadcast
+    to any window and are not sliced.
+
+    Args:
+        c: array, such as a compact coefficient or a wave field.
+        window: (z slice, x slice), or None for the whole array.
+    """
+    if window is None or np.ndim(c) < 2:
+        return c
+    z_slice, x_slice = window
+    if c.shape[-2] == 1:
+        z_slice = slice(None)
+    if c.shape[-1] == 1:
+        x_slice = slice(None)
+    return c[..., z_slice, x_slice]
@@ -0,0 +1,103 @@
+"""
+Colour map frames into rasters without matplotlib figures.
+
+A frame is normalized by vmin and vmax as imshow does and mapped to the indices of a lookup table
+of the colormap, one pixel per cell, or per block of cells when the frame is downsampled. The
+indices are written by Pillow as palette images, so the pngs and gifs need no quantization.
+"""
+import numpy as np
+import matplotlib
+from PIL import Image
+
+import constants
+
+
+def get_palette(cmap=None):
+    """
+    Lookup table of a colormap.
+
+    Args:
+        cmap: name of a matplotlib colormap, defaults to constants.FAST_RENDER_CMAP.
+
+    Returns:
+        (FAST_RENDER_COLORS + 1, 3) uint8 array, the colors of the colormap followed by the white background.
+    """
+    if cmap is None:
+        cmap = constants.FAST_RENDER_CMAP
+    colors = matplotlib.colormaps[cmap].resampled(constants.FAST_RENDER_COLORS)(np.arange(constants.FAST_RENDER_COLORS))
+    # truncated as the bytes of matplotlib colormaps
+    palette = (colors[:, :3] * 255).astype(np.uint8)
+    return np.concatenate([palette, [[255, 255, 255]]]).astype(np.uint8)
+
+
+def downsample(data, max_size):
+    """
+    Mean of blocks of cells, so the larger side of the frame is at most `max_size` cells.
+    The cells which do not fill a block at the high ends are dropped.
+    """
+    factor = -(-max(data.shape) // max_size)
+    if factor <= 1:
+        return data
+    nz, nx = data.shape[0] // factor, data.shape[1] // factor
+    return data[:nz * factor, :nx * factor].reshape(nz, factor, nx, factor).mean(axis=(1, 3))
+
+
+def cal_color_index(data, vmin, vmax, max_size=None):
+    """
+    Indices of the colors of the cells in the palette of `get_palette`, values out of [vmin, vmax]
+    take the colors of the ends.
+
+    Args:
+        data: 2D frame.
+        vmin: value of the first color.
+        vmax: value of the last color.
+        max_size: max pixels of the larger side, the frame is downsampled by `downsample`. Defaults to one pixel per cell.
+
+    Returns:
+        uint8 array of the indices.
+    """
+    data = np.asarray(data)
+    if max_size is not None:
+        data = downsample(data, max_size)
+    if not vmin < vmax:
+        # every value has the first color, as `matplotlib.colors.Normalize` of empty limits
+        return np.zeros(data.shape, dtype=np.uint8)
+    n = constants.FAST_RENDER_COLORS
+    x = (data - vmin) * (n / (vmax - vmin))
+    np.clip(x, 0, n - 1, out=x)
+    return x.astype(np.uint8)
+
+
+def join_panels(panels):
+    """
+    Put color indices side by side, with background between them.
+    """
+    if len(panels) == 1:
+        return panels[0]
+    nz = max(panel.shape[0] for panel in panels)
+    gap = np.full((nz, constants.FAST_RENDER_GAP), constants.FAST_RENDER_COLORS, dtype=np.uint8)
+    columns = []
+    for panel in panels:
+        if columns:
+            columns.append(gap)
+        columns.append(np.pad(panel, ((0, nz - panel.shape[0]), (0, 0)), constant_values=constants.FAST_RENDER_COLORS))
+    return np.concatenate(columns, axis=1)
+
+
+def render_frame(data, vmin, vmax, cmap=None, max_size=None):
+    """
+    Colour map one frame, see `cal_color_index`.
+
+    Returns:
+        (nz, nx, 3) uint8 rgb array.
+    """
+    return get_palette(cmap)[cal_color_index(data, vmin, vmax, max_size)]
+
+
+def get_image(index, palette):
+    """
+    Pillow palette image of color indices, see `get_palette`.
+    """
+    image = Image.fromarray(index)
+    image.putpalette(palette.ravel())
+    return image
@@ -0,0 +1,170 @@
+"""
+Finite difference derivatives with staggered stencils of order 2 to 8.
+
+The first derivative between two grid points, at i + 1/2, is
+
+    D+ u[i + 1/2] = 1 / h * sum(c[m] * (u[i + m] - u[i - m + 1]) for m in 1..M)
+
+with the staggered coefficients c of order 2M. The second derivatives on the grid points are the
+staggered pair D- D+. The mixed derivative is two centered first derivatives of the same order,
+
+    D u[i] = 1 / h * sum(a[m] * (u[i + m] - u[i - m]) for m in 1..M)
+
+Outside the medium the field is zero, so no periodic wrap or anti extension is needed.
+"""
+import numpy as np
+
+import constants
+from .psm_engine import PSMEngine, Derivatives
+
+
+def cal_fd_coefficients(order):
+    """
+    Staggered finite difference coefficients c[1..M] of `order` = 2M.
+
+    The coefficients are the solution of sum(c[m] * (2m - 1) ** (2l - 1)) = 1 if l == 1 else 0
+    for l in 1..M, which makes D+ exact for polynomials of degree below `order`.
+    """
+    if order not in constants.FD_ORDERS:
+        raise ValueError("fd order {} does not support. Choice in {}.".format(order, constants.FD_ORDERS))
+    m = order // 2
+    a = (2 * np.arange(1, m + 1)[np.newaxis, :] - 1.) ** (2 * np.arange(1, m + 1)[:, np.newaxis] - 1)
+    b = np.zeros(m)
+    b[0] = 1
+    return np.linalg.solve(a, b)
+
+
+def cal_fd_center_coefficients(order):
+    """
+    Centered finite difference coefficients a[1..M] of the first derivative of `order` = 2M.
+
+    The coefficients are the solution of sum(2 * a[m] * m ** (2l - 1)) = 1 if l == 1 else 0
+    for l in 1..M.
+    """
+    if order not in constants.FD_ORDERS:
+        raise ValueError("fd order {} does not support. Choice in {}.".format(order, constants.FD_ORDERS))
+    m = order // 2
+    a = 2 * np.arange(1, m + 1.)[np.newaxis, :] ** (2 * np.arange(1, m + 1)[:, np.newaxis] - 1)
+    b = np.zeros(m)
+    b[0] = 1
+    return np.linalg.solve(a, b)
+
+
+def cal_fd_stability(order):
+    """
+    Max value of (vmax * dt / min(dx, dz)) of the second order time step with stencils of `order`.
+
+    The largest wave number of D- D+ is (2 * sum(|c|) / h) ** 2, so with both axes the leapfrog
+    step is stable if vmax * dt / h <= 1 / (sqrt(2) * sum(|c|)).
+    """
+    return 1 / (np.sqrt(2) * np.sum(np.abs(cal_fd_coefficients(order))))
+
+
+def _axis_slice(a, axis, start, stop):
+    index = [slice(None)] * a.ndim
+    index[axis] = slice(start, stop)
+    return a[tuple(index)]
+
+
+class FDEngine(PSMEngine):
+    """
+    Derivatives with staggered finite difference stencils, see the module docstring.
+
+    ux and uz are stacked in one padded work array, so every stencil term is one slicing
+    operation for both components.
+    """
+    def __init__(self, dx, dz, order=None, dtype=None):
+        super().__init__(None, dtype)
+        if order is None:
+            order = constants.FD_DEFAULT_ORDER
+        self.order = order
+        self.m = order // 2
+        self.c = cal_fd_coefficients(order)
+        self.a = cal_fd_center_coefficients(order)
+        # cells along one axis which a step reaches, the second derivative D- D+ has the widest stencil
+        self.reach = 2 * self.m - 1
+        self.dx = dx
+        self.dz = dz
+
+    def _pad(self, name, u, axis):
+        """
+        Copy u into a work array with 2M zeros before and after along `axis`.
+        """
+        m2 = 2 * self.m
+        shape = list(u.shape)
+        shape[axis] += 2 * m2
+        padded = self._buffer(name, tuple(shape), u.dtype)
+        _axis_slice(padded, axis, 0, m2)[...] = 0
+        _axis_slice(padded, axis, -m2, None)[...] = 0
+        _axis_slice(padded, axis, m2, -m2)[...] = u
+        return padded
+
+    def _stencil(self, name, a, axis, length, offset_plus, offset_minus, h, coefficients=None):
+        """
+        out[i] = 1 / h * sum(c[m] * (a[i + offset_plus(m)] - a[i + offset_minus(m)])), i in 0..length-1
+        """
+        if coefficients is None:
+            coefficients = self.c
+        shape = list(a.shape)
+        shape[axis] = length
+        out = self._buffer(name, tuple(shape), a.dtype)
+        work = self._buffer(name + "_work", tuple(shape), a.dtype)
+        for j, c in enumerate(coefficients):
+            m = j + 1
+            plus = _axis_slice(a, axis, offset_plus(m), offset_plus(m) + length)
+            minus = _axis_slice(a, axis, offset_minus(m), offset_minus(m) + length)
+            if j == 0:
+                np.subtract(plus, minus, out=out)
+                out *= c / h
+            else:
+                np.subtract(plus, minus, out=work)
+                work *= c / h
+                out += work
+        return out
+
+    def _d_plus(self, padded, axis, n, h):
+        """
+        D+ at the half grid points, index q is at (q + M - 1 + 1/2) of the padded field.
+        """
+        m = self.m
+        name = "d_plus_x" if axis == -1 else "d_plus_z"
+        return self._stencil(name, padded, axis, n + 2 * m + 1, lambda k: m - 1 + k, lambda k: m - k, h)
+
+    def _second(self, name, padded, axis, n, h):
+        """
+        Second derivative D- D+ on the grid points.
+        """
+        m = self.m
+        d_plus = self._d_plus(padded, axis, n, h)
+        return self._stencil(name, d_plus, axis, n, lambda k: m + k, lambda k: m + 1 - k, h)
+
+    def _first(self, name, padded, axis, n, h):
+        """
+        Centered first derivative on the grid points.
+        """
+        m2 = 2 * self.m
+        return self._stencil(name, padded, axis, n, lambda k: m2 + k, lambda k: m2 - k, h, self.a)
+
+    def _x_derivatives(self, u):
+        """
+        Second derivative along x and the mixed derivative.
+        """
+        nz, nx = u.shape[-2:]
+        padded_x = self._pad("padded_x", u, -1)
+        u_xx = self._second("xx", padded_x, -1, nx, self.dx)
+        u_x = self._first("x", padded_x, -1, nx, self.dx)
+        u_xz = self._first("xz", self._pad("padded_xz", u_x, -2), -2, nz, self.dz)
+        return u_xx, u_xz
+
+    def derivatives(self, ux, uz):
+        nz = ux.shape[-2]
+        u = self._buffer("u", (2, *ux.shape), self.dtype)
+        u[0] = ux
+        u[1] = uz
+
+        (u_xx, u_xz), u_zz = self._call(
+            (self._x_derivatives, u),
+            (self._second, "zz", self._pad("padded_z", u, -2), -2, nz, self.dz),
+        )
+
+        return Derivatives(u_xx[0], u_zz[0], u_xz[0], u_xx[1], u_zz[1], u_xz[1])
@@ -0,0 +1,177 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import constants
+
+# numpy.fft accept the `out` argument since numpy 2.0
+NUMPY_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
+
+def _to_out(res, out):
+    if out is None:
+        return res
+    np.copyto(out, res)
+    return out
+
+
+class FFTBackend(ABC):
+    """
+    Fourier transforms used by the pseudo-spectral derivatives.
+
+    Every transform accept an optional preallocated `out` array, the result is written
+    into it and it is returned. All transforms work on the last axes, so any leading axes
+    are transformed together in one call.
+    """
+    @classmethod
+    def get_backend(cls, backend_type=None, workers=None):
+        if backend_type is None:
+            backend_type = constants.FFT_NUMPY
+        if backend_type == constants.FFT_NUMPY:
+            return NumpyBackend(workers)
+        elif backend_type == constants.FFT_SCIPY:
+            return ScipyBackend(workers)
+        else:
+            raise ValueError("fft backend {} does not support. Choice in {}."
+                             .format(backend_type, constants.FFT_BACKENDS))
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = 1
+        self.workers = workers
+        self.backend_type = None
+
+    @abstractmethod
+    def fft2(self, a, out=None):
+        pass
+
+    @abstractmethod
+    def ifft2(self, a, out=None):
+        pass
+
+    @abstractmethod
+    def fft(self, a, axis=-1, out=None):
+        pass
+
+    @abstractmethod
+    def ifft(self, a, axis=-1, out=None):
+        pass
+
+    @abstractmethod
+    def rfft(self, a, axis=-1, out=None):
+        pass
+
+    @abstractmethod
+    def irfft(self, a, n, axis=-1, out=None):
+        pass
+
+    def __str__(self):
+        return f"""\
+----------------------------- FFT Backend --------------------------------
+FFT Backend: {self.backend_type} \t Workers: {self.workers}
+--------------------------------------------------------------------------
+"""
+
+
+class NumpyBackend(FFTBackend):
+    def __init__(self, workers=None):
+        super().__init__(workers)
+        self.backend_type = constants.FFT_NUMPY
+        if self.workers != 1:
+            print("numpy fft backend is single-threaded, each transform use one of the {} threads.".format(self.workers))
+            self.workers = 1
+
+    def fft2(self, a, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.fft2(a, out=out)
+        return _to_out(np.fft.fft2(a), out)
+
+    def ifft2(self, a, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.ifft2(a, out=out)
+        return _to_out(np.fft.ifft2(a), out)
+
+    def fft(self, a, axis=-1, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.fft(a, axis=axis, out=out)
+        return _to_out(np.fft.fft(a, axis=axis), out)
+
+    def ifft(self, a, axis=-1, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.ifft(a, axis=axis, out=out)
+        return _to_out(np.fft.ifft(a, axis=axis), out)
+
+    def rfft(self, a, axis=-1, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.rfft(a, axis=axis, out=out)
+        return _to_out(np.fft.rfft(a, axis=axis), out)
+
+    def irfft(self, a, n, axis=-1, out=None):
+        if NUMPY_FFT_OUT:
+            return np.fft.irfft(a, n=n, axis=axis, out=out)
+        return _to_out(np.fft.irfft(a, n=n, axis=axis), out)
+
+
+class ScipyBackend(FFTBackend):
+    """
+    `scipy.fft` with multi-threading, the transforms are split into `workers` threads.
+
+    scipy.fft has no `out` argument. The complex transforms of complex arrays copy the input into
+    `out` and transform it there in place, so no result array is allocated. For real input, and for
+    the real transforms which change the shape, the result is allocated by scipy and `out` is only a
+    copy of it, transforming real input is faster than transforming a complex copy of it in place.
+    """
+    def __init__(self, workers=None):
+        super().__init__(workers)
+        try:
+            import scipy.fft
+        except ImportError:
+            raise ImportError("fft backend '{}' need scipy, install it by `pip install scipy`."
+                              .format(constants.FFT_SCIPY))
+        self.fft = scipy.fft
+        self.backend_type = constants.FFT_SCIPY
+
+    def _c2c(self, func, a, out, **kwargs):
+        if out is None or not np.iscomplexobj(a):
+            return _to_out(func(a, workers=self.workers, **kwargs), out)
+        if a is not out:
+            np.copyto(out, a)
+        res = func(out, overwrite_x=True, workers=self.workers, **kwargs)
+        if np.shares_memory(res, out):
+            return out
+        # scipy may still allocate, as for arrays which are not contiguous
+        return _to_out(res, out)
+
+    def fft2(self, a, out=None):
+        return self._c2c(self.fft.fft2, a, out)
+
+    def ifft2(self, a, out=None):
+        return self._c2c(self.fft.ifft2, a, out)
+
+    def fft(self, a, axis=-1, out=None):
+        return self._c2c(self.fft.fft, a, out, axis=axis)
+
+    def ifft(self, a, axis=-1, out=None):
+        return self._c2c(self.fft.ifft, a, out, axis=axis)
+
+    def rfft(self, a, axis=-1, out=None):
+        return _to_out(self.fft.rfft(a, axis=axis, workers=self.workers), out)
+
+    def irfft(self, a, n, axis=-1, out=None):
+        return _to_out(self.fft.irfft(a, n=n, axis=axis, workers=self.workers), out)
+
+
+default_backend = NumpyBackend()
+
+
+def get_default_backend():
+    return default_backend
+
+
+def set_default_backend(backend: FFTBackend):
+    """
+    Set the backend used by `tools.psm`, `tools.psm_anti` and `tools.psm_rfft` when no
+    backend is passed to their functions.
+    """
+    global default_backend
+    default_backend = backend
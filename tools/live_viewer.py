@@ -0,0 +1,168 @@
+"""
+Live display of wave fields.
+
+The images are created once and updated with `set_data`; only the images and the time text are
+redrawn over a saved background of the figure (blitting), the axes are never laid out again.
+The colour limits are computed from a strided sample of the cells instead of the whole field.
+A frame is only drawn when the viewer is due, so a fast simulation skips frames instead of
+waiting for the display.
+"""
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import constants
+from .plot_frame import plot_frame
+
+
+def sample_vmax(data):
+    """
+    Colour limit of a frame as `SFD.cal_vmax`, from about constants.LIVE_VIEW_SAMPLE_CELLS cells.
+    """
+    stride = max(1, int(np.sqrt(data.size / constants.LIVE_VIEW_SAMPLE_CELLS)))
+    return np.percentile(data[::stride, ::stride], constants.SFD_AMPLITUDE_PERCENTILE) * constants.SFD_VMAX_SCALE
+
+
+class LiveViewer:
+    """
+    Figure of one or more panels of frames, updated in place.
+
+        viewer = LiveViewer((nz, nx), extent, titles=["X", "Z"])
+        if viewer.due():
+            viewer.update([ux, uz], t)
+        viewer.show()
+    """
+    def __init__(self, shape, extent, titles=None, figsize=None, dpi=None, vmin=None, vmax=None, seg=None,
+                 xlabel=None, ylabel=None, **kwargs):
+        """
+        Args:
+            shape: (nz, nx) of the frames.
+            extent: extent of the images, see `plt.imshow`.
+            titles: titles of the panels, the number of titles is the number of panels. Defaults to one panel.
+            figsize: size of the figure.
+            dpi: resolution of the figure.
+            vmin: min of the colour limits, defaults to the sampled limit of the first frame of every update.
+            vmax: max of the colour limits, defaults to the sampled limit of the first frame of every update.
+            seg: min time between two drawn frames, see `due`. Defaults to constants.SHOW_SEG.
+            xlabel: label of the x axes.
+            ylabel: label of the z axes.
+            kwargs: keyword arguments of `plot_frame`, as cmap.
+        """
+        if titles is None:
+            titles = [None]
+        if seg is None:
+            seg = constants.SHOW_SEG
+        self.vmin = vmin
+        self.vmax = vmax
+        self.seg = seg
+        self.next_draw = 0.0
+
+        self.fig = plt.figure(figsize=figsize, dpi=dpi)
+        self.images = []
+        for i, title in enumerate(titles):
+            ax = self.fig.add_subplot(1, len(titles), i + 1)
+            image = plot_frame(np.zeros(shape), ax=ax, extent=extent, vmin=-1, vmax=1, animated=True, **kwargs)
+            self.images.append(image)
+            if title is not None:
+                ax.set_title(title)
+            if xlabel is not None:
+                ax.set_xlabel(xlabel)
+            if ylabel is not None:
+                ax.set_ylabel(ylabel)
+        self.text = self.fig.suptitle(" ", animated=True)
+        self.artists = self.images + [self.text]
+
+        self.blit = self.fig.canvas.supports_blit
+        self.background = None
+        # the background is saved again after every full draw of the figure, as on a resize
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+            self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def due(self):
+        """
+        True if a frame should be drawn now. The start of two drawn frames are at least `seg`
+        apart, and the time between two drawn frames is at least the time of drawing one, so the
+        display never takes more than half of the time.
+        """
+        return time.perf_counter() >= self.next_draw
+
+    def wait(self):
+        """
+        Handle the events of the figure until the viewer is due.
+        """
+        remaining = self.next_draw - time.perf_counter()
+        if remaining > 0:
+            self.fig.canvas.start_event_loop(remaining)
+
+    def update(self, frames, t):
+        """
+        Draw the frames of the panels at time t.
+        """
+        start_time = time.perf_counter()
+        if self.vmin is None or self.vmax is None:
+            limit = sample_vmax(frames[0])
+            vmin = -limit if self.vmin is None else self.vmin
+            vmax = limit if self.vmax is None else self.vmax
+        else:
+            vmin, vmax = self.vmin, self.vmax
+        for image, frame in zip(self.images, frames):
+            image.set_data(frame)
+            if vmin < vmax:
+                image.set_clim(vmin, vmax)
+        self.text.set_text(f"t={t:.2f}s")
+
+        canvas = self.fig.canvas
+        if self.blit and self.background is not None:
+            canvas.restore_region(self.background)
+            self._draw_artists()
+            canvas.blit(self.fig.bbox)
+        else:
+            canvas.draw_idle()
+        canvas.flush_events()
+
+        end_time = time.perf_counter()
+        self.next_draw = max(start_time + self.seg, end_time + end_time - start_time)
+
+    def play(self, get_frames, ts):
+        """
+        Draw frames one every `seg` seconds, the frames whose time is over when the last frame is
+        drawn are skipped.
+
+        Args:
+            get_frames: function of the index of a frame, returns the frames of the panels.
+            ts: times of the frames.
+        """
+        start_time = time.perf_counter()
+        i = 0
+        drawn = -1
+        while i < len(ts):
+            print(f"\rcurrent_time: {ts[i]:.3f},  runtime: {time.perf_counter() - start_time:.3f}s", end="")
+            self.update(get_frames(i), ts[i])
+            drawn = i
+            self.wait()
+            i += 1
+            if self.seg > 0:
+                i = max(i, int((time.perf_counter() - start_time) / self.seg))
+        # the last frame is always shown
+        if drawn != len(ts) - 1:
+            self.update(get_frames(len(ts) - 1), ts[-1])
+
+    def show(self):
+        """
+        Keep the last frame on a figure which is drawn as usual, and block until it is closed.
+        """
+        for artist in self.artists:
+            artist.set_animated(False)
+        self.fig.canvas.draw_idle()
+        plt.show()
@@ -1,13 +1,14 @@
 import matplotlib.pyplot as plt
 
 
-def plot_frame(data, *args, **kwargs):
+def plot_frame(data, *args, ax=None, **kwargs):
     """
     The plot_frame function is a wrapper for the matplotlib.pyplot.imshow function, which plots an image from a 2D array of data (a frame).
 
     Args:
         data: Pass in the data to be plotted
         *args: Pass a non-keyworded, variable-length argument list to the function
+        ax: axes to plot in, defaults to the current axes of pyplot
         **kwargs: Pass in keyword arguments to the function
 
     Returns:
@@ -15,6 +16,8 @@ def plot_frame(data, *args, **kwargs):
     """
     kwargs.setdefault('cmap', 'seismic')
     kwargs.setdefault('aspect', 'auto')
+    if ax is not None:
+        return ax.imshow(data, *args, **kwargs)
     return plt.imshow(
         data,
         *args,
@@ -25,10 +28,11 @@ def plot_frame(data, *args, **kwargs):
 def plot_frame_xz(datax, dataz, fig, t, *args, **kwargs):
     fig.suptitle(f"t={t:.2f}s")
 
-    plt.subplot(121)
-    plot_frame(datax, *args, **kwargs)
-    plt.title("X")
+    # subplots of fig, so it also works on figures which are not managed by pyplot
+    ax = fig.add_subplot(121)
+    plot_frame(datax, *args, ax=ax, **kwargs)
+    ax.set_title("X")
 
-    plt.subplot(122)
-    plot_frame(dataz, *args, **kwargs)
-    plt.title("Z")
+    ax = fig.add_subplot(122)
+    plot_frame(dataz, *args, ax=ax, **kwargs)
+    ax.set_title("Z")
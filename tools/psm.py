@@ -1,6 +1,7 @@
-from numpy.fft import fft2, ifft2
 import numpy as np
 
+from .fft_backend import get_default_backend
+
 
 def cal_psm_k(n, k):
     res = np.array(
@@ -9,17 +10,21 @@ def cal_psm_k(n, k):
     return res
 
 
-def cal_dx(u, kx):
-    return np.real(np.fft.ifft2(1j * kx * np.fft.fft2(u)))
+def cal_dx(u, kx, backend=None):
+    backend = backend or get_default_backend()
+    return np.real(backend.ifft2(1j * kx * backend.fft2(u)))
 
 
-def cal_ddx(u, kx):
-    return np.real(np.fft.ifft2(-kx ** 2 * np.fft.fft2(u)))
+def cal_ddx(u, kx, backend=None):
+    backend = backend or get_default_backend()
+    return np.real(backend.ifft2(-kx ** 2 * backend.fft2(u)))
 
 
-def cal_dz(u, kz):
-    return np.real(np.fft.ifft2(1j * kz * np.fft.fft2(u.T))).T
+def cal_dz(u, kz, backend=None):
+    backend = backend or get_default_backend()
+    return np.real(backend.ifft2(1j * kz * backend.fft2(u.T))).T
 
 
-def cal_ddz(u, kz):
-    return np.real(np.fft.ifft2(-kz ** 2 * np.fft.fft2(u.T))).T
+def cal_ddz(u, kz, backend=None):
+    backend = backend or get_default_backend()
+    return np.real(backend.ifft2(-kz ** 2 * backend.fft2(u.T))).T
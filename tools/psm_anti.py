@@ -1,5 +1,7 @@
 import numpy as np
 
+from .fft_backend import get_default_backend
+
 
 def cal_psm_k(n, k):
     res = np.array(
@@ -8,25 +10,29 @@ def cal_psm_k(n, k):
     return res
 
 
-def cal_dx(u, kx2):
+def cal_dx(u, kx2, backend=None):
+    backend = backend or get_default_backend()
     u2 = np.concatenate([u, -u], axis=1)
-    u_anti = np.real(np.fft.ifft2(1j * kx2 * np.fft.fft2(u2)))[:, :u.shape[1]]
+    u_anti = np.real(backend.ifft2(1j * kx2 * backend.fft2(u2)))[:, :u.shape[1]]
     return u_anti
 
 
-def cal_ddx(u, kx2):
+def cal_ddx(u, kx2, backend=None):
+    backend = backend or get_default_backend()
     u2 = np.concatenate([u, -u], axis=1)
-    u_anti = np.real(np.fft.ifft2(-kx2**2 * np.fft.fft2(u2)))[:, :u.shape[1]]
+    u_anti = np.real(backend.ifft2(-kx2**2 * backend.fft2(u2)))[:, :u.shape[1]]
     return u_anti
 
 
-def cal_dz(u, kz2):
+def cal_dz(u, kz2, backend=None):
+    backend = backend or get_default_backend()
     u2 = np.concatenate([u.T, -u.T], axis=1)
-    u_anti = np.real(np.fft.ifft2(1j * kz2 * np.fft.fft2(u2)))[:, :u.shape[0]].T
+    u_anti = np.real(backend.ifft2(1j * kz2 * backend.fft2(u2)))[:, :u.shape[0]].T
     return u_anti
 
 
-def cal_ddz(u, kz2):
+def cal_ddz(u, kz2, backend=None):
+    backend = backend or get_default_backend()
     u2 = np.concatenate([u.T, -u.T], axis=1)
-    u_anti = np.real(np.fft.ifft2(-kz2**2 * np.fft.fft2(u2)))[:, :u.shape[0]].T
+    u_anti = np.real(backend.ifft2(-kz2**2 * backend.fft2(u2)))[:, :u.shape[0]].T
     return u_anti
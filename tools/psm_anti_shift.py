@@ -0,0 +1,70 @@
+"""
+Anti extension derivatives without extending the field.
+
+`tools.psm_anti` extends a field of length n to [u, -u] with length 2n. That extension is
+anti-periodic, f(x + L) = -f(x), so every even wave number of its spectrum is zero and only
+the odd wave numbers k2[1::2] are left. Multiplying u by exp(-1j * pi * j / n) shifts the
+spectrum by half a bin, and a transform of length n gives exactly these odd wave numbers:
+
+    fft_2n([u, -u])[2m + 1] = 2 * fft_n(u * exp(-1j * pi * j / n))[m]
+
+So the derivatives are the same as `tools.psm_anti`, but with transforms of half the length
+along one axis only and without allocating the extended array.
+
+Functions are drop-in for `tools.psm_anti` and take the same wave numbers kx2, kz2.
+"""
+import numpy as np
+
+from .fft_backend import get_default_backend
+from .psm import cal_psm_k
+
+
+def cal_shift_k(k2):
+    """
+    The odd wave numbers of the anti extension wave numbers `k2`.
+    """
+    return np.asarray(k2)[1::2]
+
+
+def cal_shift(n, axis=-1, ndim=2):
+    """
+    The half bin modulation exp(-1j * pi * j / n), reshaped to broadcast along `axis`.
+    """
+    shape = [1] * ndim
+    shape[axis] = -1
+    return np.exp(-1j * np.pi * np.arange(n) / n).reshape(shape)
+
+
+def _derivative(u, op, axis, backend=None):
+    backend = backend or get_default_backend()
+    shift = cal_shift(u.shape[axis], axis, u.ndim)
+    shape = [1] * u.ndim
+    shape[axis] = -1
+    return np.real(np.conj(shift) * backend.ifft(op.reshape(shape) * backend.fft(u * shift, axis=axis), axis=axis))
+
+
+def cal_dx(u, kx2, backend=None):
+    return _derivative(u, 1j * cal_shift_k(kx2), -1, backend)
+
+
+def cal_ddx(u, kx2, backend=None):
+    return _derivative(u, -cal_shift_k(kx2) ** 2, -1, backend)
+
+
+def cal_dz(u, kz2, backend=None):
+    return _derivative(u, 1j * cal_shift_k(kz2), -2, backend)
+
+
+def cal_ddz(u, kz2, backend=None):
+    return _derivative(u, -cal_shift_k(kz2) ** 2, -2, backend)
+
+
+__all__ = [
+    "cal_psm_k",
+    "cal_shift_k",
+    "cal_shift",
+    "cal_dx",
+    "cal_ddx",
+    "cal_dz",
+    "cal_ddz",
+]
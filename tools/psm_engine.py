@@ -0,0 +1,268 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import numpy as np
+
+import constants
+from .fft_backend import get_default_backend
+
+# all spatial derivatives needed by the elastic wave equation of I, VTI and HTI mediums.
+Derivatives = namedtuple(
+    "Derivatives",
+    ["ux_xx", "ux_zz", "ux_xz", "uz_xx", "uz_zz", "uz_xz"]
+)
+
+
+def cal_kspace_correction(kx, kz, c0, dt):
+    """
+    k-space correction of the second order time difference, sinc(c0 * |k| * dt / 2) ** 2.
+
+    With the spatial operators multiplied by it, the time step of a wave with velocity c0 is exact:
+    dt ** 2 * c0 ** 2 * k ** 2 * sinc(c0 * |k| * dt / 2) ** 2 = 4 * sin(c0 * |k| * dt / 2) ** 2.
+
+    Args:
+        kx: wave numbers along x.
+        kz: wave numbers along z.
+        c0: reference velocity.
+        dt: time step.
+
+    Returns:
+        array with shape (nz, nx).
+    """
+    k = np.sqrt(np.asarray(kx)[np.newaxis, :] ** 2 + np.asarray(kz)[:, np.newaxis] ** 2)
+    # np.sinc(x) is sin(pi * x) / (pi * x)
+    return np.sinc(c0 * k * dt / 2 / np.pi) ** 2
+
+
+def zero_nyquist(k):
+    """
+    Return a copy of wave numbers `k` with the nyquist wave number set to zero.
+
+    The nyquist component of an odd order derivative is purely imaginary in real space and
+    is dropped by `np.real` in `tools.psm`, zeroing it here keeps the spectral operators
+    hermitian so real and imaginary parts of one inverse transform never mix.
+    """
+    k = np.array(k, dtype=float)
+    n = k.shape[0]
+    if n % 2 == 0:
+        k[n // 2] = 0
+    return k
+
+
+class PSMEngine(ABC):
+    @classmethod
+    def get_engine(cls, cfg, use_anti_extension=False, method=None, backend=None, kspace=None):
+        if method is None:
+            method = constants.PSM_SHARED
+        if kspace is not None:
+            # the correction depends on |k|, only the fft2 spectrum has it
+            if use_anti_extension or method != constants.PSM_SHARED:
+                raise ValueError("k-space time integrator need the {} psm method without anti extension."
+                                 .format(constants.PSM_SHARED))
+            return SharedSpectrumEngine(cfg.kx, cfg.kz, backend, cfg.dtype, kspace)
+        if use_anti_extension:
+            return AntiExtensionEngine(cfg.kx2, cfg.kz2, backend, cfg.dtype)
+        if method == constants.PSM_SHARED:
+            return SharedSpectrumEngine(cfg.kx, cfg.kz, backend, cfg.dtype)
+        elif method == constants.PSM_RFFT:
+            return RFFTEngine(cfg.kx, cfg.kz, backend, cfg.dtype)
+        else:
+            raise ValueError("psm method {} does not support. Choice in {}.".format(method, constants.PSM_METHODS))
+
+    def __init__(self, backend=None, dtype=None):
+        if dtype is None:
+            dtype = np.float64
+        self.backend = backend or get_default_backend()
+        # float type of the wave field, and the complex type of its spectrum
+        self.dtype = np.dtype(dtype)
+        self.complex_dtype = np.result_type(self.dtype, np.complex64)
+        self.buffers = {}
+        # runs the independent derivative chains at the same time, see `tools.slab_executor`
+        self.executor = None
+
+    def _buffer(self, name, shape, dtype):
+        """
+        Get a work array which is allocated once and reused by every step.
+        """
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buf
+        return buf
+
+    def _call(self, *calls):
+        """
+        Run independent calls (func, *args), in the executor if there is one.
+        """
+        if self.executor is None:
+            return [func(*args) for func, *args in calls]
+        return self.executor.call(*calls)
+
+    @abstractmethod
+    def derivatives(self, ux, uz) -> Derivatives:
+        """
+        Calculate all second order derivatives of the two displacement components.
+
+        Args:
+            ux: x displacement, array with shape (..., nz, nx)
+            uz: z displacement, array with shape (..., nz, nx)
+
+        Returns:
+            Derivatives of ux and uz, they may be views of the work arrays of this engine and
+            are only valid until the next call.
+        """
+        pass
+
+
+class SharedSpectrumEngine(PSMEngine):
+    """
+    Pseudo-spectral derivatives which transform the wave field only once per step.
+
+    ux and uz are packed into one complex field `ux + 1j * uz`, so one forward fft2 gives the
+    spectrum of both components. Every operator (-kx^2, -kz^2, -kx*kz) is real and hermitian,
+    so after one inverse fft2 the real part is the derivative of ux and the imaginary part is
+    the derivative of uz. One step needs 4 transforms instead of 16 in `tools.psm`.
+
+    With `kspace` = (c0, dt) every operator is multiplied by the k-space correction of the
+    time step, see `cal_kspace_correction`.
+    """
+    def __init__(self, kx, kz, backend=None, dtype=None, kspace=None):
+        super().__init__(backend, dtype)
+        correction = 1
+        if kspace is not None:
+            correction = cal_kspace_correction(kx, kz, *kspace)
+        kx = np.asarray(kx, dtype=float)[np.newaxis, :]
+        kz = np.asarray(kz, dtype=float)[:, np.newaxis]
+
+        self.op_xx = (-kx ** 2 * correction).astype(self.dtype)
+        self.op_zz = (-kz ** 2 * correction).astype(self.dtype)
+        self.op_xz = (-zero_nyquist(kx[0])[np.newaxis, :] * zero_nyquist(kz[:, 0])[:, np.newaxis]
+                      * correction).astype(self.dtype)
+
+    def _inverse(self, name, op, spectrum):
+        product = np.multiply(op, spectrum, out=self._buffer(name + "_product", spectrum.shape, spectrum.dtype))
+        u = self.backend.ifft2(product, out=self._buffer(name, spectrum.shape, spectrum.dtype))
+        return u.real, u.imag
+
+    def derivatives(self, ux, uz):
+        packed = self._buffer("packed", ux.shape, self.complex_dtype)
+        packed.real = ux
+        packed.imag = uz
+        spectrum = self.backend.fft2(packed, out=self._buffer("spectrum", packed.shape, packed.dtype))
+
+        (ux_xx, uz_xx), (ux_zz, uz_zz), (ux_xz, uz_xz) = self._call(
+            (self._inverse, "xx", self.op_xx, spectrum),
+            (self._inverse, "zz", self.op_zz, spectrum),
+            (self._inverse, "xz", self.op_xz, spectrum),
+        )
+
+        return Derivatives(ux_xx, ux_zz, ux_xz, uz_xx, uz_zz, uz_xz)
+
+
+class RFFTEngine(PSMEngine):
+    """
+    Derivatives with 1D real transforms along each axis, see `tools.psm_rfft`.
+    Every component is transformed on its own, the spectrum along x is shared by the
+    second derivative along x and the first derivative of the mixed term.
+    """
+    def __init__(self, kx, kz, backend=None, dtype=None):
+        from tools.psm_rfft import cal_rfft_k
+
+        super().__init__(backend, dtype)
+        self.nx = len(kx)
+        self.nz = len(kz)
+        kx = cal_rfft_k(kx)[np.newaxis, :]
+        kz = cal_rfft_k(kz)[:, np.newaxis]
+
+        self.op_x = (1j * kx).astype(self.complex_dtype)
+        self.op_xx = (-kx ** 2).astype(self.dtype)
+        self.op_z = (1j * kz).astype(self.complex_dtype)
+        self.op_zz = (-kz ** 2).astype(self.dtype)
+
+    def _derivatives(self, name, u):
+        b = self.backend
+        spectrum_x = b.rfft(u, axis=-1)
+        u_xx = b.irfft(self.op_xx * spectrum_x, n=self.nx, axis=-1, out=self._buffer(name + "xx", u.shape, u.dtype))
+        u_x = b.irfft(self.op_x * spectrum_x, n=self.nx, axis=-1, out=self._buffer(name + "x", u.shape, u.dtype))
+
+        u_zz = b.irfft(self.op_zz * b.rfft(u, axis=-2), n=self.nz, axis=-2,
+                       out=self._buffer(name + "zz", u.shape, u.dtype))
+        u_xz = b.irfft(self.op_z * b.rfft(u_x, axis=-2), n=self.nz, axis=-2,
+                       out=self._buffer(name + "xz", u.shape, u.dtype))
+        return u_xx, u_zz, u_xz
+
+    def derivatives(self, ux, uz):
+        d_ux, d_uz = self._call((self._derivatives, "ux", ux), (self._derivatives, "uz", uz))
+        return Derivatives(*d_ux, *d_uz)
+
+
+class AntiExtensionEngine(PSMEngine):
+    """
+    Derivatives with the anti extension method, see `tools.psm_anti`.
+
+    The extended field [u, -u] is never built, the transforms along each axis are shifted by
+    half a bin instead, see `tools.psm_anti_shift`. The operators are hermitian on the shifted
+    wave numbers too, so ux and uz are packed into one complex field as in `SharedSpectrumEngine`.
+    """
+    def __init__(self, kx2, kz2, backend=None, dtype=None):
+        from tools.psm_anti_shift import cal_shift_k, cal_shift
+
+        super().__init__(backend, dtype)
+        kx = cal_shift_k(kx2)
+        kz = cal_shift_k(kz2)
+        nx = len(kx)
+        nz = len(kz)
+
+        self.op_xx = (-kx[np.newaxis, :] ** 2).astype(self.dtype)
+        self.op_zz = (-kz[:, np.newaxis] ** 2).astype(self.dtype)
+        # the nyquist wave number is one of the shifted wave numbers when n is odd
+        kx = kx.copy()
+        kz = kz.copy()
+        if nx % 2:
+            kx[nx // 2] = 0
+        if nz % 2:
+            kz[nz // 2] = 0
+        self.op_x = (1j * kx[np.newaxis, :]).astype(self.complex_dtype)
+        self.op_z = (1j * kz[:, np.newaxis]).astype(self.complex_dtype)
+
+        self.shift_x = cal_shift(nx, -1).astype(self.complex_dtype)
+        self.shift_z = cal_shift(nz, -2).astype(self.complex_dtype)
+
+    def _derivative(self, name, u, op, axis, shift):
+        b = self.backend
+        shifted = np.multiply(u, shift, out=self._buffer(name + "_shifted", u.shape, u.dtype))
+        spectrum = b.fft(shifted, axis=axis, out=self._buffer(name + "_spectrum", u.shape, u.dtype))
+        product = np.multiply(op, spectrum, out=spectrum)
+        du = b.ifft(product, axis=axis, out=self._buffer(name, u.shape, u.dtype))
+        du *= np.conj(shift)
+        return du
+
+    def _x_derivatives(self, packed):
+        """
+        Second derivative along x and the mixed derivative.
+        """
+        b = self.backend
+        # spectrum along x is shared by the second derivative and the mixed derivative
+        shifted = np.multiply(packed, self.shift_x, out=self._buffer("shifted", packed.shape, packed.dtype))
+        spectrum_x = b.fft(shifted, axis=-1, out=self._buffer("spectrum_x", packed.shape, packed.dtype))
+        product = np.multiply(self.op_xx, spectrum_x, out=self._buffer("product", packed.shape, packed.dtype))
+        u_xx = b.ifft(product, axis=-1, out=self._buffer("xx", packed.shape, packed.dtype))
+        u_xx *= np.conj(self.shift_x)
+        product = np.multiply(self.op_x, spectrum_x, out=product)
+        u_x = b.ifft(product, axis=-1, out=self._buffer("x", packed.shape, packed.dtype))
+        u_x *= np.conj(self.shift_x)
+
+        u_xz = self._derivative("xz", u_x, self.op_z, -2, self.shift_z)
+        return u_xx, u_xz
+
+    def derivatives(self, ux, uz):
+        packed = self._buffer("packed", ux.shape, self.complex_dtype)
+        packed.real = ux
+        packed.imag = uz
+
+        (u_xx, u_xz), u_zz = self._call(
+            (self._x_derivatives, packed),
+            (self._derivative, "zz", packed, self.op_zz, -2, self.shift_z),
+        )
+
+        return Derivatives(u_xx.real, u_zz.real, u_xz.real, u_xx.imag, u_zz.imag, u_xz.imag)
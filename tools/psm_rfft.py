@@ -0,0 +1,54 @@
+"""
+Pseudo-spectral derivatives with 1D real fft along one axis.
+
+Drop-in replacement of `tools.psm`, the wave numbers are the same full length arrays
+created by `cal_psm_k`. A derivative along x only transforms along the last axis and a
+derivative along z only along the second last axis, so no transpose is needed and the
+spectrum of the real field keeps only the non-negative half of the wave numbers.
+"""
+import numpy as np
+
+from .fft_backend import get_default_backend
+from .psm import cal_psm_k
+
+
+def cal_rfft_k(k):
+    """
+    The non-negative wave numbers of `k` used by `np.fft.rfft`.
+    """
+    k = np.asarray(k)
+    return np.abs(k[:k.shape[0] // 2 + 1])
+
+
+def _derivative(u, op, axis, backend=None):
+    backend = backend or get_default_backend()
+    n = u.shape[axis]
+    shape = [1] * u.ndim
+    shape[axis] = -1
+    return backend.irfft(op.reshape(shape) * backend.rfft(u, axis=axis), n=n, axis=axis)
+
+
+def cal_dx(u, kx, backend=None):
+    return _derivative(u, 1j * cal_rfft_k(kx), -1, backend)
+
+
+def cal_ddx(u, kx, backend=None):
+    return _derivative(u, -cal_rfft_k(kx) ** 2, -1, backend)
+
+
+def cal_dz(u, kz, backend=None):
+    return _derivative(u, 1j * cal_rfft_k(kz), -2, backend)
+
+
+def cal_ddz(u, kz, backend=None):
+    return _derivative(u, -cal_rfft_k(kz) ** 2, -2, backend)
+
+
+__all__ = [
+    "cal_psm_k",
+    "cal_rfft_k",
+    "cal_dx",
+    "cal_ddx",
+    "cal_dz",
+    "cal_ddz",
+]
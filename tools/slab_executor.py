@@ -0,0 +1,103 @@
+"""
+Run the parts of one step on z-slabs, or independent calls, in a thread pool.
+
+NumPy releases the GIL in ufuncs and transforms of large arrays, so slabs of the same array,
+or the derivative chains of ux and uz, run on several cores at the same time.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# slabs with less rows are not worth a task
+MIN_SLAB_ROWS = 8
+
+
+def take_slab(a, slab):
+    """
+    Rows `slab` of an array with shape (..., nz, nx), arrays which broadcast along z,
+    such as compact coefficients with shape (1, nx), are returned as they are.
+    """
+    if getattr(a, "ndim", 0) < 2 or a.shape[-2] == 1:
+        return a
+    return a[..., slab, :]
+
+
+class SlabExecutor:
+    # executors shared by every simulator, one per number of threads
+    executors = {}
+
+    @classmethod
+    def get_executor(cls, threads=None):
+        """
+        Get the executor of `threads` threads, it is created once and shared, so simulators created
+        one after another, as the shots of a worker, do not start new threads. A forked process
+        does not inherit the threads of the pools, it creates its own executors.
+        """
+        if threads is None:
+            threads = 1
+        if threads not in cls.executors:
+            cls.executors[threads] = cls(threads)
+        return cls.executors[threads]
+
+    def __init__(self, threads=None):
+        if threads is None:
+            threads = 1
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        self.slabs = {}
+
+    def get_slabs(self, n):
+        """
+        Split n rows into at most `threads` slabs of at least MIN_SLAB_ROWS rows.
+        """
+        if n not in self.slabs:
+            n_slabs = max(1, min(self.threads, n // MIN_SLAB_ROWS))
+            bounds = [n * i // n_slabs for i in range(n_slabs + 1)]
+            self.slabs[n] = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        return self.slabs[n]
+
+    def run(self, func, n):
+        """
+        Call func(slab) for every slab of n rows, slab is a slice of the z axis.
+        """
+        slabs = self.get_slabs(n)
+        if self.pool is None or len(slabs) == 1:
+            for slab in slabs:
+                func(slab)
+            return
+        for future in [self.pool.submit(func, slab) for slab in slabs]:
+            future.result()
+
+    def call(self, *calls):
+        """
+        Run independent calls (func, *args) at the same time.
+
+        Returns:
+            list of the results of every call.
+        """
+        if self.pool is None:
+            return [func(*args) for func, *args in calls]
+        return [future.result() for future in [self.pool.submit(*c) for c in calls]]
+
+    def map(self, func, iterable):
+        if self.pool is None:
+            return list(map(func, iterable))
+        return list(self.pool.map(func, iterable))
+
+    def close(self):
+        """
+        Shut down the threads of the pool, the executor runs everything in the calling thread after it.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if hasattr(os, "register_at_fork"):
+    # the pools of the parent have no threads in a forked child, tasks submitted to them never run
+    os.register_at_fork(after_in_child=SlabExecutor.executors.clear)
@@ -2,6 +2,7 @@ from .boundary import Boundary
 from .seismic_simulator import SeismicSimulator
 from .source import Source
 from .sfd import SFD
+from .receivers import Receivers
 from .seismi_parser import get_parser
 from .medium import Medium
 from .medium_config import MediumConfig
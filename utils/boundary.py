@@ -1,4 +1,6 @@
+import weakref
 from abc import ABC, abstractmethod
+from functools import partial
 
 import numpy as np
 
@@ -12,6 +14,8 @@ class Boundary(ABC):
             return SolidBoundary()
         elif boundary_type == constants.BOUNDARY_ATTEN:
             return AttenBoundary()
+        elif boundary_type == constants.BOUNDARY_CPML:
+            return CPMLBoundary()
 
     def __init__(self):
         self.n = None
@@ -27,18 +31,50 @@ class Boundary(ABC):
         self.boundary_type = None
     
     def set_parameter(self, n, m, a, b):
+        """
+        Args:
+            n: number of points along x.
+            m: number of points along z.
+            a: length of the absorbing strips along x.
+            b: length of the absorbing strips along z.
+        """
         self.n = n
         self.m = m
         self.a = a
         self.b = b
 
-        self.absorbXHigh = np.arange(n-a, n)
-        self.absorbXLow  = np.arange(0, a)
-        self.absorbZHigh = np.arange(n-b, n)
-        self.absorbZLow  = np.arange(0, b)
+        # basic slices, strips are views of the fields and are changed in place
+        self.absorbXHigh = slice(n - a, n)
+        self.absorbXLow  = slice(0, a)
+        self.absorbZHigh = slice(m - b, m)
+        self.absorbZLow  = slice(0, b)
+
+    def set_simulation(self, simulator):
+        """
+        Called by the simulator before the first step. One boundary may be shared by several
+        simulators, state of a simulation is kept per simulator.
+        """
+        pass
+
+    def get_stretch(self, simulator, key):
+        """
+        Function stretch(d, ux, uz) which corrects the derivatives `d` of the state `key` of
+        `simulator` before the force is calculated, None if the boundary only changes the fields.
+        """
+        return None
+
+    def apply(self, *fields):
+        """
+        Apply the boundary to every field in one call.
+
+        Args:
+            fields: arrays with shape (..., nz, nx), such as the stacked (ux, uz) state of one time level.
+        """
+        for u in fields:
+            self._apply(u)
 
     @abstractmethod
-    def apply(self, u):
+    def _apply(self, u):
         pass
 
     def __str__(self):
@@ -67,12 +103,12 @@ class SolidBoundary(Boundary):
             v = 0
         self.v = v
     
-    def apply(self, u):
-        u[self.absorbXHigh] = self.v
-        u[self.absorbXLow]  = self.v
+    def _apply(self, u):
+        u[..., self.absorbXHigh] = self.v
+        u[..., self.absorbXLow]  = self.v
 
-        u[:, self.absorbZHigh] = self.v
-        u[:, self.absorbZLow]  = self.v
+        u[..., self.absorbZHigh, :] = self.v
+        u[..., self.absorbZLow, :]  = self.v
 
 
 class AttenBoundary(Boundary):
@@ -83,6 +119,8 @@ class AttenBoundary(Boundary):
         self.GXLow = None
         self.GZHigh = None
         self.GZLow = None
+        # dtype: factors cast to the precision of the fields, see `get_factors`
+        self.factors = {}
 
         self.boundary_type = constants.BOUNDARY_ATTEN
 
@@ -93,13 +131,164 @@ class AttenBoundary(Boundary):
         print("atten absort alpha value: {:.2f}".format(alpha))
         self.alpha = alpha
 
-        self.GXHigh = np.exp(-(self.alpha * (self.a - self.absorbXLow[::-1]))**2)
-        self.GXLow  = np.exp(-(self.alpha * (self.a - self.absorbXLow))**2)
-        self.GZHigh = np.exp(-(self.alpha * (self.b - self.absorbZLow[::-1]))**2).reshape(-1, 1)
-        self.GZLow  = np.exp(-(self.alpha * (self.b - self.absorbZLow))**2).reshape(-1, 1)
-    
-    def apply(self, u):
-        u[:, self.absorbXHigh] *= self.GXHigh
-        u[:, self.absorbXLow] *= self.GXLow
-        u[self.absorbZHigh] *= self.GZHigh
-        u[self.absorbZLow] *= self.GZLow
+        # damping factors of the strips, x factors broadcast along rows and z factors along columns
+        self.GXLow  = np.exp(-(self.alpha * (self.a - np.arange(self.a)))**2)
+        self.GXHigh = self.GXLow[::-1].copy()
+        self.GZLow  = np.exp(-(self.alpha * (self.b - np.arange(self.b)))**2).reshape(-1, 1)
+        self.GZHigh = self.GZLow[::-1].copy()
+        self.factors = {}
+
+    def set_simulation(self, simulator):
+        self.get_factors(simulator.medium.cfg.dtype)
+
+    def get_factors(self, dtype):
+        """
+        Factors (GXHigh, GXLow, GZHigh, GZLow) in the precision of the fields, so the multiplies need
+        no casting. They are cast once for every dtype, simulators of any precision share the boundary.
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in self.factors:
+            self.factors[dtype] = tuple(g.astype(dtype) for g in (self.GXHigh, self.GXLow, self.GZHigh, self.GZLow))
+        return self.factors[dtype]
+
+    def _apply(self, u):
+        gx_high, gx_low, gz_high, gz_low = self.get_factors(u.dtype)
+        # in place multiplies of strip views, corners are damped along x and z
+        u[..., self.absorbXHigh] *= gx_high
+        u[..., self.absorbXLow] *= gx_low
+        u[..., self.absorbZHigh, :] *= gz_high
+        u[..., self.absorbZLow, :] *= gz_low
+
+
+class CPMLBoundary(Boundary):
+    """
+    Convolutional perfectly matched layer.
+
+    Inside the layers the derivatives along the layer normal are taken in stretched coordinates,
+    d/dx~ f = f_x + psi, where the memory variable psi is updated every step by
+    psi = b * psi + a * f_x. The second derivative d/dx~ d/dx~ u is the stretch applied twice to
+    u_xx, the derivative of the damping profile is neglected, so only the derivatives of the engine
+    are needed and the layers are stable with the pseudo-spectral derivatives. The mixed derivative
+    is stretched along x and along z. The memory variables are only kept inside the strips.
+
+    The fifth parameter of `set_parameter` is the theoretical reflection coefficient of the layers.
+    Coefficients and memory variables belong to one simulation, they are created by `set_simulation`
+    for every simulator, so simulators sharing the boundary do not change each other.
+    """
+    def __init__(self):
+        super().__init__()
+        self.reflection = None
+        # simulator: (x coefficients, z coefficients, memory variables), dropped with the simulator
+        self.simulations = weakref.WeakKeyDictionary()
+
+        self.boundary_type = constants.BOUNDARY_CPML
+
+    def __getstate__(self):
+        # the simulations belong to this process, a boundary sent to worker processes is pickled without them
+        state = self.__dict__.copy()
+        del state["simulations"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.simulations = weakref.WeakKeyDictionary()
+
+    def set_parameter(self, n, m, a, b, reflection=None):
+        if a is None:
+            a = 0
+        if b is None:
+            b = 0
+        super().set_parameter(n, m, a, b)
+        if reflection is None:
+            reflection = 1e-3
+        print("cpml reflection coefficient: {:.2e}".format(reflection))
+        self.reflection = reflection
+
+    def set_simulation(self, simulator):
+        medium, dt = simulator.medium, simulator.dt
+        dx, dz = medium.cfg.dx, medium.cfg.dz
+        # frequency shift of the complex stretch, at the dominant frequency resolved by 10 points
+        alpha_max = np.pi * medium.vpmax / (10 * max(dx, dz))
+        x_coefficients = self._cal_coefficients(self.a, dx, medium.vpmax, alpha_max, dt)
+        z_coefficients = self._cal_coefficients(self.b, dz, medium.vpmax, alpha_max, dt)
+        self.simulations[simulator] = (x_coefficients, z_coefficients, {})
+
+    def _cal_coefficients(self, length, h, vpmax, alpha_max, dt):
+        """
+        Coefficients (b, a) of the memory variables in a layer of `length` cells, from the outer cell
+        to the inner cell, with the damping d0 * xi ** 2 and the frequency shift alpha_max * (1 - xi).
+        """
+        if length == 0:
+            return None
+        xi = (length - np.arange(length)) / length
+        d0 = -3 * vpmax * np.log(self.reflection) / (2 * length * h)
+        d = d0 * xi ** 2
+        alpha = alpha_max * (1 - xi)
+        b = np.exp(-(d + alpha) * dt)
+        a = d / (d + alpha) * (b - 1)
+        return b, a
+
+    def get_stretch(self, simulator, key):
+        return partial(self.stretch, simulator, key)
+
+    def stretch(self, simulator, key, d, ux, uz):
+        """
+        Replace the derivatives of the fields ux, uz inside the layers by the stretched derivatives.
+
+        Args:
+            simulator: simulator of the fields, see `set_simulation`.
+            key: state of the fields, every state has its own memory variables.
+            d: Derivatives of ux, uz, corrected in place.
+            ux: x displacement, array with shape (..., nz, nx).
+            uz: z displacement, array with shape (..., nz, nx).
+
+        Returns:
+            d
+        """
+        x_coefficients, z_coefficients, memories = self.simulations[simulator]
+        memory = memories.setdefault(key, {})
+        self._stretch_axis(memory, "x", x_coefficients,
+                           [("x", d.ux_xx, d.ux_xz), ("z", d.uz_xx, d.uz_xz)])
+        # z layers are the x layers of the transposed fields
+        self._stretch_axis(memory, "z", z_coefficients,
+                           [("x", d.ux_zz.swapaxes(-1, -2), d.ux_xz.swapaxes(-1, -2)),
+                            ("z", d.uz_zz.swapaxes(-1, -2), d.uz_xz.swapaxes(-1, -2))])
+        return d
+
+    def _stretch_axis(self, memory, axis_name, coefficients, fields):
+        if coefficients is None:
+            return
+        length = len(coefficients[0])
+        for component, u_ss, u_mixed in fields:
+            # index 0 of every strip is the outer cell, the high strip is reversed
+            strips = [
+                (u_ss[..., :length], u_mixed[..., :length]),
+                (u_ss[..., :-length - 1:-1], u_mixed[..., :-length - 1:-1]),
+            ]
+            for side, strip in zip(["low", "high"], strips):
+                self._stretch_strip(memory, (axis_name, side, component), coefficients, *strip)
+
+    @staticmethod
+    def _stretch_strip(memory, key, coefficients, u_ss, u_mixed):
+        """
+        Stretch the second derivative u_ss and the mixed derivative u_mixed of one strip in place.
+        """
+        b, a = coefficients
+        if key not in memory:
+            memory[key] = [np.zeros(u_ss.shape, dtype=u_ss.dtype) for _ in range(3)]
+        psi_s, psi_ss, psi_mixed = memory[key]
+
+        psi_s *= b
+        psi_s += a * u_ss
+        g = u_ss + psi_s
+        psi_ss *= b
+        psi_ss += a * g
+        u_ss[...] = g + psi_ss
+
+        psi_mixed *= b
+        psi_mixed += a * u_mixed
+        u_mixed += psi_mixed
+
+    def _apply(self, u):
+        # the layers absorb through the stretched derivatives, fields are not changed
+        pass
@@ -0,0 +1,167 @@
+"""
+Render the frames of sfd files into images with a process pool.
+
+Frames are cut into ranges of consecutive frames and every worker renders a range at a time on
+its own figure with the Agg backend, a worker never touches the figures of pyplot. The parent
+reads the frames of a range only when the range is handed out and keeps a bounded number of
+ranges in flight, so lazy sfd files are never read as a whole. Pngs are written by the workers,
+gif frames are sent back and put together by the parent in the order of the frames.
+
+The fast mode maps the frames through the colormap lookup table of `tools.fast_render` instead of
+drawing figures, the images have one pixel per cell and no axes, titles or colorbar.
+"""
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+import constants
+from tools.fast_render import get_palette, get_image, cal_color_index, join_panels
+from tools.plot_frame import plot_frame, plot_frame_xz
+
+# state of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(figsize, dpi, plot_kwargs, save_dir, fast=False, max_size=None):
+    _worker.update(plot_kwargs=plot_kwargs, save_dir=save_dir, fast=fast, max_size=max_size)
+    if fast:
+        _worker.update(palette=get_palette(plot_kwargs.get("cmap")))
+    else:
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        _worker.update(fig=fig)
+
+
+def _draw(frames, t):
+    fig = _worker["fig"]
+    fig.clf()
+    if len(frames) == 1:
+        ax = fig.add_subplot(111)
+        plot_frame(frames[0], ax=ax, **_worker["plot_kwargs"])
+        ax.set_title("t={:.2f}s".format(t))
+    else:
+        plot_frame_xz(*frames, fig, t, **_worker["plot_kwargs"])
+
+
+def _color_index(frames):
+    kwargs = _worker["plot_kwargs"]
+    return join_panels([cal_color_index(frame, kwargs["vmin"], kwargs["vmax"], _worker["max_size"])
+                        for frame in frames])
+
+
+def _render_range(task):
+    """
+    Render frames start, start + 1, ... of a task. The pngs are saved into the save dir,
+    without a save dir the rgba pixels of the frames, or the color indices in fast mode, are returned.
+    """
+    start, frames, ts = task
+    images = []
+    for i, t in enumerate(ts):
+        if _worker["fast"]:
+            index = _color_index([f[i] for f in frames])
+            if _worker["save_dir"] is not None:
+                get_image(index, _worker["palette"]).save(os.path.join(_worker["save_dir"], f"{start + i}.png"))
+            else:
+                images.append(index)
+            continue
+        _draw([f[i] for f in frames], t)
+        if _worker["save_dir"] is not None:
+            _worker["fig"].savefig(os.path.join(_worker["save_dir"], f"{start + i}.png"))
+        else:
+            _worker["fig"].canvas.draw()
+            images.append(np.asarray(_worker["fig"].canvas.buffer_rgba()).copy())
+    return images
+
+
+def render_frames(sfds, figsize=None, dpi=None, save_dir=None, workers=None, fast=False, max_size=None,
+                  **plot_kwargs):
+    """
+    Render the frames of sfd files, one figure per frame.
+
+    Args:
+        sfds: list of one sfd, or of the x and z sfd which are drawn side by side.
+        figsize: size of the figures, defaults to the figure size of matplotlib.
+        dpi: resolution of the figures.
+        save_dir: directory of the pngs, named by the index of the frame. None to yield the frames.
+        workers: number of processes, defaults to the number of cpus. 1 renders in this process.
+        fast: colour map the cells of the frames instead of drawing figures, figsize and dpi are not used.
+        max_size: max pixels of the larger side of a fast frame, see `tools.fast_render.downsample`.
+        plot_kwargs: keyword arguments of `plot_frame`, as vmin, vmax and extent. Fast mode needs vmin and vmax.
+
+    Returns:
+        generator of the rgba pixels of the frames, or of the color indices in fast mode, in order.
+        Nothing is yielded with a save_dir.
+    """
+    nt = sfds[0].nt
+    if workers is None:
+        workers = os.cpu_count()
+    workers = max(1, min(workers, nt))
+    chunk = max(1, min(constants.RENDER_CHUNK_FRAMES, -(-nt // workers)))
+    tasks = ((start, [sfd.data[start:start + chunk] for sfd in sfds], sfds[0].ts[start:start + chunk])
+             for start in range(0, nt, chunk))
+    init_args = (figsize, dpi, plot_kwargs, save_dir, fast, max_size)
+
+    start_time = time.time()
+    done = 0
+
+    def progress(images):
+        nonlocal done
+        done = min(done + chunk, nt)
+        print(f"\rprocess:{done}/{nt}  runtime:{time.time() - start_time:.2f}s", end="")
+        return images
+
+    if workers == 1:
+        _init_worker(*init_args)
+        for task in tasks:
+            yield from progress(_render_range(task))
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+            # ranges in flight, the next range is read when the first one is done
+            results = deque()
+            for task in tasks:
+                results.append(pool.apply_async(_render_range, (task,)))
+                if len(results) >= 2 * workers:
+                    yield from progress(results.popleft().get())
+            while results:
+                yield from progress(results.popleft().get())
+    print("\nDone!")
+
+
+def save_gif(sfds, fname, fps=None, figsize=None, dpi=None, workers=None, fast=False, max_size=None, **plot_kwargs):
+    """
+    Render the frames of sfd files into a gif, see `render_frames`.
+    """
+    if fps is None:
+        fps = constants.GIF_FPS
+    print(f"saving into {fname}...")
+    frames = []
+    if fast:
+        palette = get_palette(plot_kwargs.get("cmap"))
+    for pixels in render_frames(sfds, figsize, dpi, workers=workers, fast=fast, max_size=max_size, **plot_kwargs):
+        if fast:
+            frames.append(get_image(pixels, palette))
+            continue
+        image = Image.fromarray(pixels)
+        # frames without transparency are converted as the pillow writer of matplotlib does
+        frames.append(image if pixels[..., 3].min() < 255 else image.convert("RGB"))
+    frames[0].save(fname, save_all=True, append_images=frames[1:], duration=int(1000 / fps), loop=0)
+
+
+def save_pngs(sfds, save_dir, figsize=None, dpi=None, workers=None, fast=False, max_size=None, **plot_kwargs):
+    """
+    Render the frames of sfd files into the pngs of a directory, see `render_frames`.
+    """
+    print(f"saving pngs into dir {save_dir}")
+    if not os.path.exists(save_dir):
+        print(f"Path {save_dir} not exists, creating...")
+        os.makedirs(save_dir)
+        print(f"Create {save_dir} success.")
+    for _ in render_frames(sfds, figsize, dpi, save_dir=save_dir, workers=workers, fast=fast, max_size=max_size,
+                           **plot_kwargs):
+        pass
@@ -1,7 +1,13 @@
+import os
 from abc import ABC, abstractmethod
 import numpy as np
 
+import constants
 from tools import check_file_exists, get_file_ext
+from tools.compact_coefficient import compact_coefficient, coefficient_kind, take_window
+from tools.psm_engine import PSMEngine
+from tools.fd_engine import FDEngine
+from tools.slab_executor import SlabExecutor, take_slab
 from .medium_config import MediumConfig
 
 
@@ -21,6 +27,7 @@ class Medium(ABC):
         self.cfg = cfg
         self.rho = None
         self.required_c = ["rho", "c11", "c44"]
+        self.combined_c = []  # coefficients precomputed by _combine_c
         self.vpmax = None
         self.vsmax = None
 
@@ -29,18 +36,111 @@ class Medium(ABC):
         self.c12 = None
         self.c44 = None
 
+        self.psm_method = None  # see constants.PSM_METHODS
+        # engines of every settings, the settings are kept by the simulators, see `get_engine`
+        self.engines = {}
+        self.work = None
+
     @abstractmethod
     def load_file(self, *args):
         pass
 
+    def get_engine(self, use_anti_extension=False, method=constants.SPACE_PSM, fd_order=None, kspace=None,
+                   fft_backend=None, executor=None):
+        """
+        Get the derivative engine of this medium, engines are created once for every settings and reused
+        every step, so simulators with different settings share one medium.
+
+        Args:
+            use_anti_extension: use the anti extension method or not, only used by the PSM method.
+            method: space domain method, see constants.SPACE_DOMAIN_METHODS.
+            fd_order: order of the finite difference stencils, see constants.FD_ORDERS. Only used by the FD method.
+            kspace: (reference velocity, dt) of the k-space time integrator, or None. Only used by the PSM method.
+            fft_backend: fft backend of the PSM method, see `tools.fft_backend`.
+            executor: thread pool which runs the independent derivative chains, see `tools.slab_executor`.
+        """
+        method = method.upper()
+        if method not in constants.SPACE_DOMAIN_METHODS:
+            raise ValueError("space domain method {} does not support. Choice in {}."
+                             .format(method, constants.SPACE_DOMAIN_METHODS))
+        if method == constants.SPACE_FD:
+            key = (method, fd_order, executor)
+        else:
+            # backends of the same type and workers are interchangeable
+            backend_key = None if fft_backend is None else (fft_backend.backend_type, fft_backend.workers)
+            key = (method, use_anti_extension, self.psm_method, kspace, backend_key, executor)
+        if key not in self.engines:
+            if method == constants.SPACE_FD:
+                engine = FDEngine(self.cfg.dx, self.cfg.dz, fd_order, self.cfg.dtype)
+            else:
+                engine = PSMEngine.get_engine(self.cfg, use_anti_extension, self.psm_method, fft_backend, kspace)
+            engine.executor = executor
+            self.engines[key] = engine
+        return self.engines[key]
+
     @abstractmethod
     def init_by_val(self, *args):
         pass
 
     @abstractmethod
-    def calculate_step_value(self, ux, uz, use_anti_extension=False, method='psm'):
+    def calculate_step_value(self, ux, uz, use_anti_extension=False, method=constants.SPACE_PSM, out=None,
+                             stretch=None, window=None, engine=None, executor=None):
+        """
+        Calculate the elastic force of displacement ux, uz.
+
+        Args:
+            ux: x displacement, array with shape (..., nz, nx)
+            uz: z displacement, array with shape (..., nz, nx)
+            use_anti_extension: use the anti extension method or not.
+            method: space domain method, see constants.SPACE_DOMAIN_METHODS.
+            out: optional array with shape (2, ...ux.shape) to write the result into.
+            stretch: optional function stretch(d, ux, uz) which corrects the derivatives,
+                see `Boundary.get_stretch`.
+            window: optional (z slice, x slice) of the medium, ux and uz are the fields in the window.
+            engine: derivative engine, see `get_engine`. Defaults to the engine of use_anti_extension and method.
+            executor: thread pool which runs the slabs, see `tools.slab_executor`. Defaults to one thread.
+
+        Returns:
+            The force of x and z direction, array with shape (2, ...ux.shape)
+        """
         pass
 
+    def _derivatives(self, ux, uz, use_anti_extension, method, stretch, engine):
+        if engine is None:
+            engine = self.get_engine(use_anti_extension, method)
+        d = engine.derivatives(ux, uz)
+        if stretch is not None:
+            d = stretch(d, ux, uz)
+        return d
+
+    def _get_out(self, out, u):
+        if out is None:
+            out = np.empty((2,) + u.shape, dtype=u.dtype)
+        return out
+
+    def _multiply_add(self, out, *terms, window=None, executor=None):
+        """
+        Calculate out = sum(c * d for c, d in terms) in place, without temporary arrays.
+        Slabs of z rows are calculated by the executor at the same time.
+        The coefficients c are taken in `window`, see `tools.compact_coefficient.take_window`.
+        """
+        terms = [(take_window(c, window), d) for c, d in terms]
+        if self.work is None or self.work.shape != out.shape or self.work.dtype != out.dtype:
+            self.work = np.empty_like(out)
+
+        def multiply_add(slab):
+            out_slab = out[..., slab, :]
+            work_slab = self.work[..., slab, :]
+            c, d = terms[0]
+            np.multiply(take_slab(c, slab), take_slab(d, slab), out=out_slab)
+            for c, d in terms[1:]:
+                out_slab += np.multiply(take_slab(c, slab), take_slab(d, slab), out=work_slab)
+
+        if executor is None:
+            executor = SlabExecutor.get_executor()
+        executor.run(multiply_add, out.shape[-2])
+        return out
+
     def check_speed(self):
         self.vpmax = np.max(np.sqrt(self.c11 / self.rho))
         self.vsmax = np.max(np.sqrt(self.c44 / self.rho))
@@ -56,14 +156,49 @@ class Medium(ABC):
             setattr(self, c_attr, kwargs.get(c_attr))
 
     def _check_c_shape(self, c: np.ndarray, cname: str):
-        assert len(c.shape) == 2, f"Input {cname} dimension is {len(c.shape)}, not 2D."
-        assert c.shape == self.cfg.shape, f"Input {cname} shape is {c.shape} not match the medium shape {self.cfg.shape}"
+        c = np.asarray(c)
+        assert len(c.shape) <= 2, f"Input {cname} dimension is {len(c.shape)}, not 2D."
+        assert np.broadcast_shapes(c.shape, self.cfg.shape) == self.cfg.shape, \
+            f"Input {cname} shape is {c.shape} not match the medium shape {self.cfg.shape}"
 
     def _check_required_c_shape(self):
         self._check_c_shape(self.rho, 'rho')
         for c_attr in self.required_c:
             self._check_c_shape(getattr(self, c_attr), c_attr)
 
+    def _compact_required_c(self):
+        """
+        Store every coefficient in the smallest shape which broadcast to the medium shape,
+        then precompute the combined coefficients used every step.
+        """
+        for c_attr in self.required_c:
+            c = compact_coefficient(getattr(self, c_attr), self.cfg.dtype)
+            print(f"Coefficient {c_attr} is {coefficient_kind(c)}, stored with shape {c.shape}")
+            setattr(self, c_attr, c)
+        self._combine_c()
+
+    def _combine_c(self):
+        pass
+
+    def save_coefficients(self, directory):
+        """
+        Save every coefficient of this medium into `directory` as .npy files, see `load_coefficients`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for c_attr in self.required_c + self.combined_c:
+            np.save(os.path.join(directory, c_attr + ".npy"), getattr(self, c_attr))
+
+    def load_coefficients(self, directory, mmap_mode="r"):
+        """
+        Load the coefficients saved by `save_coefficients`.
+
+        By default they are opened as read only memory maps, so processes loading the same
+        directory share one copy of the medium in the page cache.
+        """
+        for c_attr in self.required_c + self.combined_c:
+            setattr(self, c_attr, np.load(os.path.join(directory, c_attr + ".npy"), mmap_mode=mmap_mode))
+        self.check_speed()
+
 
 class IMedium(Medium):
     def __init__(self, cfg: MediumConfig, *arg, **kwargs):
@@ -71,7 +206,9 @@ class IMedium(Medium):
         self.c11 = None
         self.c12 = None
         self.c44 = None
+        self.c12_c44 = None
         self.required_c.append("c12")
+        self.combined_c.append("c12_c44")
 
     def load_file(self, rho_file: str, c11_file: str, c12_file: str, *args):
         check_file_exists(c11_file)
@@ -101,33 +238,21 @@ class IMedium(Medium):
             c44=(c11 - c12) / 2
         )
         self._check_required_c_shape()
+        self._compact_required_c()
         self.check_speed()
 
-    def calculate_step_value(self, ux, uz, use_anti_extension=False, method='psm'):
-        if not use_anti_extension:
-            from tools.psm import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.asarray(
-                [
-                    self.c11 * cal_ddx(ux, self.cfg.kx) +
-                    (self.c12 + self.c44) * cal_dz(cal_dx(uz, self.cfg.kx), self.cfg.kz) +
-                    self.c44 * cal_ddz(ux, self.cfg.kz),
-                    self.c11 * cal_ddz(uz, self.cfg.kz) +
-                    (self.c12 + self.c44) * cal_dz(cal_dx(ux, self.cfg.kx), self.cfg.kz) +
-                    self.c44 * cal_ddx(uz, self.cfg.kx)
-                ]
-            )
-        else:
-            from tools.psm_anti import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.asarray(
-                [
-                    self.c11 * cal_ddx(ux, self.cfg.kx2) +
-                    (self.c12 + self.c44) * cal_dz(cal_dx(uz, self.cfg.kx2), self.cfg.kz2) +
-                    self.c44 * cal_ddz(ux, self.cfg.kz2),
-                    self.c11 * cal_ddz(uz, self.cfg.kz2) +
-                    (self.c12 + self.c44) * cal_dz(cal_dx(ux, self.cfg.kx2), self.cfg.kz2) +
-                    self.c44 * cal_ddx(uz, self.cfg.kx2)
-                ]
-            )
+    def _combine_c(self):
+        self.c12_c44 = self.c12 + self.c44
+
+    def calculate_step_value(self, ux, uz, use_anti_extension=False, method=constants.SPACE_PSM, out=None,
+                             stretch=None, window=None, engine=None, executor=None):
+        d = self._derivatives(ux, uz, use_anti_extension, method, stretch, engine)
+        out = self._get_out(out, ux)
+        self._multiply_add(out[0], (self.c11, d.ux_xx), (self.c12_c44, d.uz_xz), (self.c44, d.ux_zz),
+                           window=window, executor=executor)
+        self._multiply_add(out[1], (self.c11, d.uz_zz), (self.c12_c44, d.ux_xz), (self.c44, d.uz_xx),
+                           window=window, executor=executor)
+        return out
 
 
 class VTIMedium(Medium):
@@ -137,6 +262,8 @@ class VTIMedium(Medium):
         self.c33 = None
         self.required_c.append("c12")
         self.c12 = None
+        self.c12_c44 = None
+        self.combined_c.append("c12_c44")
         print(self.required_c)
 
     def load_file(self):
@@ -151,29 +278,21 @@ class VTIMedium(Medium):
             c44=c44
         )
         self._check_required_c_shape()
+        self._compact_required_c()
         self.check_speed()
 
-    def calculate_step_value(self, ux, uz, use_anti_extension=False, method='psm'):
-        if not use_anti_extension:
-            from tools.psm import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.array([
-                self.c11 * cal_ddx(ux, self.cfg.kx) +
-                self.c44 * cal_ddz(ux, self.cfg.kz) +
-                (self.c12 + self.c44) * cal_dx(cal_dz(uz, self.cfg.kz), self.cfg.kx),
-                (self.c44 + self.c12) * cal_dz(cal_dx(ux, self.cfg.kx), self.cfg.kz) +
-                self.c44 * cal_ddx(uz, self.cfg.kx) +
-                self.c33 * cal_ddz(uz, self.cfg.kz)
-            ])
-        else:
-            from tools.psm_anti import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.array([
-                self.c11 * cal_ddx(ux, self.cfg.kx2) +
-                self.c44 * cal_ddz(ux, self.cfg.kz2) +
-                (self.c12 + self.c44) * cal_dx(cal_dz(uz, self.cfg.kz2), self.cfg.kx2),
-                (self.c44 + self.c12) * cal_dz(cal_dx(ux, self.cfg.kx2), self.cfg.kz2) +
-                self.c44 * cal_ddx(uz, self.cfg.kx2) +
-                self.c33 * cal_ddz(uz, self.cfg.kz2)
-            ])
+    def _combine_c(self):
+        self.c12_c44 = self.c12 + self.c44
+
+    def calculate_step_value(self, ux, uz, use_anti_extension=False, method=constants.SPACE_PSM, out=None,
+                             stretch=None, window=None, engine=None, executor=None):
+        d = self._derivatives(ux, uz, use_anti_extension, method, stretch, engine)
+        out = self._get_out(out, ux)
+        self._multiply_add(out[0], (self.c11, d.ux_xx), (self.c44, d.ux_zz), (self.c12_c44, d.uz_xz),
+                           window=window, executor=executor)
+        self._multiply_add(out[1], (self.c12_c44, d.ux_xz), (self.c44, d.uz_xx), (self.c33, d.uz_zz),
+                           window=window, executor=executor)
+        return out
 
 
 class HTIMedium(Medium):
@@ -185,6 +304,8 @@ class HTIMedium(Medium):
         self.c33 = None
         self.required_c.append("c55")
         self.c55 = None
+        self.c12_c55 = None
+        self.combined_c.append("c12_c55")
 
     def load_file(self):
         pass  # TODO
@@ -199,26 +320,18 @@ class HTIMedium(Medium):
             c55=c55
         )
         self._check_required_c_shape()
+        self._compact_required_c()
         self.check_speed()
 
-    def calculate_step_value(self, ux, uz, use_anti_extension=False, method='psm'):
-        if not use_anti_extension:
-            from tools.psm import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.array([
-                self.c11 * cal_ddx(ux, self.cfg.kx) +
-                self.c55 * cal_ddz(ux, self.cfg.kz) +
-                (self.c12 + self.c55) * cal_dx(cal_dz(uz, self.cfg.kz), self.cfg.kx),
-                self.c55 * cal_ddx(uz, self.cfg.kx) +
-                (self.c12 + self.c55) * cal_dx(cal_dz(ux, self.cfg.kz), self.cfg.kx) +
-                self.c33 * cal_ddz(uz, self.cfg.kz)
-            ])
-        else:
-            from tools.psm_anti import cal_dx, cal_dz, cal_ddx, cal_ddz
-            return np.array([
-                self.c11 * cal_ddx(ux, self.cfg.kx2) +
-                self.c55 * cal_ddz(ux, self.cfg.kz2) +
-                (self.c12 + self.c55) * cal_dx(cal_dz(uz, self.cfg.kz2), self.cfg.kx2),
-                self.c55 * cal_ddx(uz, self.cfg.kx2) +
-                (self.c12 + self.c55) * cal_dx(cal_dz(ux, self.cfg.kz2), self.cfg.kx2) +
-                self.c33 * cal_ddz(uz, self.cfg.kz2)
-            ])
+    def _combine_c(self):
+        self.c12_c55 = self.c12 + self.c55
+
+    def calculate_step_value(self, ux, uz, use_anti_extension=False, method=constants.SPACE_PSM, out=None,
+                             stretch=None, window=None, engine=None, executor=None):
+        d = self._derivatives(ux, uz, use_anti_extension, method, stretch, engine)
+        out = self._get_out(out, ux)
+        self._multiply_add(out[0], (self.c11, d.ux_xx), (self.c55, d.ux_zz), (self.c12_c55, d.uz_xz),
+                           window=window, executor=executor)
+        self._multiply_add(out[1], (self.c55, d.uz_xx), (self.c12_c55, d.ux_xz), (self.c33, d.uz_zz),
+                           window=window, executor=executor)
+        return out
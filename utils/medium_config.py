@@ -1,4 +1,6 @@
 import numpy as np
+
+import constants
 from tools.psm import cal_psm_k
 
 
@@ -7,7 +9,8 @@ class MediumConfig:
             self,
             xmin: float, xmax: float, dx: float,
             zmin: float, zmax: float, dz: float,
-            medium_type: str  # ['I', 'VTI', 'TTI']
+            medium_type: str,  # ['I', 'VTI', 'TTI']
+            precision: str = None  # ['float32', 'float64']
     ):
         self.xmin = xmin
         self.xmax = xmax
@@ -22,6 +25,13 @@ class MediumConfig:
         self.medium_type = medium_type
         self.shape = (self.nz, self.nx)
 
+        if precision is None:
+            precision = constants.PRECISION_FLOAT64
+        if precision not in constants.PRECISIONS:
+            raise ValueError("precision {} does not support. Choice in {}.".format(precision, constants.PRECISIONS))
+        self.precision = precision
+        self.dtype = np.dtype(precision)
+
         self.kx = cal_psm_k(self.nx, 2 * np.pi / (self.dx * self.nx))
         self.kz = cal_psm_k(self.nz, 2 * np.pi / (self.dx * self.nx))
 
@@ -42,5 +52,7 @@ ZAXIS-RANGE:
 \tzmin: {self.zmin:.2f}m\tzmax: {self.zmax:.2f}m\tnz: {self.nz}
 MEDIUM_TYPE:
 \t{self.medium_type}
+PRECISION:
+\t{self.precision}
 --------------------------------------------------------------------------------
 """
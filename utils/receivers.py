@@ -0,0 +1,331 @@
+import struct
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import constants
+from tools import get_file_ext
+
+
+def cal_bilinear_stencil(x, z):
+    """
+    Cells and weights of the bilinear interpolation at the fractional grid positions (x, z).
+
+    Args:
+        x: fractional x index of every receiver, array with shape (nrec,).
+        z: fractional z index of every receiver, array with shape (nrec,).
+
+    Returns:
+        (iz, ix, w), arrays with shape (nrec, 4).
+    """
+    x0 = np.floor(x).astype(int)
+    z0 = np.floor(z).astype(int)
+    fx = (x - x0)[:, np.newaxis]
+    fz = (z - z0)[:, np.newaxis]
+    ix = x0[:, np.newaxis] + np.array([0, 1, 0, 1])
+    iz = z0[:, np.newaxis] + np.array([0, 0, 1, 1])
+    w = np.concatenate([(1 - fx) * (1 - fz), fx * (1 - fz), (1 - fx) * fz, fx * fz], axis=1)
+    return iz, ix, w
+
+
+def cal_sinc_weights(f, radius):
+    """
+    Kaiser windowed sinc weights of the 2 * radius cells around the fractional offset `f`.
+    """
+    offsets = np.arange(-radius + 1, radius + 1)
+    d = offsets[np.newaxis, :] - f[:, np.newaxis]
+    # kaiser window of half width radius at the distance d
+    beta = constants.RECEIVER_SINC_BETA
+    window = np.i0(beta * np.sqrt(np.clip(1 - (d / radius) ** 2, 0, None))) / np.i0(beta)
+    return np.sinc(d) * window
+
+
+def cal_sinc_stencil(x, z, radius=None):
+    """
+    Cells and weights of the windowed sinc interpolation at the fractional grid positions (x, z).
+    The interpolation is separable, the stencil is 2 * radius cells along each axis.
+
+    Returns:
+        (iz, ix, w), arrays with shape (nrec, (2 * radius) ** 2).
+    """
+    if radius is None:
+        radius = constants.RECEIVER_SINC_RADIUS
+    x0 = np.floor(x).astype(int)
+    z0 = np.floor(z).astype(int)
+    offsets = np.arange(-radius + 1, radius + 1)
+    wx = cal_sinc_weights(x - x0, radius)
+    wz = cal_sinc_weights(z - z0, radius)
+
+    nrec = len(x)
+    ix = np.broadcast_to((x0[:, np.newaxis] + offsets)[:, np.newaxis, :], (nrec, 2 * radius, 2 * radius))
+    iz = np.broadcast_to((z0[:, np.newaxis] + offsets)[:, :, np.newaxis], (nrec, 2 * radius, 2 * radius))
+    w = wz[:, :, np.newaxis] * wx[:, np.newaxis, :]
+    return iz.reshape(nrec, -1), ix.reshape(nrec, -1), w.reshape(nrec, -1)
+
+
+def cal_decimation_filter(factor, zeros=None):
+    """
+    Low pass FIR filter of the decimation by `factor`, a Kaiser windowed sinc with the cutoff at
+    0.8 times the nyquist frequency of the decimated traces.
+
+    Args:
+        factor: decimation factor.
+        zeros: number of zero crossings of the sinc on each side.
+
+    Returns:
+        filter taps, array with shape (2 * zeros * factor + 1,), the sum of the taps is 1.
+    """
+    if zeros is None:
+        zeros = constants.RECEIVER_FIR_ZEROS
+    half = zeros * factor
+    n = np.arange(-half, half + 1)
+    cutoff = 0.8 / (2 * factor)
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(2 * half + 1, constants.RECEIVER_FIR_BETA)
+    return taps / taps.sum()
+
+
+class Receivers:
+    """
+    Receivers record the displacement at arbitrary (x, z) positions after every step of a simulator,
+    the traces are written into a preallocated buffer, no wave field is stored.
+
+    The displacement at a receiver is interpolated from the cells around it, with the bilinear
+    interpolation or a Kaiser windowed sinc, see `constants.RECEIVER_INTERPOLATIONS`. Cells out of
+    the grid have zero weight.
+
+    With a decimation factor q the traces are low pass filtered on the fly and only one sample of
+    every q steps is kept: the last samples are kept in a ring buffer, and a decimated sample is
+    filtered as soon as the half length of the filter has been recorded after it. Samples after the
+    end of the simulation are taken as zero.
+
+    Sample j is recorded after step j * q and belongs to the time t0 + j * q * dt, as the frames of
+    `examples.wave_loop`.
+    """
+    def __init__(self, positions, interpolation=None, decimation=None):
+        """
+        Args:
+            positions: list of receiver positions [[x, z], ...].
+            interpolation: interpolation method, see constants.RECEIVER_INTERPOLATIONS. Defaults to bilinear.
+            decimation: int, keep one sample every `decimation` steps. Defaults to 1.
+        """
+        if interpolation is None:
+            interpolation = constants.RECEIVER_BILINEAR
+        if interpolation not in constants.RECEIVER_INTERPOLATIONS:
+            raise ValueError("receiver interpolation {} does not support. Choice in {}."
+                             .format(interpolation, constants.RECEIVER_INTERPOLATIONS))
+        if decimation is None:
+            decimation = 1
+        if decimation < 1:
+            raise ValueError("decimation factor should be a positive int, but {}".format(decimation))
+
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.nrec = len(self.positions)
+        self.interpolation = interpolation
+        self.decimation = int(decimation)
+
+        self.dt = None  # sample interval of the traces
+        self.t0 = None  # time of the first sample
+        self.nt = None  # number of samples
+        self.data = None  # traces with shape (..., 2, nrec, nt)
+
+        # interpolation stencil, see `set_simulation`
+        self.iz = None
+        self.ix = None
+        self.w = None
+
+        # decimation state
+        self.taps = None
+        self.ring = None
+        self.n_recorded = 0
+        self.n_steps = 0
+
+    def __len__(self):
+        return self.nrec
+
+    # traces of the displacement components, arrays with shape (..., nrec, nt)
+    @property
+    def ux(self):
+        return self.data[..., 0, :, :]
+
+    @property
+    def uz(self):
+        return self.data[..., 1, :, :]
+
+    @property
+    def ts(self):
+        return self.t0 + self.dt * np.arange(self.nt)
+
+    def set_simulation(self, simulator):
+        """
+        Compute the interpolation stencil in the grid of the simulator and allocate the traces of
+        the remaining steps. Called by the simulator when the receivers are added.
+        """
+        cfg = simulator.medium.cfg
+        x = (self.positions[:, 0] - cfg.xmin) / cfg.dx
+        z = (self.positions[:, 1] - cfg.zmin) / cfg.dz
+        if self.interpolation == constants.RECEIVER_SINC:
+            iz, ix, w = cal_sinc_stencil(x, z)
+        else:
+            iz, ix, w = cal_bilinear_stencil(x, z)
+        # cells out of the grid are replaced by a cell in it with zero weight
+        inside = (iz >= 0) & (iz < cfg.nz) & (ix >= 0) & (ix < cfg.nx)
+        self.iz = np.where(inside, iz, 0)
+        self.ix = np.where(inside, ix, 0)
+        self.w = np.where(inside, w, 0).astype(cfg.dtype)
+
+        self.n_steps = simulator.remaining_steps()
+        self.dt = simulator.dt * self.decimation
+        self.t0 = simulator.current_t
+        self.nt = -(-self.n_steps // self.decimation)
+        # one trace of each displacement component of every state, (..., 2, nrec, nt)
+        self.data = np.zeros((*simulator.u.shape[:-2], self.nrec, self.nt), dtype=cfg.dtype)
+        self.n_recorded = 0
+
+        if self.decimation > 1:
+            self.taps = cal_decimation_filter(self.decimation).astype(cfg.dtype)
+            self.ring = np.zeros((*self.data.shape[:-1], len(self.taps)), dtype=cfg.dtype)
+
+    def interpolate(self, u):
+        """
+        Displacement at the receivers.
+
+        Args:
+            u: state array with shape (..., nz, nx).
+
+        Returns:
+            array with shape (..., nrec).
+        """
+        return np.einsum("...rk,rk->...r", u[..., self.iz, self.ix], self.w)
+
+    def record(self, simulator):
+        """
+        Record the fields of the simulator after one step.
+        """
+        if self.n_recorded >= self.n_steps:
+            return
+        value = self.interpolate(simulator.u)
+        if simulator.use_anti_extension:
+            value = (value + self.interpolate(simulator.an_u)) / 2
+        self._push(value)
+
+    def _push(self, value):
+        i = self.n_recorded
+        self.n_recorded += 1
+        if self.decimation == 1:
+            self.data[..., i] = value
+            return
+
+        self.ring[..., i % len(self.taps)] = value
+        # sample j is at step j * q in the middle of the filter, it is ready half a filter later
+        half = len(self.taps) // 2
+        if i >= half and (i - half) % self.decimation == 0:
+            self._filter((i - half) // self.decimation)
+        if self.n_recorded == self.n_steps:
+            self.finish()
+
+    def _filter(self, j):
+        """
+        Decimated sample j from the ring buffer, steps before the start and after the last record are zero.
+        """
+        n = len(self.taps)
+        steps = j * self.decimation + n // 2 - np.arange(n)
+        taps = np.where((steps >= 0) & (steps < self.n_recorded), self.taps, 0)
+        self.data[..., j] = self.ring[..., steps % n] @ taps
+
+    def finish(self):
+        """
+        Filter the decimated samples which wait for the steps after the last record.
+        Called after the last step, or before saving when the simulation is stopped early.
+        """
+        if self.ring is None or self.n_recorded == 0:
+            return
+        half = len(self.taps) // 2
+        last = self.n_recorded - 1
+        for j in range(max(0, (last - half) // self.decimation + 1), last // self.decimation + 1):
+            self._filter(j)
+
+    def save(self, fname):
+        """
+        Save the traces in the compact trace format:
+        -------------------------------------------------------
+        version                    3 int
+        float_size, nrec, nt, ns   4 int, ns is the number of states, 1 or the number of shots
+        dt, t0                     2 double
+        positions                  nrec * 2 double, (x, z) of every receiver
+        data                       ns * 2 * nrec * nt float of float_size, ux traces then uz traces
+        -------------------------------------------------------
+        """
+        self.finish()
+        file_ext = get_file_ext(fname)
+        if file_ext != constants.TRACE_FILE_EXT:
+            fname = fname + constants.TRACE_FILE_EXT
+        print(f"saving traces into file {fname}")
+
+        n_states = int(np.prod(self.data.shape[:-3]))
+        with open(fname, "wb") as fp:
+            for v in constants.__version__.split("."):
+                fp.write(struct.pack("i", int(v)))
+            fp.write(struct.pack("4i", self.data.dtype.itemsize, self.nrec, self.nt, n_states))
+            fp.write(struct.pack("2d", self.dt, self.t0))
+            fp.write(self.positions.astype(np.float64).tobytes())
+            fp.write(np.ascontiguousarray(self.data).tobytes())
+        return fname
+
+    @classmethod
+    def read(cls, fname):
+        """
+        Read the receivers and their traces from a trace file, see `save`.
+        """
+        with open(fname, "rb") as fp:
+            version = ".".join([str(i) for i in struct.unpack("3i", fp.read(12))])
+            print("reading trace file {}, version:{}".format(fname, version))
+            float_size, nrec, nt, n_states = struct.unpack("4i", fp.read(16))
+            if float_size == 4:
+                dtype = np.float32
+            elif float_size == 8:
+                dtype = np.float64
+            else:
+                raise ValueError("float size of {} can not match".format(float_size))
+            dt, t0 = struct.unpack("2d", fp.read(16))
+            positions = np.frombuffer(fp.read(nrec * 2 * 8), dtype=np.float64).reshape(nrec, 2)
+            data = np.frombuffer(fp.read(n_states * 2 * nrec * nt * float_size), dtype=dtype)
+
+        receivers = cls(positions)
+        receivers.dt = dt
+        receivers.t0 = t0
+        receivers.nt = nt
+        shape = (2, nrec, nt) if n_states == 1 else (n_states, 2, nrec, nt)
+        receivers.data = data.reshape(shape)
+        receivers.n_steps = receivers.n_recorded = nt
+        return receivers
+
+    def show(self, component=0, shot=0, *args, **kwargs):
+        """
+        Draw the traces of one displacement component as a section, receivers along x and time along z.
+
+        Args:
+            component: 0 for ux, 1 for uz.
+            shot: index of the shot, if the traces are recorded by a batch simulator.
+        """
+        traces = self.data.reshape(-1, 2, self.nrec, self.nt)[shot, component]
+        vmax = np.percentile(np.abs(traces), 99)
+        plt.imshow(
+            traces.T,
+            *args,
+            aspect='auto',
+            extent=[-0.5, self.nrec - 0.5, self.ts[-1], self.t0],
+            vmax=vmax,
+            vmin=-vmax,
+            **kwargs
+        )
+        plt.xlabel("receiver")
+        plt.ylabel("t")
+        plt.show()
+
+    def __str__(self):
+        return f"""\
+-------------------------- Receivers Config ------------------------------
+Number of Receivers: {self.nrec} \t Interpolation: {self.interpolation}
+Decimation: {self.decimation}
+--------------------------------------------------------------------------
+"""
@@ -19,7 +19,8 @@ def get_parser():
         help='显示版本信息'
     )
     # ============================= Command Run ================================= #
-    parser_run  = subparsers.add_parser(constants.COMMAND_RUN, help='run simulation')
+    # arguments of a simulation, shared by the run and run_shots commands
+    parser_simulate = argparse.ArgumentParser(add_help=False)
 
     parser_conf = argparse.ArgumentParser(add_help=False)
     parser_conf.add_argument("--subcommand", type=str)
@@ -33,11 +34,11 @@ def get_parser():
         for section in config.sections():
             values.update(dict(config.items(section)))
     
-    parser_run.set_defaults(**values)
-    parser_run.add_argument("--conf", type=str)
+    parser_simulate.set_defaults(**values)
+    parser_simulate.add_argument("--conf", type=str)
 
     # # Medium Config
-    medium_cfg = parser_run.add_argument_group(title="Medium Config")
+    medium_cfg = parser_simulate.add_argument_group(title="Medium Config")
     # # # Min Value of x-axis
     medium_cfg.add_argument(
         '--xmin',
@@ -105,7 +106,7 @@ def get_parser():
         '--c55'
     )
     # # source configs
-    source_cfg = parser_run.add_argument_group(title="Source Configs")
+    source_cfg = parser_simulate.add_argument_group(title="Source Configs")
     source_cfg.add_argument(
         "--source_x",
         type=float
@@ -137,7 +138,7 @@ def get_parser():
         type=float
     )
     # # Boundary Configs
-    boundary_cfg = parser_run.add_argument_group(title="Boundary Configs")
+    boundary_cfg = parser_simulate.add_argument_group(title="Boundary Configs")
     # # # Boundary Type
     boundary_cfg.add_argument(
         "--boundary_type", dest='boundary_type',
@@ -160,7 +161,7 @@ def get_parser():
         type=float
     )
     # # simulate Configs
-    simulate_cfgs = parser_run.add_argument_group(title="Simulate Configs")
+    simulate_cfgs = parser_simulate.add_argument_group(title="Simulate Configs")
     
     simulate_cfgs.add_argument(
         "--simulate_time",
@@ -171,11 +172,63 @@ def get_parser():
         type=float
     )
 
+    simulate_cfgs.add_argument(
+        "--space_domain_method",
+        type=str,
+        choices=constants.SPACE_DOMAIN_METHODS,
+        help="method of the space derivatives, defaults to PSM."
+    )
+
+    simulate_cfgs.add_argument(
+        "--fd_order",
+        type=int,
+        choices=constants.FD_ORDERS,
+        help="order of the finite difference stencils, only used by the FD method."
+    )
+
+    simulate_cfgs.add_argument(
+        "--time_integrator",
+        type=str,
+        choices=constants.TIME_INTEGRATORS,
+        help="time integrator, kspace corrects the second order step for larger delta t, defaults to fd2."
+    )
+
+    simulate_cfgs.add_argument(
+        "--reference_velocity",
+        type=float,
+        help="reference velocity of the kspace integrator, defaults to the max p wave velocity."
+    )
+
     simulate_cfgs.add_argument(
         "--use_anti_extension",
         action="store_true"
     )
 
+    simulate_cfgs.add_argument(
+        "--precision",
+        type=str,
+        choices=constants.PRECISIONS,
+        help="float precision of the simulation, defaults to float64."
+    )
+
+    simulate_cfgs.add_argument(
+        "--validate_precision",
+        action="store_true",
+        help="run a float64 simulation side by side and report the deviation instead of a normal run."
+    )
+
+    simulate_cfgs.add_argument(
+        "--fft_backend",
+        type=str,
+        choices=constants.FFT_BACKENDS
+    )
+
+    simulate_cfgs.add_argument(
+        "--threads",
+        type=int,
+        help="number of threads of one step, defaults to 1."
+    )
+
     simulate_cfgs.add_argument(
         "--run_with_show", action="store_true"
     )
@@ -185,7 +238,7 @@ def get_parser():
     )
 
     # # save configs
-    save_cfg = parser_run.add_argument_group(title="Save Configs")
+    save_cfg = parser_simulate.add_argument_group(title="Save Configs")
     save_cfg.add_argument(
         "--save",
         action="store_true",
@@ -198,6 +251,13 @@ def get_parser():
         choices=constants.SAVE_FORMATS
     )
 
+    save_cfg.add_argument(
+        "--compression",
+        type=str,
+        choices=constants.COMPRESSIONS,
+        help="compression of the v2 save format, defaults to zlib."
+    )
+
     save_cfg.add_argument(
         "--x_outfile",
         type=str,
@@ -210,6 +270,70 @@ def get_parser():
     save_cfg.add_argument(
         "--save_times",
     )
+
+    save_cfg.add_argument(
+        "--save_stride",
+        type=int,
+        help="save one cell of every n cells along x and z, defaults to 1."
+    )
+
+    save_cfg.add_argument(
+        "--save_roi",
+        help="region of interest [xmin, xmax, zmin, zmax], only the cells in it are saved."
+    )
+
+    save_cfg.add_argument(
+        "--save_exclude_absorb",
+        action="store_true",
+        help="don't save the absorbing strips of the boundary."
+    )
+
+    # # receiver configs
+    receiver_cfg = parser_simulate.add_argument_group(title="Receiver Configs")
+    receiver_cfg.add_argument(
+        "--receivers",
+        help="list of receiver positions [[x, z], ...], traces are recorded every step."
+    )
+    receiver_cfg.add_argument(
+        "--receiver_interpolation",
+        type=str,
+        choices=constants.RECEIVER_INTERPOLATIONS,
+        help="interpolation of the fields at the receivers, defaults to bilinear."
+    )
+    receiver_cfg.add_argument(
+        "--receiver_decimation",
+        type=int,
+        help="keep one sample every n steps, the traces are low pass filtered before. defaults to 1."
+    )
+    receiver_cfg.add_argument(
+        "--receiver_outfile",
+        type=str,
+        help="trace file of the receivers."
+    )
+
+    parser_run = subparsers.add_parser(constants.COMMAND_RUN, help='run simulation', parents=[parser_simulate])
+    # ========================================================================== #
+    # =========================== Run Shots Command ============================ #
+    parser_run_shots = subparsers.add_parser(
+        constants.COMMAND_RUN_SHOTS,
+        help='run shots at several source positions with a process pool',
+        parents=[parser_simulate]
+    )
+    shots_cfg = parser_run_shots.add_argument_group(title="Shots Configs")
+    shots_cfg.add_argument(
+        "--shots",
+        help="list of source positions [[x, z], ...]."
+    )
+    shots_cfg.add_argument(
+        "--out_dir",
+        type=str,
+        help="directory of the shot files, finished shots in it are skipped."
+    )
+    shots_cfg.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes, defaults to the number of cpus."
+    )
     # ========================================================================== #
     # =========================== Show SFD Command ============================= #
     parser_show = subparsers.add_parser(constants.COMMAND_SHOW, help="draw sfd format file")
@@ -239,7 +363,8 @@ def get_parser():
     )
     parser_show.add_argument(
         "--seg",
-        type=float
+        type=float,
+        help="time between two frames, frames are skipped when drawing is slower."
     )
     parser_show.add_argument(
         "--dpi",
@@ -279,6 +404,21 @@ def get_parser():
         "--dpi",
         type=float
     )
+    parser_save_gif.add_argument(
+        "--workers",
+        type=int,
+        help="number of rendering processes, defaults to the number of cpus."
+    )
+    parser_save_gif.add_argument(
+        "--fast",
+        action="store_true",
+        help="colour map the cells of the frames without figures, for batch export."
+    )
+    parser_save_gif.add_argument(
+        "--max_size",
+        type=int,
+        help="max pixels of the larger side of the frames of the fast mode, frames are downsampled."
+    )
     # ========================================================================== #
     # =========================  Save Png Command ============================== #
     parser_save_png = subparsers.add_parser(constants.COMMAND_SAVE_PNG, help="save sfd file into pngs")
@@ -308,6 +448,21 @@ def get_parser():
         "--dpi",
         type=float
     )
+    parser_save_png.add_argument(
+        "--workers",
+        type=int,
+        help="number of rendering processes, defaults to the number of cpus."
+    )
+    parser_save_png.add_argument(
+        "--fast",
+        action="store_true",
+        help="colour map the cells of the frames without figures, for batch export."
+    )
+    parser_save_png.add_argument(
+        "--max_size",
+        type=int,
+        help="max pixels of the larger side of the frames of the fast mode, frames are downsampled."
+    )
 
     # ======================================================================== # 
 
@@ -354,4 +509,32 @@ def get_parser():
         type=str,
     )
 
-    return parser, parser_run, parser_show, parser_save_gif, parser_save_png
+    # ======================== Convert Command ============================ #
+    parser_convert = subparsers.add_parser(constants.COMMAND_CONVERT, help="convert sfd file into the v2 format.")
+    parser_convert.add_argument(
+        "--input_file",
+        required=True
+    )
+    parser_convert.add_argument(
+        "--file_format",
+        type=str,
+        choices=constants.SAVE_FORMATS
+    )
+    parser_convert.add_argument(
+        "--output_file",
+        required=True
+    )
+    parser_convert.add_argument(
+        "--compression",
+        type=str,
+        choices=constants.COMPRESSIONS,
+        help="compression of the chunks, defaults to zlib."
+    )
+    parser_convert.add_argument(
+        "--chunks",
+        type=int,
+        nargs=3,
+        help="frames, z cells and x cells of one chunk, defaults to {} {} {}.".format(*constants.SFD_V2_CHUNKS)
+    )
+
+    return parser, parser_run, parser_show, parser_save_gif, parser_save_png, parser_run_shots
@@ -1,7 +1,16 @@
+from typing import List
+
 import numpy as np
+
+import constants
+from tools.compact_coefficient import take_window
+from tools.fd_engine import cal_fd_stability
+from tools.fft_backend import FFTBackend
+from tools.slab_executor import SlabExecutor, take_slab
 from .medium import Medium
 from .source import Source
 from .boundary import Boundary
+from .receivers import Receivers
 
 
 def time_fd2(field_now, field_last, dt, time_factor):
@@ -11,6 +20,54 @@ def time_fd2(field_now, field_last, dt, time_factor):
     return field_now, field_last
 
 
+def time_fd2_inplace(field_now, field_last, time_factor):
+    """
+    Second order time difference without allocation, the next field is written into `field_last`.
+
+    Args:
+        field_now: field at current time.
+        field_last: field at last time, overwritten by the field at next time.
+        time_factor: dt ** 2 * (acceleration of the field), overwritten.
+
+    Returns:
+        (field_next, field_now), swap the buffers to rotate the time levels.
+    """
+    field_last *= -1
+    field_last += field_now
+    field_last += field_now
+    field_last += time_factor
+    return field_last, field_now
+
+
+def cal_kspace_stability(vpmax, c0):
+    """
+    Max value of (vpmax * dt / min(dx, dz)) of the k-space corrected time step.
+
+    A wave of velocity v is stable if 4 * (v / c0) ** 2 * sin(c0 * |k| * dt / 2) ** 2 <= 4 at the
+    largest wave number |k| = sqrt(2) * pi / h. That is always true if c0 >= vpmax, otherwise
+    vpmax * dt / h <= sqrt(2) / pi * (vpmax / c0) * arcsin(c0 / vpmax).
+    """
+    if c0 >= vpmax:
+        return np.inf
+    return np.sqrt(2) / np.pi * (vpmax / c0) * np.arcsin(c0 / vpmax)
+
+
+def state_component(state, index, axis=0):
+    """
+    Property of one displacement component, which is a view of the state array named `state`.
+    The components are stored along `axis` of the state array.
+    """
+    key = (slice(None),) * axis + (index,)
+
+    def getter(self):
+        return getattr(self, state)[key]
+
+    def setter(self, value):
+        getattr(self, state)[key] = value
+
+    return property(getter, setter)
+
+
 class SeismicSimulator:
     """
     initialized by simulation base parameter
@@ -24,95 +81,294 @@ class SeismicSimulator:
             boundary: Boundary,
             dt: float = 0.1,
             endt: float = 1,
-            space_domain_method: str = 'PSM',  # TODO: ADD METHODS
-            use_anti_extension: bool = False
+            space_domain_method: str = constants.SPACE_PSM,
+            use_anti_extension: bool = False,
+            fft_backend: str = None,
+            threads: int = None,
+            fd_order: int = None,
+            time_integrator: str = None,
+            reference_velocity: float = None,
+            receivers: Receivers = None
     ):
         self.medium = medium
         self.boundary = boundary
         self.source = source
 
+        if space_domain_method is None:
+            space_domain_method = constants.SPACE_PSM
+        space_domain_method = space_domain_method.upper()
+        if space_domain_method not in constants.SPACE_DOMAIN_METHODS:
+            raise ValueError("space domain method {} does not support. Choice in {}."
+                             .format(space_domain_method, constants.SPACE_DOMAIN_METHODS))
+        if space_domain_method == constants.SPACE_FD and use_anti_extension:
+            raise ValueError("anti extension is a method of PSM, it can not be used with FD.")
         self.space_domain_method = space_domain_method
         self.use_anti_extension = use_anti_extension
 
+        # order of the finite difference stencils, see constants.FD_ORDERS
+        if fd_order is None:
+            fd_order = constants.FD_DEFAULT_ORDER
+        self.fd_order = fd_order
+
         self.dt = dt
         self.endt = endt
 
-        self.ux = np.zeros(shape=medium.cfg.shape)
-        self.uz = np.zeros(shape=medium.cfg.shape)
+        # time integrator, see constants.TIME_INTEGRATORS
+        if time_integrator is None:
+            time_integrator = constants.TIME_FD2
+        if time_integrator not in constants.TIME_INTEGRATORS:
+            raise ValueError("time integrator {} does not support. Choice in {}."
+                             .format(time_integrator, constants.TIME_INTEGRATORS))
+        if time_integrator == constants.TIME_KSPACE and space_domain_method != constants.SPACE_PSM:
+            raise ValueError("k-space time integrator is a method of PSM, it can not be used with FD.")
+        if time_integrator == constants.TIME_KSPACE and use_anti_extension:
+            raise ValueError("k-space time integrator can not be used with the anti extension method.")
+        self.time_integrator = time_integrator
+        # reference velocity of the k-space correction, defaults to the max P velocity
+        if reference_velocity is None:
+            reference_velocity = self.medium.vpmax
+        self.reference_velocity = reference_velocity
+        if self.time_integrator == constants.TIME_KSPACE:
+            self.kspace = (self.reference_velocity, self.dt)
+        else:
+            self.kspace = None
 
-        self.lux = np.zeros(shape=medium.cfg.shape)
-        self.luz = np.zeros(shape=medium.cfg.shape)
+        # fft backend of the pseudo-spectral derivatives, see constants.FFT_BACKENDS
+        self.fft_backend = FFTBackend.get_backend(fft_backend, threads)
+        # the same number of threads run the step on z-slabs, see tools.slab_executor
+        self.executor = SlabExecutor.get_executor(threads)
+
+        # wave field state (ux, uz) at current time and last time, time levels are rotated by swapping.
+        dtype = medium.cfg.dtype
+        self.u = np.zeros(shape=self.state_shape(), dtype=dtype)
+        self.u_last = np.zeros(shape=self.state_shape(), dtype=dtype)
 
         if self.use_anti_extension:
-            self.an_ux = np.zeros(shape=medium.cfg.shape)
-            self.an_uz = np.zeros(shape=medium.cfg.shape)
+            self.an_u = np.zeros(shape=self.state_shape(), dtype=dtype)
+            self.an_u_last = np.zeros(shape=self.state_shape(), dtype=dtype)
+
+        # buffer of dt ** 2 / rho * force
+        self.force = np.zeros(shape=self.state_shape(), dtype=dtype)
+        self.dt2_rho = (self.dt ** 2 / self.medium.rho).astype(dtype)
+        self.boundary.set_simulation(self)
 
-            self.an_lux = np.zeros(shape=medium.cfg.shape)
-            self.an_luz = np.zeros(shape=medium.cfg.shape)
+        # local stencils only change the cells near the non zero cells, see `update_active_window`
+        self.use_active_window = self.space_domain_method == constants.SPACE_FD
+        self.active_box = None
 
         self.current_nt = 0
         self.current_t = 0
 
+        # traces recorded after every step, see `add_receivers`
+        self.receivers = None
+        if receivers is not None:
+            self.add_receivers(receivers)
+
         self.check_stability()
 
+    def state_shape(self):
+        return (2, *self.medium.cfg.shape)
+
+    def components(self, state):
+        """
+        The (ux, uz) views of a state array, stacked along the first axis.
+        """
+        return state
+
     def check_stability(self):
         vpmax = self.medium.vpmax
         dx = self.medium.cfg.dx
         dz = self.medium.cfg.dz
 
+        if self.space_domain_method == constants.SPACE_FD:
+            limit = cal_fd_stability(self.fd_order)
+        elif self.time_integrator == constants.TIME_KSPACE:
+            limit = cal_kspace_stability(vpmax, self.reference_velocity)
+        else:
+            limit = np.sqrt(2) / np.pi
+
         print("Simulation Stability: {:.4f}".format(vpmax * self.dt / np.min([dx, dz])))
         print("Wave Spread from top to bottom need time {:.4f}s".format(
             (self.medium.cfg.xmax - self.medium.cfg.xmin) / vpmax))
+        if np.isinf(limit):
+            print("k-space time integrator with reference velocity >= max P velocity is unconditionally stable.")
 
-        assert (vpmax * self.dt / np.min([dx, dz])) < (np.sqrt(2) / np.pi), \
+        assert (vpmax * self.dt / np.min([dx, dz])) < limit, \
             "Stability Can't pass, the value of (vmax * dt / dx) is {:.3f}, which should less than {:.3f}" \
-                .format(vpmax * self.dt / np.min([dx, dz]), np.sqrt(2) / np.pi)
+                .format(vpmax * self.dt / np.min([dx, dz]), limit)
+
+    # displacement components are views of the state arrays
+    ux = state_component("u", 0)
+    uz = state_component("u", 1)
+    lux = state_component("u_last", 0)
+    luz = state_component("u_last", 1)
+    an_ux = state_component("an_u", 0)
+    an_uz = state_component("an_u", 1)
+    an_lux = state_component("an_u_last", 0)
+    an_luz = state_component("an_u_last", 1)
 
     def apply_source(self):
-        self.ux[self.source.sz, self.source.sx] += self.dt ** 2 / self.medium.rho[
-            self.source.sz, self.source.sx] * self.source.get_x_response(self.current_t)
-        self.uz[self.source.sz, self.source.sx] += self.dt ** 2 / self.medium.rho[
-            self.source.sz, self.source.sx] * self.source.get_z_response(self.current_t)
+        sz, sx = self.source.sz, self.source.sx
+        # dt2_rho may be stored in a compact shape, see tools.compact_coefficient
+        dt2_rho = np.broadcast_to(self.dt2_rho, self.medium.cfg.shape)[sz, sx]
+        fx = dt2_rho * self.source.get_x_response(self.current_t)
+        fz = dt2_rho * self.source.get_z_response(self.current_t)
+
+        self.u[0, sz, sx] += fx
+        self.u[1, sz, sx] += fz
 
         if self.use_anti_extension:
-            self.an_ux[self.source.sz, self.source.sx] += self.dt ** 2 / self.medium.rho[
-                self.source.sz, self.source.sx] * self.source.get_x_response(self.current_t)
-            self.an_uz[self.source.sz, self.source.sx] += self.dt ** 2 / self.medium.rho[
-                self.source.sz, self.source.sx] * self.source.get_z_response(self.current_t)
+            self.an_u[0, sz, sx] += fx
+            self.an_u[1, sz, sx] += fz
+
+    def add_receivers(self, receivers: Receivers):
+        """
+        Record the fields at the receivers after every remaining step.
+        """
+        receivers.set_simulation(self)
+        self.receivers = receivers
+        print(receivers)
 
     def forward(self):
         if self.check_end():
             print("Process Completed!")
             return
 
+        self._step()
+
+    def advance(self, n_steps):
+        """
+        Run `n_steps` steps, or less if the simulation ends before.
+
+        Args:
+            n_steps: number of steps to run.
+
+        Returns:
+            number of steps run.
+        """
+        n_steps = min(n_steps, self.remaining_steps())
+        for _ in range(n_steps):
+            self._step()
+        return n_steps
+
+    def remaining_steps(self):
+        return max(0, int(np.ceil(np.round((self.endt - self.current_t) / self.dt, 6))))
+
+    def _step(self):
         self.apply_source()
         self.time_step()
 
-        # apply boundary
-        self.boundary.apply(self.ux)
-        self.boundary.apply(self.uz)
-
+        # apply boundary to all components of both time levels of the state arrays
+        states = [self.u, self.u_last]
         if self.use_anti_extension:
-            self.boundary.apply(self.an_ux)
-            self.boundary.apply(self.an_uz)
+            states += [self.an_u, self.an_u_last]
+        self.executor.map(self.boundary.apply, states)
+
+        if self.receivers is not None:
+            self.receivers.record(self)
 
         self._update_t()
 
     def time_step(self):
-        (self.ux, self.uz), (self.lux, self.luz) = time_fd2(
-            np.asarray([self.ux, self.uz]),
-            np.asarray([self.lux, self.luz]),
-            self.dt,
-            1 / self.medium.rho * self.medium.calculate_step_value(self.ux, self.uz)
-        )
+        window = self.update_active_window()
+        self.u, self.u_last = self._time_step(self.u, self.u_last, window=window)
 
         if self.use_anti_extension:
-            (self.an_ux, self.an_uz), (self.an_lux, self.an_luz) = time_fd2(
-                np.asarray([self.an_ux, self.an_uz]),
-                np.asarray([self.an_lux, self.an_luz]),
-                self.dt,
-                1 / self.medium.rho * self.medium.calculate_step_value(self.an_ux, self.an_uz, self.use_anti_extension)
-            )
+            self.an_u, self.an_u_last = self._time_step(self.an_u, self.an_u_last, self.use_anti_extension)
+
+    def source_cells(self):
+        """
+        List of (sz, sx) of the source cells.
+        """
+        return [(self.source.sz, self.source.sx)]
+
+    def update_active_window(self):
+        """
+        Window of the cells which the next step of a local stencil method can change.
+
+        Cells out of the numerical domain of dependence of the sources and the initial fields are
+        exactly zero, a step only changes the cells within the reach of the stencils around them,
+        so updating this window gives the same result as updating the whole grid, bit for bit.
+        The box of non zero cells is found in the fields at the first step, then it grows by the
+        reach of the stencils every step, until it covers the grid.
+
+        Returns:
+            (z slice, x slice) of the window, None if the whole grid is updated.
+        """
+        if not self.use_active_window:
+            return None
+        nz, nx = self.medium.cfg.shape
+        cells = self.source_cells()
+        if self.active_box is None:
+            mask = np.any((self.u != 0) | (self.u_last != 0), axis=tuple(range(self.u.ndim - 2)))
+            z, x = np.nonzero(mask)
+            cells += list(zip(z, x))
+            self.active_box = (nz, 0, nx, 0)
+        z_start, z_stop, x_start, x_stop = self.active_box
+        for sz, sx in cells:
+            sz, sx = int(sz), int(sx)
+            z_start, z_stop = min(z_start, sz), max(z_stop, sz + 1)
+            x_start, x_stop = min(x_start, sx), max(x_stop, sx + 1)
+
+        # the cells which may be non zero after the step
+        reach = self.get_engine().reach
+        self.active_box = (max(0, z_start - reach), min(nz, z_stop + reach),
+                           max(0, x_start - reach), min(nx, x_stop + reach))
+        z_start, z_stop, x_start, x_stop = self.active_box
+
+        # the memory variables of a stretching boundary need the whole grid when the box reaches the layers
+        in_layers = self.boundary.get_stretch(self, False) is not None and (
+            z_start < self.boundary.b or z_stop > nz - self.boundary.b or
+            x_start < self.boundary.a or x_stop > nx - self.boundary.a
+        )
+
+        # the window is rounded to blocks, so it changes shape and the work arrays are allocated rarely
+        block = constants.ACTIVE_WINDOW_BLOCK
+        z_start, x_start = z_start // block * block, x_start // block * block
+        z_stop, x_stop = min(nz, -(-z_stop // block) * block), min(nx, -(-x_stop // block) * block)
+        if (z_start, z_stop, x_start, x_stop) == (0, nz, 0, nx) or in_layers:
+            self.use_active_window = False
+            return None
+        return slice(z_start, z_stop), slice(x_start, x_stop)
+
+    def get_engine(self, use_anti_extension=False):
+        """
+        Derivative engine of the medium with the settings of this simulator, see `Medium.get_engine`.
+        """
+        return self.medium.get_engine(use_anti_extension, self.space_domain_method, self.fd_order, self.kspace,
+                                      self.fft_backend, self.executor)
+
+    def _time_step(self, u, u_last, use_anti_extension=False, window=None):
+        self._window_step(u, u_last, self.force, use_anti_extension, use_anti_extension, window)
+        return u_last, u
+
+    def _window_step(self, u, u_last, force, use_anti_extension, key, window):
+        """
+        Write the field at next time into `u_last`, only the cells in `window` if it is not None.
+        """
+        stretch = self.boundary.get_stretch(self, key)
+        if window is not None:
+            u, u_last, force = (take_window(state, window) for state in (u, u_last, force))
+            # the window is out of the layers of the boundary
+            stretch = None
+        self.medium.calculate_step_value(*self.components(u), use_anti_extension, self.space_domain_method,
+                                         out=self.components(force), stretch=stretch, window=window,
+                                         engine=self.get_engine(use_anti_extension), executor=self.executor)
+        self._leapfrog(u, u_last, force, window)
+
+    def _leapfrog(self, u, u_last, force, window=None):
+        """
+        Scale the force by dt ** 2 / rho and write the field at next time into `u_last`,
+        slabs of z rows are updated by the executor at the same time.
+        """
+        dt2_rho = take_window(self.dt2_rho, window)
+
+        def leapfrog(slab):
+            force_slab = force[..., slab, :]
+            force_slab *= take_slab(dt2_rho, slab)
+            time_fd2_inplace(u[..., slab, :], u_last[..., slab, :], force_slab)
+
+        self.executor.run(leapfrog, u.shape[-2])
 
     def check_end(self):
         if self.current_t >= self.endt:
@@ -122,3 +378,110 @@ class SeismicSimulator:
     def _update_t(self):
         self.current_nt += 1
         self.current_t += self.dt
+
+
+class BatchSeismicSimulator(SeismicSimulator):
+    """
+    Simulate several shots through one medium at once.
+
+    The state of every shot is stacked on a leading batch axis, arrays with shape
+    (n_shots, 2, nz, nx), so one step transforms all shots together and the medium,
+    the derivative engine and the boundary are shared by every shot.
+
+    Shots are stepped in chunks of `chunk_size` shots with batched transforms, large
+    grids use small chunks so the work arrays of one chunk stay in cache.
+    """
+
+    def __init__(
+            self,
+            medium: Medium,
+            sources: List[Source],
+            boundary: Boundary,
+            dt: float = 0.1,
+            endt: float = 1,
+            space_domain_method: str = constants.SPACE_PSM,
+            use_anti_extension: bool = False,
+            fft_backend: str = None,
+            threads: int = None,
+            fd_order: int = None,
+            time_integrator: str = None,
+            reference_velocity: float = None,
+            receivers: Receivers = None,
+            chunk_size: int = None
+    ):
+        self.sources = list(sources)
+        self.n_shots = len(self.sources)
+        assert self.n_shots > 0, "at least one source is required."
+
+        # source positions of every shot
+        self.sx = np.array([source.sx for source in self.sources])
+        self.sz = np.array([source.sz for source in self.sources])
+        self.shot_index = np.arange(self.n_shots)
+
+        if chunk_size is None:
+            field_bytes = np.dtype(medium.cfg.dtype).itemsize * medium.cfg.nz * medium.cfg.nx
+            chunk_size = max(1, constants.BATCH_CHUNK_BYTES // field_bytes)
+        self.chunk_size = min(chunk_size, self.n_shots)
+
+        super().__init__(
+            medium=medium,
+            source=self.sources[0],
+            boundary=boundary,
+            dt=dt,
+            endt=endt,
+            space_domain_method=space_domain_method,
+            use_anti_extension=use_anti_extension,
+            fft_backend=fft_backend,
+            threads=threads,
+            fd_order=fd_order,
+            time_integrator=time_integrator,
+            reference_velocity=reference_velocity,
+            receivers=receivers
+        )
+
+    # displacement components of all shots, arrays with shape (n_shots, nz, nx)
+    ux = state_component("u", 0, axis=1)
+    uz = state_component("u", 1, axis=1)
+    lux = state_component("u_last", 0, axis=1)
+    luz = state_component("u_last", 1, axis=1)
+    an_ux = state_component("an_u", 0, axis=1)
+    an_uz = state_component("an_u", 1, axis=1)
+    an_lux = state_component("an_u_last", 0, axis=1)
+    an_luz = state_component("an_u_last", 1, axis=1)
+
+    def state_shape(self):
+        return (self.n_shots, 2, *self.medium.cfg.shape)
+
+    def components(self, state):
+        return state.swapaxes(0, 1)
+
+    def _time_step(self, u, u_last, use_anti_extension=False, window=None):
+        for start in range(0, self.n_shots, self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            self._window_step(u[chunk], u_last[chunk], self.force[chunk], use_anti_extension,
+                              (use_anti_extension, start), window)
+        return u_last, u
+
+    def source_cells(self):
+        return list(zip(self.sz, self.sx))
+
+    def get_shot(self, index):
+        """
+        The wave field of one shot.
+
+        Returns:
+            (ux, uz) of the shot, views of the state with shape (nz, nx).
+        """
+        return self.u[index, 0], self.u[index, 1]
+
+    def apply_source(self):
+        dt2_rho = np.broadcast_to(self.dt2_rho, self.medium.cfg.shape)[self.sz, self.sx]
+        fx = dt2_rho * np.array([source.get_x_response(self.current_t) for source in self.sources])
+        fz = dt2_rho * np.array([source.get_z_response(self.current_t) for source in self.sources])
+
+        self.u[self.shot_index, 0, self.sz, self.sx] += fx
+        self.u[self.shot_index, 1, self.sz, self.sx] += fz
+
+        if self.use_anti_extension:
+            self.an_u[self.shot_index, 0, self.sz, self.sx] += fx
+            self.an_u[self.shot_index, 1, self.sz, self.sx] += fz
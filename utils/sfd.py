@@ -1,13 +1,386 @@
 import os
-import time
+import lzma
 import struct
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import islice
 
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.animation as anime
 
 import constants
 from tools import get_file_ext, props, plot_frame
+from tools.live_viewer import LiveViewer
+from . import frame_renderer
+
+# offset of nt in the header of the binary format: version (3 int), float size, nx, nz
+BIN_NT_OFFSET = 24
+# size of the header of the binary format: version (3 int), float size, nx, nz, nt, xmin, xmax, zmin, zmax
+BIN_HEADER_SIZE = 48
+# the amplitude (double) of the binary format follows the frames, readers of version 1.0 read the exact size
+# of the times and the frames and ignore it
+BIN_AMPLITUDE = struct.Struct("d")
+# first version of the formats with the amplitude, files of earlier versions have no amplitude
+AMPLITUDE_VERSION = (1, 1)
+
+
+def write_bin_header(fp, nx, nz, nt, xmin, xmax, zmin, zmax, float_size):
+    """
+    Write the header of the binary format, the times, the frames and the amplitude follow it.
+    The amplitude is the percentile of the frames of `AmplitudeStats`, see `BIN_AMPLITUDE`.
+    """
+    for v in constants.__version__.split("."):
+        fp.write(struct.pack("i", int(v)))                   # version id
+    fp.write(struct.pack("i", float_size))                   # length of one float number
+    fp.write(struct.pack("i", nx))
+    fp.write(struct.pack("i", nz))
+    fp.write(struct.pack("i", nt))
+    fp.write(struct.pack("f", xmin))
+    fp.write(struct.pack("f", xmax))
+    fp.write(struct.pack("f", zmin))
+    fp.write(struct.pack("f", zmax))
+
+
+def format_txt_frame(frame):
+    """
+    Text of one frame in the txt format, one line of nx values for every row.
+
+    Every value is written with the shortest digits which read back the same float, as `str` of
+    earlier versions: `repr` of the python floats for float64, and numpy's shortest float32 digits
+    for float32.
+    """
+    frame = np.asarray(frame)
+    if frame.dtype.itemsize <= 4:
+        rows = frame.astype(str).tolist()
+    else:
+        rows = [map(repr, row) for row in frame.tolist()]
+    return "".join([" ".join(row) + "\n" for row in rows])
+
+
+def parse_txt_frame(text, nz, nx):
+    """
+    Frame with shape (nz, nx) from the nz lines of text of one frame, parsed by numpy in one call.
+    """
+    frame = np.fromstring(text, sep=" ")
+    if frame.size != nz * nx:
+        raise ValueError("one frame should have {} values, but {}".format(nz * nx, frame.size))
+    return frame.reshape(nz, nx)
+
+
+class AmplitudeStats:
+    """
+    Streaming estimate of a percentile of the values of frames, for the colour limits.
+
+    The values are counted in a histogram of fixed log spaced bins of their magnitude, one side for
+    the positive and one for the negative values, so frames are added in one pass and the
+    percentile is known without keeping or sorting the frames. The relative error of the percentile
+    is half a bin, about 2% with constants.AMPLITUDE_BINS_PER_OCTAVE bins per octave.
+    """
+    def __init__(self):
+        low, high = constants.AMPLITUDE_OCTAVES
+        self.k_min = low * constants.AMPLITUDE_BINS_PER_OCTAVE
+        self.n_bins = (high - low) * constants.AMPLITUDE_BINS_PER_OCTAVE
+        # negative bins from the largest magnitude, zero, positive bins from the smallest magnitude
+        self.counts = np.zeros(2 * self.n_bins + 1, dtype=np.int64)
+
+    def add(self, frame):
+        """
+        Count the values of a frame, nan values are counted as zeros.
+        """
+        frame = np.asarray(frame)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = np.floor(np.log2(np.abs(frame)) * constants.AMPLITUDE_BINS_PER_OCTAVE)
+        np.nan_to_num(k, copy=False, nan=self.k_min)
+        np.clip(k, self.k_min, self.k_min + self.n_bins - 1, out=k)
+        sign = np.nan_to_num(np.sign(frame)).astype(np.intp)
+        index = sign * (k - self.k_min + 1).astype(np.intp) + self.n_bins
+        self.counts += np.bincount(index.ravel(), minlength=len(self.counts))
+
+    def percentile(self, q=None):
+        """
+        Estimate of the q-th percentile of the values, the geometric center of its bin.
+        Defaults to constants.SFD_AMPLITUDE_PERCENTILE, 0 if no value is counted.
+        """
+        if q is None:
+            q = constants.SFD_AMPLITUDE_PERCENTILE
+        total = self.counts.sum()
+        if total == 0:
+            return 0.0
+        # rank of the value, as the linear interpolation of np.percentile
+        i = int(np.searchsorted(np.cumsum(self.counts), q / 100 * (total - 1), side="right"))
+        i = min(i, len(self.counts) - 1)
+        if i == self.n_bins:
+            return 0.0
+        k = abs(i - self.n_bins) - 1 + self.k_min
+        magnitude = 2.0 ** ((k + 0.5) / constants.AMPLITUDE_BINS_PER_OCTAVE)
+        return float(np.sign(i - self.n_bins) * magnitude)
+
+
+def cal_save_window(cfg, stride=None, roi=None, absorb=None):
+    """
+    Window of the cells of the medium to save.
+
+    Args:
+        cfg: medium config, see `MediumConfig`.
+        stride: int or (stride_z, stride_x), save one cell of every `stride` cells. Defaults to 1.
+        roi: [xmin, xmax, zmin, zmax], region of interest, only the cells in it are saved. Defaults to all cells.
+        absorb: (a, b), number of cells of the absorbing strips along x and z, they are not saved.
+
+    Returns:
+        (z slice, x slice) of the saved cells, None if all cells are saved.
+    """
+    if stride is None:
+        stride = 1
+    stride_z, stride_x = np.broadcast_to(stride, 2).astype(int)
+    x_start, x_stop, z_start, z_stop = 0, cfg.nx, 0, cfg.nz
+    if roi is not None:
+        roi_xmin, roi_xmax, roi_zmin, roi_zmax = roi
+        # cells whose positions are in the region, rounding errors of the positions are ignored
+        x_start = max(x_start, int(np.ceil((roi_xmin - cfg.xmin) / cfg.dx - 1e-6)))
+        x_stop = min(x_stop, int(np.floor((roi_xmax - cfg.xmin) / cfg.dx + 1e-6)) + 1)
+        z_start = max(z_start, int(np.ceil((roi_zmin - cfg.zmin) / cfg.dz - 1e-6)))
+        z_stop = min(z_stop, int(np.floor((roi_zmax - cfg.zmin) / cfg.dz + 1e-6)) + 1)
+    if absorb is not None:
+        a, b = [0 if length is None else length for length in absorb]
+        x_start, x_stop = max(x_start, a), min(x_stop, cfg.nx - a)
+        z_start, z_stop = max(z_start, b), min(z_stop, cfg.nz - b)
+    if x_start >= x_stop or z_start >= z_stop:
+        raise ValueError("no cell of the medium is in the save window.")
+
+    window = slice(z_start, z_stop, stride_z), slice(x_start, x_stop, stride_x)
+    if window == (slice(0, cfg.nz, 1), slice(0, cfg.nx, 1)):
+        return None
+    return window
+
+
+def cal_window_extent(cfg, window):
+    """
+    Shape and extent of the cells of a save window, see `cal_save_window`.
+
+    Returns:
+        ((nz, nx), (xmin, xmax, zmin, zmax)), xmin is the position of the first cell and
+        xmax = xmin + nx * dx with the spacing dx of the saved cells, as the extent of the medium.
+    """
+    if window is None:
+        window = slice(0, cfg.nz), slice(0, cfg.nx)
+    extent = []
+    shape = []
+    for s, n, start, h in zip(window, (cfg.nz, cfg.nx), (cfg.zmin, cfg.xmin), (cfg.dz, cfg.dx)):
+        cells = range(*s.indices(n))
+        shape.append(len(cells))
+        extent.append((start + cells.start * h, start + cells.start * h + len(cells) * cells.step * h))
+    (zmin, zmax), (xmin, xmax) = extent
+    return tuple(shape), (xmin, xmax, zmin, zmax)
+
+
+# # sfd v2, chunked and compressed frames with a chunk index
+# -------------------------------------------------------
+# header        magic "SFD2", version (3 int), float size, nx, nz, nt, chunk shape (3 int),
+#               compression, shuffle (int), xmin, xmax, zmin, zmax (double), offset of the footer (int64),
+#               amplitude (double, since version 1.1)
+# chunks        frames of chunk_t times and chunk_z x chunk_x cells, compressed one by one
+# footer        times (nt double), index of the chunks (offset, length) in (t, z, x) order (int64)
+# -------------------------------------------------------
+V2_MAGIC = b"SFD2"
+V2_HEADER = struct.Struct("<4s3i4i3i2i4dq")
+V2_AMPLITUDE = struct.Struct("<d")
+
+
+def encode_chunk(block, compression, shuffle=True):
+    """
+    Bytes of one chunk. With `shuffle` the bytes are grouped by their position in the floats
+    before compression, so the exponents of near values are next to each other.
+    """
+    data = np.ascontiguousarray(block)
+    if shuffle:
+        data = data.view(np.uint8).reshape(-1, data.dtype.itemsize).T
+    data = np.ascontiguousarray(data).tobytes()
+    if compression == constants.COMPRESSION_ZLIB:
+        return zlib.compress(data, constants.ZLIB_LEVEL)
+    elif compression == constants.COMPRESSION_LZMA:
+        return lzma.compress(data)
+    return data
+
+
+def decode_chunk(data, shape, dtype, compression, shuffle=True):
+    """
+    Array of one chunk, see `encode_chunk`.
+    """
+    if compression == constants.COMPRESSION_ZLIB:
+        data = zlib.decompress(data)
+    elif compression == constants.COMPRESSION_LZMA:
+        data = lzma.decompress(data)
+    block = np.frombuffer(data, dtype=np.uint8)
+    if shuffle:
+        block = np.ascontiguousarray(block.reshape(dtype.itemsize, -1).T)
+    return block.view(dtype).reshape(shape)
+
+
+class V2Encoder:
+    """
+    Write frames into a sfd v2 file one at a time, `chunk_t` frames are kept until their chunks are written.
+    The times and the chunk index are written by `finish`, with the amplitude of the frames in the header.
+    """
+    def __init__(self, fp, nx, nz, xmin, xmax, zmin, zmax, dtype, compression=None, chunks=None):
+        if compression is None:
+            compression = constants.COMPRESSION_ZLIB
+        if compression not in constants.COMPRESSIONS:
+            raise ValueError("compression {} does not support. Choice in {}."
+                             .format(compression, constants.COMPRESSIONS))
+        if chunks is None:
+            chunks = constants.SFD_V2_CHUNKS
+        self.fp = fp
+        self.nx = nx
+        self.nz = nz
+        self.extent = (xmin, xmax, zmin, zmax)
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.shuffle = compression != constants.COMPRESSION_NONE
+        self.chunks = tuple(int(c) for c in chunks)
+
+        self.nt = 0
+        self.ts = []
+        self.index = []
+        self.frames = np.empty((self.chunks[0], nz, nx), dtype=self.dtype)
+        self.stats = AmplitudeStats()
+        self.write_header(0, 0)
+
+    def write_header(self, nt, footer_offset, amplitude=np.nan):
+        self.fp.seek(0)
+        self.fp.write(V2_HEADER.pack(
+            V2_MAGIC, *[int(v) for v in constants.__version__.split(".")], self.dtype.itemsize,
+            self.nx, self.nz, nt, *self.chunks, constants.COMPRESSIONS.index(self.compression), int(self.shuffle),
+            *[float(v) for v in self.extent], footer_offset
+        ))
+        self.fp.write(V2_AMPLITUDE.pack(amplitude))
+
+    def add_frame(self, frame, t):
+        self.frames[self.nt % self.chunks[0]] = frame
+        self.stats.add(frame)
+        self.ts.append(t)
+        self.nt += 1
+        if self.nt % self.chunks[0] == 0:
+            self._write_chunks(self.chunks[0])
+
+    def _write_chunks(self, n_frames):
+        _, chunk_z, chunk_x = self.chunks
+        self.fp.seek(0, 2)
+        for z in range(0, self.nz, chunk_z):
+            for x in range(0, self.nx, chunk_x):
+                data = encode_chunk(self.frames[:n_frames, z:z + chunk_z, x:x + chunk_x], self.compression,
+                                    self.shuffle)
+                self.index.append((self.fp.tell(), len(data)))
+                self.fp.write(data)
+
+    def finish(self):
+        if self.nt % self.chunks[0]:
+            self._write_chunks(self.nt % self.chunks[0])
+        self.fp.seek(0, 2)
+        footer_offset = self.fp.tell()
+        self.fp.write(np.asarray(self.ts, dtype=np.float64).tobytes())
+        self.fp.write(np.asarray(self.index, dtype=np.int64).tobytes())
+        self.write_header(self.nt, footer_offset, self.stats.percentile())
+
+
+class ChunkedFrames:
+    """
+    Frames of a sfd v2 file, an array like object with shape (nt, nz, nx) which only reads and
+    decompresses the chunks of the frames and cells it is indexed with. Every axis can be indexed
+    with an int, a slice or a list of indexes. The last decoded chunks are cached.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.fp = open(file, "rb")
+        (magic, v0, v1, v2, float_size, self.nx, self.nz, self.nt, chunk_t, chunk_z, chunk_x, compression,
+         shuffle, *extent, footer_offset) = V2_HEADER.unpack(self.fp.read(V2_HEADER.size))
+        if magic != V2_MAGIC:
+            raise ValueError("{} is not a sfd v2 file".format(file))
+        print("reading file {}, version:{}.{}.{}".format(file, v0, v1, v2))
+        self.amplitude = None
+        if (v0, v1) >= AMPLITUDE_VERSION:
+            self.amplitude, = V2_AMPLITUDE.unpack(self.fp.read(V2_AMPLITUDE.size))
+        if float_size == 4:
+            self.dtype = np.dtype(np.float32)
+        elif float_size == 8:
+            self.dtype = np.dtype(np.float64)
+        else:
+            raise ValueError("float size of {} can not match".format(float_size))
+        self.chunks = (chunk_t, chunk_z, chunk_x)
+        self.compression = constants.COMPRESSIONS[compression]
+        self.shuffle = bool(shuffle)
+        self.extent = extent
+
+        self.n_chunks = tuple(-(-n // c) for n, c in zip(self.shape, self.chunks))
+        self.fp.seek(footer_offset)
+        self.ts = np.frombuffer(self.fp.read(self.nt * 8), dtype=np.float64)
+        self.index = np.frombuffer(self.fp.read(int(np.prod(self.n_chunks)) * 16), dtype=np.int64) \
+            .reshape(*self.n_chunks, 2)
+
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.nt, self.nz, self.nx
+
+    @property
+    def ndim(self):
+        return 3
+
+    def __len__(self):
+        return self.nt
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def chunk(self, ct, cz, cx):
+        """
+        Decoded chunk (ct, cz, cx) of the frames.
+        """
+        key = (ct, cz, cx)
+        with self.lock:
+            block = self.cache.get(key)
+            if block is not None:
+                self.cache.move_to_end(key)
+                return block
+            offset, length = self.index[key]
+            self.fp.seek(offset)
+            data = self.fp.read(length)
+        shape = tuple(min(c, n - i * c) for i, c, n in zip(key, self.chunks, self.shape))
+        block = decode_chunk(data, shape, self.dtype, self.compression, self.shuffle)
+        with self.lock:
+            self.cache[key] = block
+            if len(self.cache) > constants.SFD_V2_CACHE_CHUNKS:
+                self.cache.popitem(last=False)
+        return block
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (3 - len(key))
+        # index of every axis, ints drop their axis
+        indexes = [np.arange(n)[k].reshape(-1) for n, k in zip(self.shape, key)]
+        out = np.empty([len(i) for i in indexes], dtype=self.dtype)
+
+        groups = []
+        for index, c in zip(indexes, self.chunks):
+            ids = index // c
+            groups.append([(i, np.nonzero(ids == i)[0]) for i in np.unique(ids)])
+        for ct, t_sel in groups[0]:
+            for cz, z_sel in groups[1]:
+                for cx, x_sel in groups[2]:
+                    block = self.chunk(ct, cz, cx)
+                    local = [index[sel] - i * c for index, sel, i, c in
+                             zip(indexes, (t_sel, z_sel, x_sel), (ct, cz, cx), self.chunks)]
+                    out[np.ix_(t_sel, z_sel, x_sel)] = block[np.ix_(*local)]
+
+        drop = tuple(axis for axis, k in enumerate(key) if np.ndim(k) == 0 and not isinstance(k, slice))
+        return out.squeeze(axis=drop) if drop else out
+
+    def close(self):
+        self.fp.close()
 
 
 class SFD:
@@ -39,18 +412,22 @@ class SFD:
     
     """
 
-    def __init__(self, file=None, fmt=None, *, xmin=None, xmax=None, zmin=None, zmax=None, ts=None, u=None):
+    def __init__(self, file=None, fmt=None, *, xmin=None, xmax=None, zmin=None, zmax=None, ts=None, u=None,
+                 lazy=False, amplitude=None):
         """initialize
 
         Args:
             file (str, optional) : .sfd file to be read, if None you should provide other arguments. Defaults to None.
-            fmt  (str, optional) : .sfd file format. choice in ['txt', 'bin'].
+            fmt  (str, optional) : .sfd file format. choice in ['txt', 'bin', 'v2'], v2 files are detected.
+            lazy (bool, optional): map the frames of a binary file into memory instead of reading them,
+            frames and traces are read from the disk on demand. Defaults to False.
             If the file is None, you should provide follow arguments.
-            xmin (float, optional): the min value of x-axis. Defaults to None.
-            xmax (float, optional): the max value of x-axis. Defaults to None.
+            xmin (float, optional): the min value of x-axis, position of the first cell. Defaults to None.
+            xmax (float, optional): the max value of x-axis, xmin + nx * dx. Defaults to None.
             zmin (float, optional): the min value of z-axis. Defaults to None.
             zmax (float, optional): the max value of z-axis. Defaults to None.
             u (numpy.array, optional): 3D array, with shape(nt, nz, nx). Defaults to None.
+            amplitude (float, optional): percentile of the frames, see `AmplitudeStats`. Computed on first use if None.
         """
         if fmt is None:
             fmt = 'txt'
@@ -72,9 +449,14 @@ class SFD:
 
         self.ts = None
         self.data = None
+        self.lazy = lazy
+
+        self._vmax = None
+        self._vmin = None
+        self._amplitude = amplitude
 
         if file is not None:
-            self.read_from_file(file, fmt)
+            self.read_from_file(file, fmt, lazy)
         else:
             self.xmin = xmin
             self.xmax = xmax
@@ -86,10 +468,62 @@ class SFD:
             self.dx = (self.xmax - self.xmin) / self.nx
             self.dz = (self.zmax - self.zmin) / self.nz
 
-        self.vmax = np.percentile(self.data, 99) * 7.5  # maximum value for colorbar
-        self.vmin = -self.vmax                          # minimum value for colorbar
+    @property
+    def amplitude(self):
+        """
+        constants.SFD_AMPLITUDE_PERCENTILE percentile of the frames, read from the header of bin and v2
+        files or estimated on first use by `cal_amplitude`.
+        """
+        if self._amplitude is None:
+            self._amplitude = self.cal_amplitude()
+        return self._amplitude
+
+    @property
+    def vmax(self):
+        """
+        maximum value for colorbar, computed from the amplitude on first use.
+        """
+        if self._vmax is None:
+            self._vmax = self.cal_vmax()
+        return self._vmax
+
+    @vmax.setter
+    def vmax(self, value):
+        self._vmax = value
+
+    @property
+    def vmin(self):
+        """
+        minimum value for colorbar, defaults to -vmax.
+        """
+        if self._vmin is None:
+            return -self.vmax
+        return self._vmin
+
+    @vmin.setter
+    def vmin(self, value):
+        self._vmin = value
 
-    def read_from_file(self, file, fmt=None):
+    def cal_amplitude(self):
+        """
+        Percentile of the frames, counted one frame at a time by `AmplitudeStats`. A lazy sfd only
+        reads a sample of evenly spaced frames, see constants.SFD_VMAX_SAMPLE_FRAMES.
+        """
+        index = range(self.nt)
+        if self.lazy and self.nt > constants.SFD_VMAX_SAMPLE_FRAMES:
+            index = np.unique(np.linspace(0, self.nt - 1, constants.SFD_VMAX_SAMPLE_FRAMES).astype(int))
+        stats = AmplitudeStats()
+        for i in index:
+            stats.add(self.data[i])
+        return stats.percentile()
+
+    def cal_vmax(self):
+        """
+        Colorbar limit from the amplitude of the frames.
+        """
+        return self.amplitude * constants.SFD_VMAX_SCALE
+
+    def read_from_file(self, file, fmt=None, lazy=False):
         """
         The read_from_file function reads in a file and stores the data into an object.
 
@@ -97,61 +531,104 @@ class SFD:
             self: Represent the instance of the class
             file: Specify the file to read from
             fmt: Specify the file format
+            lazy: map the frames of a binary file instead of reading them
 
         Returns:
             A dictionary of the attributes
         """
         if fmt is None:
             fmt = constants.FORMAT_TXT
-        
-        if fmt == constants.FORMAT_TXT:
+        with open(file, "rb") as fp:
+            if fp.read(len(V2_MAGIC)) == V2_MAGIC:
+                fmt = constants.FORMAT_V2
+
+        if fmt == constants.FORMAT_V2:
+            self.read_v2(file, lazy)
+        elif fmt == constants.FORMAT_TXT:
             try:
                 open(file, "r")
             except UnicodeDecodeError:
-                self.read_bin(file)
+                self.read_bin(file, lazy)
             else:
                 self.read_txt(file)
         elif fmt == constants.FORMAT_BIN:
-            self.read_bin(file)
+            self.read_bin(file, lazy)
         else:
             TypeError("file format do not Support.")
 
-    def read_bin(self, file):
+    def _set_amplitude(self, amplitude):
+        # nan is the amplitude of a file which was not closed
+        if amplitude is not None and np.isfinite(amplitude):
+            self._amplitude = float(amplitude)
+
+    def read_bin(self, file, lazy=False):
+        """
+        Read a binary sfd file, with `lazy` the frames are a read only memory map of the file.
+        """
         with open(file, "rb") as fp:
-            version = ".".join([str(i) for i in np.frombuffer(fp.read(12), dtype='i')])
-            print("reading file {}, version:{}".format(file, version))
+            version = tuple(int(i) for i in np.frombuffer(fp.read(12), dtype='i'))
+            print("reading file {}, version:{}".format(file, ".".join([str(i) for i in version])))
             float_size = np.frombuffer(fp.read(4), dtype='i')[0]
             if float_size == 4:
                 float_fmt = "f"
             elif float_size == 8:
                 float_fmt = "d"
             else:
-                ValueError("float size of {} can not match".format(float_size))
+                raise ValueError("float size of {} can not match".format(float_size))
             self.nx, self.nz, self.nt = np.frombuffer(fp.read(12), dtype='i')
             self.xmin, self.xmax, self.zmin, self.zmax = np.frombuffer(fp.read(16), dtype='f')
             self.ts = np.frombuffer(fp.read(self.nt * float_size), dtype=float_fmt)
-            self.data = np.frombuffer(fp.read(float_size * self.nx * self.nz * self.nt), dtype=float_fmt) \
-                .reshape([self.nt, self.nz, self.nx])
-        self.dx = (self.xmax - self.xmin) / (self.nx - 1)
-        self.dz = (self.zmax - self.zmin) / (self.nz - 1)
+            frames_offset = fp.tell()
+            frames_size = float_size * self.nx * self.nz * self.nt
+            if not lazy:
+                self.data = np.frombuffer(fp.read(frames_size), dtype=float_fmt) \
+                    .reshape([self.nt, self.nz, self.nx])
+            if version[:2] >= AMPLITUDE_VERSION:
+                fp.seek(frames_offset + frames_size)
+                amplitude = fp.read(BIN_AMPLITUDE.size)
+                # a file which was not closed has no amplitude
+                if len(amplitude) == BIN_AMPLITUDE.size:
+                    self._set_amplitude(BIN_AMPLITUDE.unpack(amplitude)[0])
+        if lazy:
+            # frames follow the header and the times
+            self.data = np.memmap(file, dtype=float_fmt, mode="r", offset=frames_offset,
+                                  shape=(self.nt, self.nz, self.nx))
+        self.dx = (self.xmax - self.xmin) / self.nx
+        self.dz = (self.zmax - self.zmin) / self.nz
+
+    def read_v2(self, file, lazy=False):
+        """
+        Read a sfd v2 file, with `lazy` the frames are a `ChunkedFrames` which decompresses chunks on demand.
+        """
+        frames = ChunkedFrames(file)
+        self.nt, self.nz, self.nx = frames.shape
+        self.xmin, self.xmax, self.zmin, self.zmax = frames.extent
+        self.ts = frames.ts
+        self._set_amplitude(frames.amplitude)
+        if lazy:
+            self.data = frames
+        else:
+            self.data = frames[:]
+            frames.close()
+        self.dx = (self.xmax - self.xmin) / self.nx
+        self.dz = (self.zmax - self.zmin) / self.nz
 
     def read_txt(self, file):
         with open(file, "r") as fp:
+            # the txt header has no amplitude, it is counted from the frames, see `amplitude`
             self.nx, self.nz, self.nt = [int(i) for i in fp.readline().split()]
             self.xmin, self.xmax = [float(i) for i in fp.readline().split()]
             self.zmin, self.zmax = [float(i) for i in fp.readline().split()]
 
-            self.dx = (self.xmax - self.xmin) / (self.nx - 1)
-            self.dz = (self.zmax - self.zmin) / (self.nz - 1)
+            self.dx = (self.xmax - self.xmin) / self.nx
+            self.dz = (self.zmax - self.zmin) / self.nz
             self.data = np.zeros((self.nt, self.nz, self.nx))
 
-            self.ts = [float(i) for i in fp.readline().split()]
+            self.ts = np.fromstring(fp.readline(), sep=" ")[:self.nt]
 
-            for _ in range(self.nt):
-                tmp = np.zeros((self.nz, self.nx))
-                for i in range(self.nz):
-                    tmp[i] = [float(i) for i in fp.readline().split()]
-                self.data[_] = tmp.copy()
+            # one frame of text is read and parsed at a time
+            for i in range(self.nt):
+                self.data[i] = parse_txt_frame("".join(islice(fp, self.nz)), self.nz, self.nx)
 
     def plot_frame(self, index, *args, **kwargs):
         """
@@ -177,10 +654,10 @@ class SFD:
         )
 
     def draw(self, figsize=constants.ONE_FIG_SHAPE, dpi=constants.FIG_DPI, seg=None, vmin=None, vmax=None,
-             *args, **kwargs):
+             **kwargs):
         """
         The draw function is a simple animation of the SFD file.
-        It plots each frame in the SFD file, one after another, with a pause between frames.
+        It plots each frame in the SFD file, one after another, with a pause between frames, see `tools.live_viewer`.
         The user can specify how long to pause between frames (seg), as well as the size and resolution of the figure
         (figsize and dpi).
 
@@ -188,7 +665,7 @@ class SFD:
             self: Represent the object itself
             figsize: Set the size of the figure
             dpi: Set the resolution of the image
-            seg: Set the time interval between frames
+            seg: Set the time interval between frames, frames are skipped when drawing is slower
             vmin: Set the minimum value of the colorbar
             vmax: Set the maximum value of the colorbar
 
@@ -199,21 +676,11 @@ class SFD:
             vmax = self.vmax
         if vmin is None:
             vmin = self.vmin
-        if seg is None:
-            seg = constants.SHOW_SEG
 
         print("drawing sfd file...")
-        plt.figure(figsize=figsize, dpi=dpi)
-        start_time = time.time()
-        for _ in range(self.nt):
-            print(f"\rcurrent_time: {self.ts[_]:.3f},  runtime: {time.time() - start_time:.3f}s", end="")
-            self.plot_frame(_, vmin=vmin, vmax=vmax, *args, **kwargs)
-            plt.xlabel("X")
-            plt.ylabel("Z")
-            plt.title(f"t={self.ts[_] : .2f}s")
-            plt.pause(seg)
-            plt.cla()
-            plt.clf()
+        viewer = LiveViewer((self.nz, self.nx), [self.xmin, self.xmax, self.zmin, self.zmax], figsize=figsize,
+                            dpi=dpi, vmin=vmin, vmax=vmax, seg=seg, xlabel="X", ylabel="Z", **kwargs)
+        viewer.play(lambda i: [self.data[i]], self.ts)
         print("\nDone!")
 
     def save(self, fname, save_format=constants.FORMAT_TXT):
@@ -231,6 +698,8 @@ class SFD:
             self.save_txt(fname)
         elif save_format == constants.FORMAT_BIN:
             self.save_bin(fname)
+        elif save_format == constants.FORMAT_V2:
+            self.save_v2(fname)
         else:
             TypeError("Save format: {} not support.".format(save_format))
 
@@ -253,8 +722,7 @@ class SFD:
                 fp.write(str(self.ts[i]) + " ")
             fp.write(str(self.ts[self.nt-1]) + "\n")
             for i in range(self.nt):
-                for j in range(self.nz):
-                    fp.write(" ".join([str(v) for v in self.data[i, j, :]]) + "\n")
+                fp.write(format_txt_frame(self.data[i]))
 
         print("Done!")
 
@@ -288,20 +756,35 @@ class SFD:
             #     ('zmax', np.float),
             # ])
 
-            for v in constants.__version__.split("."):
-                fp.write(struct.pack("i", int(v)))                   # version id
-            fp.write(struct.pack("i", self.data.dtype.itemsize))     # length of one float number
-            fp.write(struct.pack("i", self.nx))
-            fp.write(struct.pack("i", self.nz))
-            fp.write(struct.pack("i", self.nt))
-            fp.write(struct.pack("f", self.xmin))
-            fp.write(struct.pack("f", self.xmax))
-            fp.write(struct.pack("f", self.zmin))
-            fp.write(struct.pack("f", self.zmax))
-            fp.write(self.ts.tobytes())
+            write_bin_header(fp, self.nx, self.nz, self.nt, self.xmin, self.xmax, self.zmin, self.zmax,
+                             self.data.dtype.itemsize)
+            # times are saved with the same float size as data, see read_bin
+            fp.write(np.asarray(self.ts, dtype=self.data.dtype).tobytes())
             fp.write(self.data.tobytes())
+            fp.write(BIN_AMPLITUDE.pack(self.amplitude))
+
+    def save_v2(self, fname, compression=None, chunks=None):
+        """
+        Save the sfd data in the chunked v2 format.
 
-    def save_gif(self, fname=None, dpi=None, fps=None):
+        Args:
+            fname: file name, the .sfd extension is added if missing.
+            compression: compression of the chunks, see constants.COMPRESSIONS. Defaults to zlib.
+            chunks: (chunk_t, chunk_z, chunk_x), shape of the chunks. Defaults to constants.SFD_V2_CHUNKS.
+        """
+        if get_file_ext(fname) != ".sfd":
+            fname = fname + ".sfd"
+        print(f"saving into file {fname}")
+        dtype = np.result_type(self.data.dtype, np.float32)
+        with open(fname, "w+b") as fp:
+            encoder = V2Encoder(fp, self.nx, self.nz, self.xmin, self.xmax, self.zmin, self.zmax, dtype,
+                                compression, chunks)
+            for t, frame in zip(self.ts, self.data):
+                encoder.add_frame(frame, t)
+            encoder.finish()
+        return fname
+
+    def save_gif(self, fname=None, dpi=None, fps=None, workers=None, fast=False, max_size=None):
         """
         The save_gif function saves the animation as a gif file.
 
@@ -310,6 +793,9 @@ class SFD:
             fname: Specify the name of the file to save
             dpi: Set the resolution of the gif
             fps: Set the frame rate of the gif
+            workers: number of rendering processes, defaults to the number of cpus
+            fast: colour map the cells without matplotlib figures, see `tools.fast_render`
+            max_size: max pixels of the larger side of a fast frame
 
         Returns:
             None
@@ -318,26 +804,11 @@ class SFD:
             fname = "wave.gif"
         if dpi is None:
             dpi = constants.FIG_DPI
-        if fps is None:
-            fps = constants.GIF_FPS
-
-        metadata = dict(title="wave field")
-        writer = anime.PillowWriter(fps, metadata=metadata)
-        fig = plt.figure(dpi=dpi)
-        start_time = time.time()
-
-        print(f"saving into {fname}...")
-        with writer.saving(fig, fname, dpi):
-            for _ in range(self.nt):
-                print(f"\rprocess:{_ + 1}/{self.nt}  runtime:{time.time() - start_time:.2f}s", end="")
-                self.plot_frame(_),
-                plt.title("t={:.2f}s".format(self.ts[_]))
-                writer.grab_frame()
-                plt.cla()
-                plt.clf()
-        print("\nDone!")
 
-    def save_png(self, save_dir, figsize=None, dpi=None):
+        frame_renderer.save_gif([self], fname, fps=fps, dpi=dpi, workers=workers, fast=fast, max_size=max_size,
+                                vmin=self.vmin, vmax=self.vmax, extent=[self.xmin, self.xmax, self.zmin, self.zmax])
+
+    def save_png(self, save_dir, figsize=None, dpi=None, workers=None, fast=False, max_size=None):
         """
         The save_png function saves the frames of a simulation as png files.
 
@@ -346,6 +817,9 @@ class SFD:
             save_dir: Specify the directory where the png files will be saved
             figsize: Set the size of the figure
             dpi: Set the resolution of the image
+            workers: number of rendering processes, defaults to the number of cpus
+            fast: colour map the cells without matplotlib figures, see `tools.fast_render`
+            max_size: max pixels of the larger side of a fast frame
 
         Returns:
             Nothing
@@ -355,28 +829,13 @@ class SFD:
         if dpi is None:
             dpi = constants.FIG_DPI
 
-        print(f"saving pngs into dir {save_dir}")
-
-        if not os.path.exists(save_dir):
-            print(f"Path {save_dir} not exists, creating...")
-            os.makedirs(save_dir)
-            print(f"Create {save_dir} success.")
-
-        start_time = time.time()
-        plt.figure(figsize=figsize, dpi=dpi)
-        for _ in range(self.nt):
-            print(f"\rprocess:{_ + 1}/{self.nt}  runtime:{time.time() - start_time:.2f}s", end="")
-            self.plot_frame(_),
-            plt.title("t={:.2f}s".format(self.ts[_]))
-            plt.savefig(os.path.join(save_dir, f"{_}"))
-            plt.cla()
-            plt.clf()
-
-        print("\nDone!")
+        frame_renderer.save_pngs([self], save_dir, figsize=figsize, dpi=dpi, workers=workers, fast=fast,
+                                 max_size=max_size, vmin=self.vmin, vmax=self.vmax,
+                                 extent=[self.xmin, self.xmax, self.zmin, self.zmax])
 
     def show_point(self, x, z):
-        x_index = int(x / self.dx)
-        z_index = int(z / self.dz)
+        x_index = int((x - self.xmin) / self.dx)
+        z_index = int((z - self.zmin) / self.dz)
 
         record = self.data[:, z_index, x_index]
 
@@ -402,7 +861,7 @@ class SFD:
                 ValueError("The value of axis in function show_section should be 'x' or 'z'")
 
         if axis == 0:
-            value = int(value / self.dz)
+            value = int((value - self.zmin) / self.dz)
             section = self.data[:, value, :]
             plt.imshow(
                 section,
@@ -415,7 +874,7 @@ class SFD:
             )
 
         elif axis == 1:
-            value = int(value / self.dx)
+            value = int((value - self.xmin) / self.dx)
             section = self.data[:, :, value]
             plt.imshow(
                 section,
@@ -430,3 +889,24 @@ class SFD:
             section = None
 
         plt.show()
+
+
+def convert_sfd(in_file, out_file, fmt=None, compression=None, chunks=None):
+    """
+    Convert a txt or binary sfd file into the v2 format, a binary file is converted one frame at a time.
+
+    Args:
+        in_file: sfd file to convert.
+        out_file: v2 file.
+        fmt: format of `in_file`, see constants.SAVE_FORMATS.
+        compression: compression of the chunks, see constants.COMPRESSIONS.
+        chunks: shape of the chunks, see `SFD.save_v2`.
+
+    Returns:
+        name of the v2 file.
+    """
+    sfd = SFD(in_file, fmt, lazy=True)
+    out_file = sfd.save_v2(out_file, compression, chunks)
+    print("converted {} ({} bytes) into {} ({} bytes)".format(
+        in_file, os.path.getsize(in_file), out_file, os.path.getsize(out_file)))
+    return out_file
@@ -0,0 +1,204 @@
+"""
+Incremental writer of sfd files.
+
+Frames are appended to the file while the simulation runs, so the memory of a saved simulation
+does not grow with the number of frames and the frames written before a crash are kept. The disk
+writes run on a background thread: a frame is copied into one of two buffers and the simulation
+goes on while the thread writes it, the copy only waits if both buffers are still being written.
+"""
+import queue
+import struct
+import threading
+
+import numpy as np
+
+import constants
+from tools import get_file_ext
+from .sfd import BIN_NT_OFFSET, BIN_AMPLITUDE, AmplitudeStats, V2Encoder, write_bin_header, format_txt_frame, \
+    cal_window_extent
+
+# width of a time in the time line of the txt format, times are padded so they can be written in place
+TXT_TIME_WIDTH = 25
+# width of nt in the first line of the txt format
+TXT_NT_WIDTH = 10
+
+
+class SFDWriter:
+    """
+    Write the frames of one wave field component into a sfd file, one at a time.
+
+    The times are stored before the frames in both formats, so the writer reserves the times of
+    `max_frames` frames when the file is opened and fills them in as frames are written. The header
+    frame count is finalized by `close`; if fewer frames than `max_frames` were written, the frames
+    of the binary format are moved back over the unused times, the unused times of the txt format
+    are left blank. The v2 format keeps the frames of one time chunk, the times and the chunk index
+    are written by `close`. The amplitude of the bin and v2 formats is counted by the thread as the
+    frames are written, see `AmplitudeStats`, so the colour limits of the file are known when it is
+    opened. It is written after the frames of the bin format and the txt format has none, so
+    readers of earlier versions still read both.
+
+    Use it as a context manager, the file is closed and readable even if the simulation fails:
+
+        with SFDWriter(fname, cfg, max_frames) as writer:
+            writer.write(frame, t)
+    """
+    def __init__(self, fname, cfg, max_frames, save_format=None, dtype=None, n_buffers=2, compression=None,
+                 window=None):
+        """
+        Args:
+            fname: file name, the binary format adds the .sfd extension as `SFD.save_bin`.
+            cfg: medium config of the frames, see `MediumConfig`.
+            max_frames: max number of frames to write.
+            save_format: file format, see constants.SAVE_FORMATS. Defaults to txt.
+            dtype: float type of the frames in the file. Defaults to the dtype of cfg.
+            n_buffers: number of frame buffers, frames are copied into a free buffer and written by the thread.
+            compression: compression of the v2 format, see constants.COMPRESSIONS.
+            window: (z slice, x slice) of the saved cells of every frame, see `cal_save_window`. Defaults to all cells.
+        """
+        if save_format is None:
+            save_format = constants.FORMAT_TXT
+        if save_format not in constants.SAVE_FORMATS:
+            raise ValueError("SFD file format {} are not support. Choice in {}."
+                             .format(save_format, constants.SAVE_FORMATS))
+        if save_format in [constants.FORMAT_BIN, constants.FORMAT_V2] and get_file_ext(fname) != ".sfd":
+            fname = fname + ".sfd"
+        if dtype is None:
+            dtype = cfg.dtype
+
+        self.fname = fname
+        self.save_format = save_format
+        self.dtype = np.dtype(dtype)
+        self.window = window
+        (self.nz, self.nx), (xmin, xmax, zmin, zmax) = cal_window_extent(cfg, window)
+        self.max_frames = max_frames
+        self.nt = 0  # number of frames written
+        self.closed = False
+        self.stats = AmplitudeStats()
+
+        print(f"saving frames into file {fname}")
+        self.fp = open(fname, "w+b")
+        self.encoder = None
+        if self.save_format == constants.FORMAT_V2:
+            self.encoder = V2Encoder(self.fp, self.nx, self.nz, xmin, xmax, zmin, zmax, self.dtype,
+                                     compression)
+        elif self.save_format == constants.FORMAT_BIN:
+            write_bin_header(self.fp, self.nx, self.nz, 0, xmin, xmax, zmin, zmax,
+                             self.dtype.itemsize)
+            self.ts_offset = self.fp.tell()
+            self.fp.write(bytes(self.max_frames * self.dtype.itemsize))
+        else:
+            self.fp.write(f"{self.nx} {self.nz} ".encode())
+            self.nt_offset = self.fp.tell()
+            self.fp.write(f"{0:<{TXT_NT_WIDTH}d}\n".encode())
+            self.fp.write(f"{xmin} {xmax}\n".encode())
+            self.fp.write(f"{zmin} {zmax}\n".encode())
+            self.ts_offset = self.fp.tell()
+            self.fp.write(b" " * (self.max_frames * TXT_TIME_WIDTH) + b"\n")
+        self.frames_offset = self.fp.tell()
+
+        # free frame buffers and frames waiting for the thread
+        self._free = queue.Queue()
+        for _ in range(n_buffers):
+            self._free.put(np.empty((self.nz, self.nx), dtype=self.dtype))
+        self._pending = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, frame, t):
+        """
+        Append one frame, the cells of the window are copied and the frame can be changed as soon as this returns.
+
+        Args:
+            frame: array with the shape of the medium.
+            t: time of the frame.
+        """
+        self._raise_error()
+        if self.nt >= self.max_frames:
+            raise ValueError("can not write more than {} frames into {}".format(self.max_frames, self.fname))
+        buf = self._free.get()
+        np.copyto(buf, frame if self.window is None else frame[self.window])
+        self._pending.put((self.nt, t, buf))
+        self.nt += 1
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            index, t, buf = item
+            try:
+                if self._error is None:
+                    self._write_frame(index, t, buf)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._free.put(buf)
+
+    def _write_frame(self, index, t, frame):
+        fp = self.fp
+        if self.save_format == constants.FORMAT_V2:
+            self.encoder.add_frame(frame, t)
+        elif self.save_format == constants.FORMAT_BIN:
+            self.stats.add(frame)
+            fp.seek(self.ts_offset + index * self.dtype.itemsize)
+            fp.write(np.asarray(t, dtype=self.dtype).tobytes())
+            fp.seek(self.frames_offset + index * frame.nbytes)
+            fp.write(frame.tobytes())
+        else:
+            fp.seek(self.ts_offset + index * TXT_TIME_WIDTH)
+            fp.write(f"{str(t):<{TXT_TIME_WIDTH - 1}} ".encode())
+            fp.seek(0, 2)
+            fp.write(format_txt_frame(frame).encode())
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("writing {} failed".format(self.fname)) from self._error
+
+    def close(self):
+        """
+        Wait for the frames to be written and finalize the frame count of the header.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.put(None)
+        self._thread.join()
+        try:
+            self._raise_error()
+            if self.save_format == constants.FORMAT_V2:
+                self.encoder.finish()
+            elif self.save_format == constants.FORMAT_BIN:
+                self.fp.seek(BIN_NT_OFFSET)
+                self.fp.write(struct.pack("i", self.nt))
+                if self.nt < self.max_frames:
+                    self._compact()
+                # the amplitude follows the frames
+                self.fp.seek(0, 2)
+                self.fp.write(BIN_AMPLITUDE.pack(self.stats.percentile()))
+            else:
+                self.fp.seek(self.nt_offset)
+                self.fp.write(f"{self.nt:<{TXT_NT_WIDTH}d}".encode())
+        finally:
+            self.fp.close()
+        print(f"{self.nt} frames saved into file {self.fname}")
+
+    def _compact(self):
+        """
+        Move the frames back over the unused times of the binary format, one frame at a time.
+        """
+        shift = (self.max_frames - self.nt) * self.dtype.itemsize
+        frame_bytes = self.nz * self.nx * self.dtype.itemsize
+        for index in range(self.nt):
+            offset = self.frames_offset + index * frame_bytes
+            self.fp.seek(offset)
+            frame = self.fp.read(frame_bytes)
+            self.fp.seek(offset - shift)
+            self.fp.write(frame)
+        self.fp.truncate(self.frames_offset - shift + self.nt * frame_bytes)
@@ -0,0 +1,206 @@
+"""
+Run many shots through one medium with a process pool.
+
+The medium is saved once into the output directory and every worker opens it as read only
+memory maps, so the coefficients are neither pickled nor copied per worker. Shots are handed
+out one at a time, an idle worker takes the next shot, so slow shots don't hold a queue of others.
+Every shot is saved into its own files, which are renamed into place when complete, finished
+shots are skipped when the runner is started again on the same directory.
+"""
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import List, Tuple
+
+import constants
+from examples.wave_loop import wave_loop
+from .boundary import Boundary
+from .medium import Medium
+from .seismic_simulator import SeismicSimulator
+from .source import Source, get_source_func
+
+MEDIUM_DIR = "medium"
+SHOTS_FILE = "shots.json"
+
+# state of a worker process, set by _init_worker
+_worker = {}
+
+
+def get_shot_files(out_dir, index):
+    """
+    Files of the x and z wave field of shot `index`.
+    """
+    return (
+        os.path.join(out_dir, "shot_{:05d}_x.sfd".format(index)),
+        os.path.join(out_dir, "shot_{:05d}_z.sfd".format(index)),
+    )
+
+
+def is_shot_done(out_dir, index):
+    return all(os.path.exists(f) for f in get_shot_files(out_dir, index))
+
+
+def _check_shots_file(out_dir, shots):
+    """
+    Record the shots of `out_dir`, a directory can only be resumed with the same shots.
+    """
+    shots_file = os.path.join(out_dir, SHOTS_FILE)
+    shots = [[int(sx), int(sz)] for sx, sz in shots]
+    if os.path.exists(shots_file):
+        with open(shots_file, "r") as fp:
+            saved_shots = json.load(fp)
+        if saved_shots != shots:
+            raise ValueError(f"Shots of {out_dir} are not the same as the input shots, use another out_dir.")
+    else:
+        with open(shots_file, "w") as fp:
+            json.dump(shots, fp)
+
+
+def _init_worker(cfg, medium_dir, boundary, source_x, source_z, simulate_kwargs, save_kwargs, verbose):
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    medium = Medium.get_medium(cfg)
+    medium.load_coefficients(medium_dir)
+    _worker.update(
+        medium=medium,
+        boundary=boundary,
+        source_x=source_x,
+        source_z=source_z,
+        simulate_kwargs=simulate_kwargs,
+        save_kwargs=save_kwargs,
+    )
+
+
+def _run_shot(shot):
+    index, sx, sz, out_dir = shot
+    start_time = time.time()
+
+    source = Source(sx, sz, get_source_func(*_worker["source_x"]), get_source_func(*_worker["source_z"]))
+    simulator = SeismicSimulator(
+        medium=_worker["medium"],
+        source=source,
+        boundary=_worker["boundary"],
+        **_worker["simulate_kwargs"]
+    )
+    # write into temporary files first, a crash never leaves a shot file half written.
+    fnames = get_shot_files(out_dir, index)
+    tmp_fnames = [os.path.splitext(fname)[0] + ".tmp.sfd" for fname in fnames]
+    wave_loop(
+        s=simulator,
+        use_anti_extension=simulator.use_anti_extension,
+        is_show=False,
+        is_save=True,
+        x_outfile=tmp_fnames[0],
+        z_outfile=tmp_fnames[1],
+        **_worker["save_kwargs"]
+    )
+    for tmp_fname, fname in zip(tmp_fnames, fnames):
+        os.replace(tmp_fname, fname)
+
+    return index, time.time() - start_time
+
+
+def run_shots(
+        medium: Medium,
+        boundary: Boundary,
+        shots: List[Tuple[int, int]],
+        source_x: tuple,
+        source_z: tuple,
+        out_dir: str,
+        dt: float,
+        endt: float,
+        use_anti_extension: bool = False,
+        fft_backend: str = None,
+        threads: int = None,
+        space_domain_method: str = None,
+        fd_order: int = None,
+        time_integrator: str = None,
+        reference_velocity: float = None,
+        save_times=None,
+        save_format: str = constants.FORMAT_BIN,
+        compression: str = None,
+        save_stride=None,
+        save_roi: List[float] = None,
+        save_exclude_absorb: bool = False,
+        workers: int = None,
+        verbose: bool = False,
+):
+    """
+    Run one simulation for every shot with a process pool and save them into `out_dir`.
+
+    Args:
+        medium: initialized medium, shared by every shot.
+        boundary: boundary with parameters set.
+        shots: list of source index (sx, sz).
+        source_x: (source_type, *source_args) of the x source function, see `get_source_func`.
+        source_z: (source_type, *source_args) of the z source function.
+        out_dir: directory of the shot files, see `get_shot_files`.
+        dt: time step.
+        endt: simulate time.
+        use_anti_extension: use the anti extension method or not.
+        fft_backend: fft backend, see constants.FFT_BACKENDS.
+        threads: number of threads of the fourier transforms of every worker.
+        space_domain_method: method of the space derivatives, see constants.SPACE_DOMAIN_METHODS.
+        fd_order: order of the finite difference stencils.
+        time_integrator: time integrator, see constants.TIME_INTEGRATORS.
+        reference_velocity: reference velocity of the k-space time integrator.
+        save_times: int or list, times of frames to save, see `wave_loop`.
+        save_format: file format of the shot files.
+        compression: compression of the v2 format, see constants.COMPRESSIONS.
+        save_stride: int or (stride_z, stride_x), save one cell of every `save_stride` cells, see `wave_loop`.
+        save_roi: [xmin, xmax, zmin, zmax], only save the cells in the region.
+        save_exclude_absorb: don't save the absorbing strips of the boundary.
+        workers: number of processes, defaults to the number of cpus.
+        verbose: print the output of the workers or not.
+
+    Returns:
+        list of index of the shots run, shots finished before are skipped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    _check_shots_file(out_dir, shots)
+
+    todo = [(i, int(sx), int(sz), out_dir) for i, (sx, sz) in enumerate(shots) if not is_shot_done(out_dir, i)]
+    print("{} shots, {} finished before, {} to run.".format(len(shots), len(shots) - len(todo), len(todo)))
+    if len(todo) == 0:
+        return []
+
+    medium_dir = os.path.join(out_dir, MEDIUM_DIR)
+    medium.save_coefficients(medium_dir)
+
+    if workers is None:
+        workers = os.cpu_count()
+    workers = max(1, min(workers, len(todo)))
+
+    simulate_kwargs = dict(
+        dt=dt,
+        endt=endt,
+        use_anti_extension=use_anti_extension,
+        fft_backend=fft_backend,
+        threads=threads,
+        space_domain_method=space_domain_method,
+        fd_order=fd_order,
+        time_integrator=time_integrator,
+        reference_velocity=reference_velocity,
+    )
+    save_kwargs = dict(
+        save_times=save_times,
+        save_format=save_format,
+        compression=compression,
+        save_stride=save_stride,
+        save_roi=save_roi,
+        save_exclude_absorb=save_exclude_absorb,
+    )
+    init_args = (medium.cfg, medium_dir, boundary, tuple(source_x), tuple(source_z), simulate_kwargs,
+                 save_kwargs, verbose)
+
+    start_time = time.time()
+    finished = []
+    with Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+        # chunksize 1, every idle worker takes the next shot.
+        for index, runtime in pool.imap_unordered(_run_shot, todo, chunksize=1):
+            finished.append(index)
+            print("shot {} done, runtime:{:.3f}s, process: {}/{}, total runtime:{:.3f}s".format(
+                index, runtime, len(finished), len(todo), time.time() - start_time))
+    return finished